@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Configlet builder benchmark
+Runs mcast-auto-reconcile.py offline with a fake `cvplibrary` module using
+the section-scoped text fetch and the full JSON running config fetch,
+verifies that both produce identical configlets and reports builder run time.
+"""
+
+import argparse
+import io
+import os
+import re
+import sys
+import time
+from contextlib import redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BUILDER_PATH = os.path.join(os.path.dirname(BENCH_DIR), 'mcast-auto-reconcile.py')
+sys.path.insert(0, os.path.join(BENCH_DIR, 'fake_cvplibrary'))
+
+import cvplibrary  # noqa: E402
+
+
+def compile_builder(section_scoped_fetch):
+    # compile the builder with the requested fetch mode
+    with open(BUILDER_PATH) as f:
+        source = f.read()
+    source, count = re.subn(r'^SECTION_SCOPED_FETCH = \w+$',
+                            'SECTION_SCOPED_FETCH = %s' % section_scoped_fetch, source, flags=re.M)
+    if count != 1:
+        sys.exit('ERROR: SECTION_SCOPED_FETCH is not defined in %s' % BUILDER_PATH)
+    return compile(source, BUILDER_PATH, 'exec')
+
+
+def run_builder(code):
+    # run the builder once, returns generated configlet and run time in seconds
+    output = io.StringIO()
+    start = time.perf_counter()
+    with redirect_stdout(output):
+        exec(code, {'__name__': '__builder__'})
+    return output.getvalue(), time.perf_counter() - start
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the multicast auto reconcile configlet builder offline.')
+    parser.add_argument('--routes', type=int, default=1000, help='Number of multicast routes. Default: 1000')
+    parser.add_argument('--filler-sections', type=int, default=5000,
+                        help='Number of unrelated interface sections in the running config. Default: 5000')
+    parser.add_argument('--iterations', type=int, default=5, help='Number of builder runs per mode. Default: 5')
+    args = parser.parse_args()
+
+    cvplibrary.Device.route_count = args.routes
+    cvplibrary.Device.filler_sections = args.filler_sections
+
+    results = dict()
+    for mode, section_scoped_fetch in [('section', True), ('json', False)]:
+        code = compile_builder(section_scoped_fetch)
+        run_times = list()
+        for _ in range(args.iterations):
+            configlet, run_time = run_builder(code)
+            run_times.append(run_time)
+        results[mode] = (configlet, min(run_times))
+        print(f'{mode:>8}: best {min(run_times) * 1000:.1f} ms of {args.iterations} runs, '
+              f'{len(configlet.splitlines())} configlet lines')
+
+    if results['section'][0] != results['json'][0]:
+        sys.exit('ERROR: section-scoped and JSON fetch produced different configlets!')
+    print(f"Configlets are identical, section-scoped fetch is {results['json'][1] / results['section'][1]:.1f}x faster.")
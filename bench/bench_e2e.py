@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""End-to-end reconcile benchmark
+Starts bench/mock_cvp.py for every inventory size, runs trigger-mcast-reconcile.py against it
+and reports wall time, peak RSS of the trigger process and the number of requests per CVP endpoint.
+Arguments after `--` are passed to the trigger.
+
+    ./bench/bench_e2e.py --devices 10 100 1000 --latency 5 -- --batch --workers 20
+"""
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MOCK_CVP_PATH = os.path.join(BENCH_DIR, 'mock_cvp.py')
+TRIGGER_PATH = os.path.join(os.path.dirname(BENCH_DIR), 'trigger-mcast-reconcile.py')
+
+
+def start_mock_cvp(mock_args):
+    # start mock CVP on a random port, returns the process and its URL
+    proc = subprocess.Popen([sys.executable, MOCK_CVP_PATH, '--port', '0'] + mock_args,
+                            stdout=subprocess.PIPE, universal_newlines=True)
+    line = proc.stdout.readline()
+    if 'listening on' not in line:
+        proc.kill()
+        sys.exit('ERROR: mock CVP failed to start!')
+    return proc, line.split()[-1]
+
+
+def run_trigger(url, trigger_args):
+    # run the trigger, returns exit code, wall time in seconds and peak RSS in MB
+    env = dict(os.environ, CVP_PASSWORD='cvpadmin')
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, TRIGGER_PATH, '--cvp', url, '--username', 'cvpadmin'] + trigger_args,
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    stderr = proc.stderr.read()
+    # wait4 returns resource usage of this child only, ru_maxrss is in kilobytes on Linux
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall_time = time.perf_counter() - start
+    exit_code = os.waitstatus_to_exitcode(status)
+    proc.returncode = exit_code
+    if exit_code:
+        print(stderr[-2000:], file=sys.stderr)
+    return exit_code, wall_time, rusage.ru_maxrss / 1024
+
+
+def get_stats(url):
+    with urllib.request.urlopen(url + '/__stats') as resp:
+        return json.load(resp)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='End-to-end benchmark of trigger-mcast-reconcile.py against the mock CVP server.',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--devices', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='Inventory sizes to benchmark. Default: 10 100 1000 10000')
+    parser.add_argument('--builders', type=int, default=4, help='Number of configlet builders. Default: 4')
+    parser.add_argument('--routes', type=int, default=50, help='Number of multicast routes per device. Default: 50')
+    parser.add_argument('--containers', type=int, default=10, help='Number of containers. Default: 10')
+    parser.add_argument('--change-ratio', type=float, default=0.1,
+                        help='Share of devices with a change. Default: 0.1')
+    parser.add_argument('--latency', default='0', metavar='MS',
+                        help='Mock CVP response latency in milliseconds. Default: 0')
+    parser.add_argument('--mock-args', default='',
+                        help='Additional mock CVP arguments, for example "--error-rate getTasks.do=0.1"')
+    parser.add_argument('--json', dest='json_path', help='Write results to a JSON file.')
+    parser.add_argument('trigger_args', nargs=argparse.REMAINDER,
+                        help='Arguments passed to trigger-mcast-reconcile.py after "--"')
+    args = parser.parse_args()
+    trigger_args = [a for a in args.trigger_args if a != '--']
+
+    results = list()
+    for device_count in args.devices:
+        mock_args = ['--devices', str(device_count), '--builders', str(args.builders),
+                     '--routes', str(args.routes), '--containers', str(args.containers),
+                     '--change-ratio', str(args.change_ratio), '--latency', args.latency] + shlex.split(args.mock_args)
+        mock_proc, url = start_mock_cvp(mock_args)
+        try:
+            exit_code, wall_time, peak_rss = run_trigger(url, trigger_args)
+            stats = get_stats(url)
+        finally:
+            mock_proc.terminate()
+            mock_proc.wait()
+        requests_per_endpoint = {endpoint.rsplit('/', 1)[-1]: d['requests'] for endpoint, d in sorted(stats.items())}
+        results.append({
+            'devices': device_count,
+            'exitCode': exit_code,
+            'wallTime': round(wall_time, 3),
+            'peakRssMb': round(peak_rss, 1),
+            'requests': requests_per_endpoint,
+            'bytesReceived': sum(d['bytesOut'] for d in stats.values()),
+        })
+        print(f'{device_count:>6} devices: exit code {exit_code}, {wall_time:.2f}s, peak RSS {peak_rss:.1f} MB, '
+              f'{sum(requests_per_endpoint.values())} requests, '
+              f'{results[-1]["bytesReceived"] / 1e6:.1f} MB received')
+        for endpoint, count in requests_per_endpoint.items():
+            print(f'{"":>8}{endpoint:<40}{count:>8}')
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile planner benchmark
+Compares the indexed reconcile planner with the original nested matching loops on a synthetic inventory.
+The original algorithm is too slow to run on the full inventory, so it is executed for a sample of devices
+and the result is extrapolated.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcast_reconcile.models import ConfigletStore, Device  # noqa: E402
+from mcast_reconcile.planner import BuilderNameIndex, GeneratedConfigletIndex, plan_device  # noqa: E402
+
+
+def build_inventory(device_count, builder_count, container_size, change_ratio, lost_ratio, seed=1):
+    # returns device dict, assigned configlets, builder names, builder device map and generated configlets
+    # devices and configlets are returned as CVP data used by the original algorithm
+    rnd = random.Random(seed)
+    static_configlets = [
+        {'key': f'configlet_static_{i}', 'name': f'static_{i}', 'type': 'Static', 'config': f'hostname static-{i}\n'}
+        for i in range(2)
+    ]
+    builders = [
+        {'key': f'configletBuilderMapper_{i}', 'name': f'mcast_auto_reconcile_{i}', 'type': 'Builder', 'config': ''}
+        for i in range(builder_count)
+    ]
+    device_dict = dict()
+    device_sys_mac_to_configlet_map = dict()
+    builder_device_map = dict()
+    generated_configlets = dict()
+    for i in range(device_count):
+        mac = '00:1c:73:%02x:%02x:%02x' % ((i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+        ip = '10.%d.%d.%d' % ((i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+        builder = builders[i % builder_count]
+        container_key = f'container_{builder["key"]}_{i // (builder_count * container_size)}'
+        device = {'serialNumber': f'SN{i:06d}', 'systemMacAddress': mac, 'ipAddress': ip,
+                  'fqdn': f'leaf{i}', 'parentContainerKey': container_key}
+        device_dict[mac] = device
+        config = 'router multicast\n   ipv4\n' + ''.join(
+            f'      route 239.1.{n // 250}.{n % 250} 10.0.0.{n % 250} iif Ethernet1\n' for n in range(20))
+        generated = {'key': f'configlet_gen_{i}_1', 'name': f'{builder["name"]}_{ip}_1',
+                     'type': 'Generated', 'config': config}
+        assigned = list(static_configlets) + [builder]
+        if rnd.random() >= lost_ratio:
+            assigned.append(generated)
+        device_sys_mac_to_configlet_map[mac] = assigned
+        builder_device_map.setdefault(builder['key'], dict()).setdefault(container_key, list()).append(mac)
+        if rnd.random() < change_ratio:
+            new_cfglet = {'key': f'configlet_gen_{i}_2', 'name': f'{builder["name"]}_{ip}_2', 'type': 'Generated',
+                          'config': config + '      route 239.2.0.1 10.0.0.1 iif Ethernet2\n'}
+        else:
+            new_cfglet = generated
+        generated_configlets.setdefault((builder['key'], container_key), list()).append({'configlet': new_cfglet})
+    builder_names = {b['key']: b['name'] for b in builders}
+    return device_dict, device_sys_mac_to_configlet_map, builder_names, builder_device_map, generated_configlets
+
+
+def build_models(device_dict, device_sys_mac_to_configlet_map, generated_configlets):
+    # convert CVP data to models used by the indexed planner
+    store = ConfigletStore()
+    devices = {mac: Device.from_cvp(device) for mac, device in device_dict.items()}
+    configlet_map = {
+        mac: [store.intern(c) for c in configlets] for mac, configlets in device_sys_mac_to_configlet_map.items()
+    }
+    generated = {
+        bundle: [(None, store.intern(d['configlet'])) for d in data] for bundle, data in generated_configlets.items()
+    }
+    return devices, configlet_map, generated
+
+
+def legacy_plan_device(device_details, configlets_assigned_to_device, builder_names, new_configlets):
+    # the original matching loops from trigger-mcast-reconcile.py
+    # builder_names is a list with a builder name for every device, including duplicates
+    change_detected = False
+    configlets_to_be_assigned = list()
+    configlets_to_be_unassigned = list()
+    configlets_to_be_deleted = list()
+    gen_cfglet_prefixes_already_assigned_to_device = list()
+    gen_cfglet_prefixes_expected_to_be_assigned_to_device = list()
+    for configlet in configlets_assigned_to_device:
+        if configlet['type'] == 'Builder':
+            if configlet['name'] not in gen_cfglet_prefixes_already_assigned_to_device:
+                gen_cfglet_prefixes_expected_to_be_assigned_to_device.append(configlet['name'])
+        builder_name = ''
+        if configlet['type'] == 'Generated':
+            for candidate_builder_name in builder_names:
+                if candidate_builder_name in configlet['name']:
+                    builder_name = candidate_builder_name
+                    existing_cfglet_name_without_version = configlet['name'][:configlet['name'].rfind('_')]
+                    for new_configlet_data in new_configlets:
+                        new_cfglet = new_configlet_data['configlet']
+                        new_cfglet_name_without_version = new_cfglet['name'][:new_cfglet['name'].rfind('_')]
+                        if existing_cfglet_name_without_version == new_cfglet_name_without_version:
+                            if configlet['key'] == new_cfglet['key']:
+                                configlets_to_be_assigned.append(configlet)
+                            else:
+                                if configlet['config'] != new_cfglet['config']:
+                                    change_detected = True
+                                    configlets_to_be_assigned.append(new_cfglet)
+                                    configlets_to_be_unassigned.append(configlet)
+                                    configlets_to_be_deleted.append(configlet)
+                            gen_cfglet_prefixes_already_assigned_to_device.append(builder_name)
+                            if builder_name in gen_cfglet_prefixes_expected_to_be_assigned_to_device:
+                                gen_cfglet_prefixes_expected_to_be_assigned_to_device.remove(builder_name)
+        else:
+            configlets_to_be_assigned.append(configlet)
+    for lost_configlet_prefix in gen_cfglet_prefixes_expected_to_be_assigned_to_device:
+        for cfglet_index, to_be_assigned_cfglet in enumerate(configlets_to_be_assigned):
+            if to_be_assigned_cfglet['name'] == lost_configlet_prefix:
+                for new_configlet_data in new_configlets:
+                    new_cfglet = new_configlet_data['configlet']
+                    if lost_configlet_prefix in new_cfglet['name']:
+                        configlets_to_be_assigned.insert(cfglet_index+1, new_cfglet)
+                        change_detected = True
+    return change_detected
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the reconcile planner on a synthetic inventory.')
+    parser.add_argument('--devices', type=int, default=10000, help='Number of devices. Default: 10000')
+    parser.add_argument('--builders', type=int, default=20, help='Number of configlet builders. Default: 20')
+    parser.add_argument('--container-size', type=int, default=100,
+                        help='Number of devices per builder in a container. Default: 100')
+    parser.add_argument('--change-ratio', type=float, default=0.1,
+                        help='Share of devices with a changed generated configlet. Default: 0.1')
+    parser.add_argument('--lost-ratio', type=float, default=0.01,
+                        help='Share of devices with a lost generated configlet. Default: 0.01')
+    parser.add_argument('--legacy-sample', type=int, default=200,
+                        help='Number of devices planned with the original algorithm. Default: 200')
+    args = parser.parse_args()
+
+    device_dict, configlet_map, builder_names, builder_device_map, generated_configlets = build_inventory(
+        args.devices, args.builders, args.container_size, args.change_ratio, args.lost_ratio)
+    print(f'Inventory: {args.devices} devices, {args.builders} builders, {len(generated_configlets)} builder/container bundles')
+    devices, configlet_models, generated_models = build_models(device_dict, configlet_map, generated_configlets)
+
+    start = time.perf_counter()
+    builder_name_index = BuilderNameIndex(builder_names.values())
+    changed = dict()
+    for builder_id, cont_device_bundle in builder_device_map.items():
+        for container_id, device_list in cont_device_bundle.items():
+            generated_index = GeneratedConfigletIndex(generated_models[(builder_id, container_id)])
+            for device_id in device_list:
+                device_plan = plan_device(devices[device_id], configlet_models[device_id], builder_name_index,
+                                          builder_names[builder_id], generated_index)
+                changed[device_id] = device_plan.change_detected
+    planner_time = time.perf_counter() - start
+    print(f'Indexed planner: {planner_time:.3f}s for {args.devices} devices, {sum(changed.values())} changes detected')
+
+    # the original algorithm collected a builder name for every device
+    legacy_builder_names = [
+        cfglet['name'] for configlets in configlet_map.values() for cfglet in configlets if cfglet['type'] == 'Builder'
+    ]
+    sample = list()
+    for builder_id, cont_device_bundle in builder_device_map.items():
+        for container_id, device_list in cont_device_bundle.items():
+            for device_id in device_list:
+                sample.append((device_id, generated_configlets[(builder_id, container_id)]))
+    sample = sample[:args.legacy_sample]
+    start = time.perf_counter()
+    mismatches = 0
+    for device_id, new_configlets in sample:
+        legacy_changed = legacy_plan_device(device_dict[device_id], configlet_map[device_id],
+                                            legacy_builder_names, new_configlets)
+        if legacy_changed != changed[device_id]:
+            mismatches += 1
+    legacy_time = time.perf_counter() - start
+    legacy_estimate = legacy_time / max(len(sample), 1) * args.devices
+    print(f'Original algorithm: {legacy_time:.3f}s for {len(sample)} devices, '
+          f'~{legacy_estimate:.1f}s estimated for {args.devices} devices')
+    print(f'Speedup: ~{legacy_estimate / planner_time:.0f}x, change detection mismatches in sample: {mismatches}')
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Large configlet stress benchmark
+Runs mcast-auto-reconcile.py offline with a fake `cvplibrary` device carrying a large number of multicast routes,
+compares builder run time with the original per-line print output, and measures memory and time the trigger
+spends per device to detect and log a changed configlet, compared with the original whole-config processing.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from bench_builder import BUILDER_PATH, cvplibrary, run_builder  # noqa: E402
+from mcast_reconcile.compare import config_diff, config_digest  # noqa: E402
+from mcast_reconcile.models import ConfigletStore  # noqa: E402
+
+LEGACY_OUTPUT = '''print('router multicast')
+print('   ipv4')
+for line in mcast_config:
+  print(' '*6+line)
+'''
+
+
+def compile_builders():
+    # returns the current builder and a builder with the original per-line print output
+    with open(BUILDER_PATH) as f:
+        source = f.read()
+    legacy_source, count = re.subn(r"^configlet = \['router multicast'.*?^print\('\\n'\.join\(configlet\)\)\n",
+                                   lambda _: LEGACY_OUTPUT, source, flags=re.M | re.S)
+    if count != 1:
+        sys.exit(f'ERROR: configlet output is not found in {BUILDER_PATH}')
+    return compile(source, BUILDER_PATH, 'exec'), compile(legacy_source, BUILDER_PATH, 'exec')
+
+
+def legacy_canonical_lines(config):
+    # the original canonical line set, every line is joined with the full list of its parents
+    lines = set()
+    parents = list()
+    for raw_line in config.splitlines():
+        line = raw_line.rstrip()
+        stripped = line.lstrip()
+        if not stripped or stripped.startswith('!'):
+            continue
+        indent = len(line) - len(stripped)
+        while parents and parents[-1][0] >= indent:
+            parents.pop()
+        lines.add(' > '.join([parent for _, parent in parents] + [stripped]))
+        parents.append((indent, stripped))
+    return lines
+
+
+def legacy_config_digest(config):
+    # the original digest of sorted canonical lines
+    h = hashlib.sha256()
+    for line in sorted(legacy_canonical_lines(config)):
+        h.update(line.encode())
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def legacy_config_diff(old_config, new_config):
+    old_lines = legacy_canonical_lines(old_config)
+    new_lines = legacy_canonical_lines(new_config)
+    return sorted(new_lines - old_lines), sorted(old_lines - new_lines)
+
+
+def change_routes(configlet, changed_routes):
+    # replaces next hops of the first routes, the configlet size stays the same
+    lines = configlet.split('\n')
+    changed = 0
+    for index, line in enumerate(lines):
+        if changed == changed_routes:
+            break
+        if line.lstrip().startswith('route '):
+            lines[index] = line.replace(' 10.120.', ' 10.121.', 1)
+            changed += 1
+    return '\n'.join(lines)
+
+
+def measure(function, *args):
+    # returns result, run time in seconds and traced memory peak in megabytes
+    # tracing slows allocations down, so run time and memory are measured in separate runs
+    start = time.perf_counter()
+    result = function(*args)
+    run_time = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, run_time, peak / 1024 / 1024
+
+
+def process_device(old_config, new_config, digest, diff):
+    # work the trigger does per device: compare the assigned and the generated configlet and log the diff
+    if digest(old_config) == digest(new_config):
+        return None
+    return diff(old_config, new_config)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Stress the configlet builder and trigger with large configlets.')
+    parser.add_argument('--routes', type=int, default=100000, help='Number of multicast routes per device. '
+                                                                     'Default: 100000')
+    parser.add_argument('--devices', type=int, default=5, help='Number of devices to run the builder for. Default: 5')
+    parser.add_argument('--changed-routes', type=int, default=100,
+                        help='Number of routes changed in the generated configlet. Default: 100')
+    parser.add_argument('--filler-sections', type=int, default=1000,
+                        help='Number of unrelated interface sections in the running config. Default: 1000')
+    args = parser.parse_args()
+
+    cvplibrary.Device.route_count = args.routes
+    cvplibrary.Device.filler_sections = args.filler_sections
+
+    code, legacy_code = compile_builders()
+    run_builder(code)  # warm up, the fake device builds its running config once
+    results = dict()
+    for mode, builder_code in [('buffered', code), ('per-line', legacy_code)]:
+        run_times = list()
+        for _ in range(args.devices):
+            configlet, run_time = run_builder(builder_code)
+            run_times.append(run_time)
+        results[mode] = configlet
+        print(f'builder {mode:>8}: {sum(run_times) / len(run_times) * 1000:.1f} ms per device on average, '
+              f'best {min(run_times) * 1000:.1f} ms of {args.devices} devices')
+    if results['buffered'] != results['per-line']:
+        sys.exit('ERROR: buffered and per-line output produced different configlets!')
+    old_config = results['buffered']
+    new_config = change_routes(old_config, args.changed_routes)
+    print(f'Configlets are identical, {len(old_config.splitlines())} lines, {len(old_config) / 1024 / 1024:.1f} MB')
+
+    # the store keeps only a digest of generated configlets, config text is released after interning
+    configlet = {'key': 'configlet_gen_1', 'name': 'mcast_auto_reconcile_10.0.0.1_1', 'type': 'Generated',
+                 'config': new_config}
+    _, intern_time, intern_peak = measure(lambda: ConfigletStore().intern(configlet))
+    print(f'trigger intern:   {intern_time * 1000:.1f} ms, peak {intern_peak:.1f} MB per configlet')
+
+    diffs = dict()
+    for mode, digest, diff in [('streaming', config_digest, config_diff),
+                               ('legacy', legacy_config_digest, legacy_config_diff)]:
+        diffs[mode], run_time, peak = measure(process_device, old_config, new_config, digest, diff)
+        print(f'trigger {mode:>9}: {run_time * 1000:.1f} ms, peak {peak:.1f} MB per device '
+              f'to detect and diff a changed configlet')
+    if diffs['streaming'] != diffs['legacy']:
+        sys.exit('ERROR: streaming and legacy comparison produced different diffs!')
+    added, removed = diffs['streaming']
+    print(f'Diffs are identical, {len(added)} lines added, {len(removed)} lines removed.')
@@ -0,0 +1,149 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Fake cvplibrary
+Minimal stand-in for the CVP `cvplibrary` module used to run configlet builders offline.
+The fake device serves a synthetic running config with a configurable number of multicast routes
+and unrelated config lines, in JSON or text format, like eAPI does.
+"""
+
+import json
+
+
+class GlobalVariableNames(object):
+    CVP_IP = 'CVP_IP'
+    CVP_SERIAL = 'CVP_SERIAL'
+    CVP_MAC = 'CVP_MAC'
+    ZTP_STATE = 'ZTP_STATE'
+    ZTP_USERNAME = 'ZTP_USERNAME'
+    ZTP_PASSWORD = 'ZTP_PASSWORD'
+    CVP_USERNAME = 'CVP_USERNAME'
+    CVP_PASSWORD = 'CVP_PASSWORD'
+
+
+class CVPGlobalVariables(object):
+
+    values = {
+        GlobalVariableNames.CVP_IP: '192.168.122.11',
+        GlobalVariableNames.CVP_SERIAL: 'SN0000000001',
+        GlobalVariableNames.CVP_MAC: '00:1c:73:00:00:01',
+        GlobalVariableNames.ZTP_STATE: 'false',
+        GlobalVariableNames.ZTP_USERNAME: 'cvpadmin',
+        GlobalVariableNames.ZTP_PASSWORD: 'cvpadmin',
+        GlobalVariableNames.CVP_USERNAME: 'cvpadmin',
+        GlobalVariableNames.CVP_PASSWORD: 'cvpadmin',
+    }
+
+    @classmethod
+    def getValue(cls, name):
+        return cls.values[name]
+
+
+def mcast_routes(route_count):
+    return [
+        'route 239.%d.%d.%d 10.120.%d.%d iif Ethernet%d' % (
+            (n >> 16) & 0xff, (n >> 8) & 0xff, n & 0xff, (n >> 8) & 0xff, n & 0xff, n % 48 + 1)
+        for n in range(route_count)
+    ]
+
+
+class Device(object):
+    # route_count: number of `route` entries under `router multicast > ipv4`
+    # filler_sections: number of unrelated config sections (interfaces) with a few lines each
+    route_count = 1000
+    filler_sections = 1000
+    calls = list()  # every runCmds call is recorded as (cmds, fmt)
+    _sections_cache = dict()
+
+    def __init__(self, ip, username='', password=''):
+        self.ip = ip
+        self.username = username
+        self.password = password
+
+    def _running_config_sections(self):
+        # returns [ ( 'section header', [ 'child lines' ] ), ... ] in running config order
+        # the config is built once for every size, so only rendering and parsing are measured
+        cache_key = (self.route_count, self.filler_sections)
+        if cache_key not in Device._sections_cache:
+            Device._sections_cache[cache_key] = self._build_running_config_sections()
+        return Device._sections_cache[cache_key]
+
+    def _build_running_config_sections(self):
+        sections = [('hostname leaf1', [])]
+        for n in range(self.filler_sections):
+            sections.append(('interface Ethernet%d' % (n + 1), [
+                '   description uplink-%d' % n,
+                '   mtu 9214',
+                '   ip address 10.%d.%d.1/31' % ((n >> 8) & 0xff, n & 0xff),
+            ]))
+        sections.append(('router multicast', ['   ipv4'] + ['      ' + route for route in mcast_routes(self.route_count)]
+                         + ['      routing']))
+        return sections
+
+    def _running_config_json(self):
+        cmds = dict()
+        for header, children in self._running_config_sections():
+            if header == 'router multicast':
+                ipv4_cmds = dict((line.strip(), None) for line in children[1:])
+                cmds[header] = {'cmds': {'ipv4': {'cmds': ipv4_cmds, 'comments': []}}, 'comments': []}
+            else:
+                cmds[header] = {'cmds': dict((line.strip(), None) for line in children), 'comments': []}
+        # serialize and parse the response like eAPI transport does
+        return json.loads(json.dumps({'cmds': cmds, 'header': ['! device: leaf1'], 'comments': []}))
+
+    def _running_config_text(self, section=None):
+        lines = list()
+        for header, children in self._running_config_sections():
+            if section and section not in header:
+                continue
+            lines.append(header)
+            lines.extend(children)
+            lines.append('!')
+        return '\n'.join(lines) + '\n'
+
+    def runCmds(self, cmds, fmt='json'):
+        Device.calls.append((list(cmds), fmt))
+        result = list()
+        for cmd in cmds:
+            if cmd == 'enable':
+                response = {} if fmt == 'json' else {'output': ''}
+            elif cmd.startswith('show running-config section '):
+                response = {'output': self._running_config_text(cmd[len('show running-config section '):])}
+            elif cmd == 'show running-config':
+                if fmt == 'json':
+                    response = self._running_config_json()
+                else:
+                    response = {'output': self._running_config_text()}
+            else:
+                raise ValueError('Unsupported command: %s' % cmd)
+            result.append({'command': cmd, 'response': response})
+        return result
@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Mock CVP server
+Local stand-in for the CVP REST API endpoints used by trigger-mcast-reconcile.py.
+Devices, configlet builders and multicast routes are generated synthetically.
+Part of the devices have routes that are not reflected in the generated configlets yet,
+so reconcile has something to do. Per-endpoint latency and error injection can be configured.
+
+    ./bench/mock_cvp.py --devices 1000 --port 8443
+    CVP_PASSWORD=cvpadmin ./trigger-mcast-reconcile.py --cvp http://127.0.0.1:8443 -user cvpadmin
+
+Request statistics are available at GET /__stats and can be reset with POST /__reset.
+"""
+
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def mcast_route(n):
+    return 'route 239.%d.%d.%d 10.120.%d.%d iif Ethernet%d' % (
+        (n >> 16) & 0xff, (n >> 8) & 0xff, n & 0xff, (n >> 8) & 0xff, n & 0xff, n % 48 + 1)
+
+
+def drift_route(n):
+    # a route outside of 239.0.0.0/8, not filtered by -running_config_filter=route[[:space:]]239
+    return 'route 232.%d.%d.%d 10.121.%d.%d iif Ethernet1' % (
+        (n >> 16) & 0xff, (n >> 8) & 0xff, n & 0xff, (n >> 8) & 0xff, n & 0xff)
+
+
+def mcast_config(routes):
+    return 'router multicast\n   ipv4\n' + ''.join('      %s\n' % route for route in routes)
+
+
+class MockCVP(object):
+    # in-memory CVP state
+
+    def __init__(self, devices=10, builders=1, routes=10, containers=1, change_ratio=0.1, lost_ratio=0.0,
+                 session_ttl=0, task_duration=0.0, task_failure_ratio=0.0, static_config_lines=1, drift_ratio=0.0,
+                 running_config_filter=None, seed=1):
+        # change_ratio: share of devices with routes not reflected in the assigned generated configlet
+        # lost_ratio: share of devices with a builder assigned but generated configlet missing
+        # session_ttl: session lifetime in seconds, 0 - sessions never expire
+        # task_duration: seconds a task stays in progress after execution
+        # task_failure_ratio: share of executed tasks that fail
+        # static_config_lines: number of lines in the static configlet assigned to every device
+        # drift_ratio: share of devices with a route visible to CVP and not reflected in the generated configlet
+        # running_config_filter: Python regex, matching running config lines are not streamed like with custom TerminAttr
+        rnd = random.Random(seed)
+        self.running_config_filter = re.compile(running_config_filter) if running_config_filter else None
+        self.lock = threading.Lock()
+        self.session_ttl = session_ttl
+        self.task_duration = task_duration
+        self.task_failure_ratio = task_failure_ratio
+        self.sessions = dict()  # login time for every session ID
+        self.configlets = dict()  # configlet for every key
+        self.devices = list()
+        self.device_by_mac = dict()
+        self.assigned = dict()  # list of assigned configlet keys for every device system MAC
+        self.running_routes = dict()  # routes configured on every device
+        self.generated_versions = dict()  # last generated configlet version for every builder and device
+        self.pending_actions = dict()  # temp actions not saved yet, kept in the session they were added in like on CVP
+        self.tasks = dict()  # task for every task ID
+        self.containers = [
+            {'Key': 'container_%d' % i, 'Name': 'Container%d' % i} for i in range(containers)
+        ]
+        static_configlet = self.add_configlet('static_base', 'Static', ''.join(
+            'interface Ethernet%d\n   description base config line %d\n' % (n + 1, n) for n in range(static_config_lines)))
+        builders_list = [
+            self.add_configlet('mcast_auto_reconcile_%d' % i, 'Builder', 'print("builder")\n') for i in range(builders)
+        ]
+        for i in range(devices):
+            mac = '00:1c:73:%02x:%02x:%02x' % ((i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+            device = {
+                'serialNumber': 'SN%08d' % i,
+                'systemMacAddress': mac,
+                'ipAddress': '10.%d.%d.%d' % ((i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff),
+                'hostname': 'leaf%d' % i,
+                'fqdn': 'leaf%d.example.com' % i,
+                'parentContainerKey': self.containers[i % containers]['Key'],
+                'containerName': self.containers[i % containers]['Name'],
+                'lastSyncUp': 1600000000000,
+                'modelName': 'DCS-7280SR-48C6',
+                'version': '4.24.2F',
+                'streamingStatus': 'active',
+                'complianceCode': '0000',
+            }
+            self.devices.append(device)
+            self.device_by_mac[mac] = device
+            builder = builders_list[i % builders]
+            device_routes = [mcast_route(i * routes + n) for n in range(routes)]
+            self.running_routes[mac] = list(device_routes)
+            assigned = [static_configlet['key'], builder['key']]
+            if rnd.random() >= lost_ratio:
+                generated = self.generate(builder, device, device_routes)
+                assigned.append(generated['key'])
+            self.assigned[mac] = assigned
+            if rnd.random() < change_ratio:
+                self.running_routes[mac].append(mcast_route(10000000 + i))
+            if rnd.random() < drift_ratio:
+                self.running_routes[mac].append(drift_route(i))
+
+    def add_configlet(self, name, configlet_type, config):
+        configlet = {
+            'key': 'configlet_%s' % uuid.uuid4(),
+            'name': name,
+            'type': configlet_type,
+            'config': config,
+            'reconciled': False,
+            'user': 'cvpadmin',
+            'note': '',
+        }
+        self.configlets[configlet['key']] = configlet
+        return configlet
+
+    def generate(self, builder, device, routes):
+        # create a new generated configlet version or return the existing one if config is the same
+        # the last version can be deleted by reconcile, a new version is created then
+        version_key = (builder['key'], device['systemMacAddress'])
+        config = mcast_config(routes)
+        current = self.generated_versions.get(version_key)
+        current_configlet = self.configlets.get(current[1]) if current else None
+        if current_configlet and (current_configlet['config'] == config):
+            return current_configlet
+        version = current[0] + 1 if current else 1
+        configlet = self.add_configlet(
+            '%s_%s_%d' % (builder['name'], device['ipAddress'], version), 'Generated', config)
+        self.generated_versions[version_key] = (version, configlet['key'])
+        return configlet
+
+    def device_config(self, mac):
+        # device config lines that are not in any configlet: show running-config header, defaults, hashed secrets and end
+        # returns config before and after the configured lines
+        device = self.device_by_mac[mac]
+        head = ('! Command: show running-config\n! device: %s (%s, EOS-%s)\n!\n'
+                'transceiver qsfp default-mode 4x10G\n'
+                'username admin privilege 15 role network-admin secret sha512 $6$%s\n' % (
+                    device['hostname'], device['modelName'], device['version'], device['serialNumber']))
+        return head, 'end\n'
+
+    def running_config(self, mac):
+        # static config and configured routes as streamed to CVP
+        head, tail = self.device_config(mac)
+        config = head + ''.join(
+            self.configlets[key]['config'] for key in self.assigned.get(mac, list())
+            if self.configlets[key]['type'] == 'Static') + mcast_config(self.running_routes[mac]) + tail
+        if self.running_config_filter:
+            config = ''.join(
+                line for line in config.splitlines(True) if not self.running_config_filter.search(line.strip()))
+        return config
+
+    def compare_config(self, mac, configlet_keys):
+        # CVP designs the config by applying configlets to the running config,
+        # so device config lines that are not in any configlet are the same in both configs
+        head, tail = self.device_config(mac)
+        designed = (head + ''.join(
+            self.configlets[key]['config'] for key in configlet_keys
+            if self.configlets[key]['type'] != 'Builder') + tail).splitlines()
+        running = self.running_config(mac).splitlines()
+        designed_set, running_set = set(designed), set(running)
+        designed_lines = [{'command': line, 'code': '' if line in running_set else 'new'} for line in designed]
+        running_lines = [{'command': line, 'code': '' if line in designed_set else 'reconcile'} for line in running]
+        return designed_lines, running_lines
+
+    def session_valid(self, session_id):
+        login_time = self.sessions.get(session_id)
+        if login_time is None:
+            return False
+        return not self.session_ttl or (time.time() - login_time < self.session_ttl)
+
+    def update_tasks(self):
+        for task in self.tasks.values():
+            if (task['workOrderUserDefinedStatus'] == 'In-Progress') and (time.time() >= task['completeAt']):
+                if random.random() < self.task_failure_ratio:
+                    task['workOrderUserDefinedStatus'] = 'Failed'
+                    task['workOrderState'] = 'FAILED'
+                else:
+                    task['workOrderUserDefinedStatus'] = 'Completed'
+                    task['workOrderState'] = 'COMPLETED'
+
+
+class MockCVPRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def cvp(self):
+        return self.server.cvp
+
+    def send_json(self, code, data, headers=None):
+        body = json.dumps(data).encode()
+        self.server.count(self.endpoint, bytes_in=self.bytes_in, bytes_out=len(body))
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        if len(body) > 1024 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or dict()).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.bytes_in = length
+        body = self.rfile.read(length) if length else b''
+        return json.loads(body) if body else None
+
+    def session_id(self):
+        for cookie in self.headers.get('Cookie', '').split(';'):
+            name, _, value = cookie.strip().partition('=')
+            if name == 'session_id':
+                return value
+
+    def handle_request(self, method):
+        url = urlparse(self.path)
+        self.query = parse_qs(url.query)
+        self.endpoint = '%s %s' % (method, url.path)
+        self.bytes_in = 0
+        payload = self.read_json() if method == 'POST' else None
+        if url.path.startswith('/__'):
+            return self.handle_control(url.path)
+        handler = self.server.routes.get(self.endpoint)
+        if handler is None:
+            return self.send_json(404, {'errorCode': '404', 'errorMessage': 'Unknown endpoint %s' % url.path})
+        time.sleep(self.server.latency_for(url.path))
+        if random.random() < self.server.error_rate_for(url.path):
+            self.server.count_error(self.endpoint)
+            return self.send_json(503, {'message': 'Injected error'})
+        if url.path != '/web/login/authenticate.do':
+            if not self.cvp.session_valid(self.session_id()):
+                return self.send_json(200, {'errorCode': '112498', 'errorMessage': 'Unauthorized User'})
+        with self.cvp.lock:
+            code, data, headers = handler(self, payload)
+        self.send_json(code, data, headers)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def handle_control(self, path):
+        if path == '/__stats':
+            self.send_json(200, self.server.stats_snapshot())
+        elif path == '/__reset':
+            self.server.reset_stats()
+            self.send_json(200, {})
+        else:
+            self.send_json(404, {})
+
+    # CVP endpoints, every handler returns ( status code, data, headers )
+
+    def authenticate(self, payload):
+        session_id = uuid.uuid4().hex
+        self.cvp.sessions[session_id] = time.time()
+        return 200, {'sessionId': session_id, 'username': payload.get('userId')}, {
+            'Set-Cookie': 'session_id=%s; Path=/' % session_id}
+
+    def inventory_devices(self, payload):
+        return 200, self.cvp.devices, None
+
+    def inventory_containers(self, payload):
+        return 200, self.cvp.containers, None
+
+    def get_net_element_list(self, payload):
+        node_id = self.query.get('nodeId', [''])[0]
+        devices = [d for d in self.cvp.devices if d['parentContainerKey'] == node_id]
+        return 200, {'netElementList': devices, 'total': len(devices)}, None
+
+    def get_configlets(self, payload):
+        start = int(self.query.get('startIndex', ['0'])[0])
+        end = int(self.query.get('endIndex', ['0'])[0])
+        configlets = list(self.cvp.configlets.values())
+        page = configlets[start:end] if end else configlets[start:]
+        return 200, {'data': page, 'total': len(configlets)}, None
+
+    def get_configlets_by_net_element_id(self, payload):
+        mac = self.query.get('netElementId', [''])[0]
+        if mac not in self.cvp.assigned:
+            return 200, {'errorCode': '122805', 'errorMessage': 'Device not found'}, None
+        configlets = [self.cvp.configlets[key] for key in self.cvp.assigned[mac]]
+        return 200, {'configletList': configlets, 'total': len(configlets)}, None
+
+    def get_configlet_by_id(self, payload):
+        configlet = self.cvp.configlets.get(self.query.get('id', [''])[0])
+        if configlet is None:
+            return 200, {'errorCode': '132801', 'errorMessage': 'Configlet not found'}, None
+        return 200, configlet, None
+
+    def auto_configlet_generator(self, payload):
+        builder = self.cvp.configlets.get(payload['configletBuilderId'])
+        if builder is None or builder['type'] != 'Builder':
+            return 200, {'errorCode': '132801', 'errorMessage': 'Configlet builder not found'}, None
+        # builder runs contact devices, so generation time grows with the number of devices
+        time.sleep(self.server.gen_latency_per_device * len(payload['netElementIds']))
+        data = list()
+        for mac in payload['netElementIds']:
+            device = self.cvp.device_by_mac[mac]
+            configlet = self.cvp.generate(builder, device, self.cvp.running_routes[mac])
+            data.append({'configlet': configlet, 'netElementId': mac, 'pythonError': []})
+        return 200, {'data': data}, None
+
+    def add_temp_action(self, payload):
+        self.cvp.pending_actions.setdefault(self.session_id(), list()).extend(payload['data'])
+        return 200, {'data': 'success'}, None
+
+    def save_topology(self, payload):
+        task_ids = list()
+        for action in self.cvp.pending_actions.pop(self.session_id(), list()):
+            if action.get('action') != 'associate' or action.get('toIdType') != 'netelement':
+                continue
+            mac = action['toId']
+            self.cvp.assigned[mac] = list(action['configletList']) + list(action['configletBuilderList'])
+            task_id = str(len(self.cvp.tasks) + 1)
+            self.cvp.tasks[task_id] = {
+                'workOrderId': task_id,
+                'workOrderUserDefinedStatus': 'Pending',
+                'workOrderState': 'ACTIVE',
+                'netElementId': mac,
+                'description': 'Configlet Assign: to Device %s' % mac,
+                'completeAt': None,
+            }
+            task_ids.append(task_id)
+        return 200, {'data': {'status': 'success', 'taskIds': task_ids}}, None
+
+    def delete_configlet(self, payload):
+        for configlet in payload:
+            if configlet['key'] not in self.cvp.configlets:
+                return 200, {'errorCode': '132532', 'errorMessage': 'Configlet %s not found' % configlet['name']}, None
+            in_use = any(configlet['key'] in assigned for assigned in self.cvp.assigned.values())
+            if in_use:
+                return 200, {'errorCode': '132518', 'errorMessage': 'Configlet %s is in use' % configlet['name']}, None
+        for configlet in payload:
+            del self.cvp.configlets[configlet['key']]
+        return 200, {'data': 'success'}, None
+
+    def get_tasks(self, payload):
+        self.cvp.update_tasks()
+        query_param = self.query.get('queryparam', [''])[0]
+        tasks = [t for t in self.cvp.tasks.values() if not query_param or t['workOrderUserDefinedStatus'] == query_param]
+        return 200, {'data': tasks, 'total': len(tasks)}, None
+
+    def get_task_by_id(self, payload):
+        self.cvp.update_tasks()
+        task = self.cvp.tasks.get(self.query.get('taskId', [''])[0])
+        if task is None:
+            return 200, {'errorCode': '142624', 'errorMessage': 'Task not found'}, None
+        return 200, task, None
+
+    def execute_task(self, payload):
+        for task_id in payload['data']:
+            task = self.cvp.tasks.get(str(task_id))
+            if task is None:
+                return 200, {'errorCode': '142624', 'errorMessage': 'Task %s not found' % task_id}, None
+            task['workOrderUserDefinedStatus'] = 'In-Progress'
+            task['completeAt'] = time.time() + self.cvp.task_duration
+        self.cvp.update_tasks()
+        return 200, {'data': 'success'}, None
+
+    def check_compliance(self, payload):
+        mac = payload['nodeId']
+        if mac not in self.cvp.running_routes:
+            return 200, {'errorCode': '122805', 'errorMessage': 'Device not found'}, None
+        designed_lines, running_lines = self.cvp.compare_config(mac, self.cvp.assigned[mac])
+        compliant = not any(line['code'] for line in designed_lines + running_lines)
+        return 200, {'complianceCode': '0000' if compliant else '0001',
+                     'complianceIndication': '' if compliant else 'WARNING'}, None
+
+    def device_config(self, payload):
+        mac = self.query.get('netElementId', [''])[0]
+        if mac not in self.cvp.running_routes:
+            return 200, {'errorCode': '122805', 'errorMessage': 'Device not found'}, None
+        return 200, {'output': self.cvp.running_config(mac)}, None
+
+    def validate_and_compare_configlets(self, payload):
+        mac = payload['netElementId']
+        if mac not in self.cvp.running_routes:
+            return 200, {'errorCode': '122805', 'errorMessage': 'Device not found'}, None
+        designed_lines, running_lines = self.cvp.compare_config(mac, payload['configIdList'])
+        return 200, {
+            'designedConfig': designed_lines,
+            'runningConfig': running_lines,
+            'new': sum(1 for line in designed_lines if line['code']),
+            'reconcile': sum(1 for line in running_lines if line['code']),
+            'mismatch': 0,
+        }, None
+
+
+ROUTES = {
+    'POST /web/login/authenticate.do': MockCVPRequestHandler.authenticate,
+    'GET /cvpservice/inventory/devices': MockCVPRequestHandler.inventory_devices,
+    'GET /cvpservice/inventory/containers': MockCVPRequestHandler.inventory_containers,
+    'GET /cvpservice/provisioning/getNetElementList.do': MockCVPRequestHandler.get_net_element_list,
+    'GET /cvpservice/configlet/getConfiglets.do': MockCVPRequestHandler.get_configlets,
+    'GET /cvpservice/configlet/getConfigletById.do': MockCVPRequestHandler.get_configlet_by_id,
+    'GET /cvpservice/provisioning/getConfigletsByNetElementId.do': MockCVPRequestHandler.get_configlets_by_net_element_id,
+    'POST /cvpservice/configlet/autoConfigletGenerator.do': MockCVPRequestHandler.auto_configlet_generator,
+    'POST /cvpservice/provisioning/addTempAction.do': MockCVPRequestHandler.add_temp_action,
+    'POST /cvpservice/provisioning/v2/saveTopology.do': MockCVPRequestHandler.save_topology,
+    'POST /cvpservice/configlet/deleteConfiglet.do': MockCVPRequestHandler.delete_configlet,
+    'GET /cvpservice/task/getTasks.do': MockCVPRequestHandler.get_tasks,
+    'GET /cvpservice/task/getTaskById.do': MockCVPRequestHandler.get_task_by_id,
+    'POST /cvpservice/task/executeTask.do': MockCVPRequestHandler.execute_task,
+    'POST /cvpservice/provisioning/checkCompliance.do': MockCVPRequestHandler.check_compliance,
+    'GET /cvpservice/inventory/device/config': MockCVPRequestHandler.device_config,
+    'POST /cvpservice/provisioning/v2/validateAndCompareConfiglets.do': MockCVPRequestHandler.validate_and_compare_configlets,
+}
+
+
+class MockCVPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, cvp, latency=None, error_rate=None, gen_latency_per_device=0.0):
+        # latency: { 'endpoint path suffix' or 'default': seconds }
+        # error_rate: { 'endpoint path suffix' or 'default': share of requests failed with 503 }
+        super().__init__(address, MockCVPRequestHandler)
+        self.cvp = cvp
+        self.routes = ROUTES
+        self.latency = latency or dict()
+        self.error_rate = error_rate or dict()
+        self.gen_latency_per_device = gen_latency_per_device
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    @staticmethod
+    def value_for(values, path):
+        for endpoint, value in values.items():
+            if endpoint != 'default' and path.endswith(endpoint):
+                return value
+        return values.get('default', 0)
+
+    def latency_for(self, path):
+        return self.value_for(self.latency, path)
+
+    def error_rate_for(self, path):
+        return self.value_for(self.error_rate, path)
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = dict()
+
+    def count(self, endpoint, bytes_in=0, bytes_out=0):
+        with self.stats_lock:
+            d = self.stats.setdefault(endpoint, {'requests': 0, 'errors': 0, 'bytesIn': 0, 'bytesOut': 0})
+            d['requests'] += 1
+            d['bytesIn'] += bytes_in
+            d['bytesOut'] += bytes_out
+
+    def count_error(self, endpoint):
+        with self.stats_lock:
+            self.stats.setdefault(endpoint, {'requests': 0, 'errors': 0, 'bytesIn': 0, 'bytesOut': 0})['errors'] += 1
+
+    def stats_snapshot(self):
+        with self.stats_lock:
+            return json.loads(json.dumps(self.stats))
+
+
+def parse_endpoint_values(values, scale=1.0):
+    # parses [ '<value>' or '<endpoint>=<value>', ... ] into { 'default' or 'endpoint': value }
+    d = dict()
+    for value in values or list():
+        endpoint, _, number = value.rpartition('=')
+        d[endpoint or 'default'] = float(number) * scale
+    return d
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Mock CVP server for offline reconcile testing and benchmarks.',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on. Default: 127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443, help='Port to listen on, 0 - random port. Default: 8443')
+    parser.add_argument('--devices', type=int, default=10, help='Number of devices. Default: 10')
+    parser.add_argument('--builders', type=int, default=1, help='Number of configlet builders. Default: 1')
+    parser.add_argument('--routes', type=int, default=10, help='Number of multicast routes per device. Default: 10')
+    parser.add_argument('--containers', type=int, default=1, help='Number of containers. Default: 1')
+    parser.add_argument('--change-ratio', type=float, default=0.1,
+                        help='Share of devices with routes not reflected in generated configlets. Default: 0.1')
+    parser.add_argument('--lost-ratio', type=float, default=0.0,
+                        help='Share of devices with a lost generated configlet. Default: 0')
+    parser.add_argument('--latency', action='append', metavar='[ENDPOINT=]MS',
+                        help='Response latency in milliseconds, for all endpoints or for an endpoint,\n'
+                             'for example --latency 20 --latency saveTopology.do=500')
+    parser.add_argument('--gen-latency-per-device', type=float, default=0.0, metavar='MS',
+                        help='Additional autoConfigletGenerator.do latency per device in milliseconds. Default: 0')
+    parser.add_argument('--error-rate', action='append', metavar='[ENDPOINT=]RATE',
+                        help='Share of requests failed with 503, for all endpoints or for an endpoint,\n'
+                             'for example --error-rate getConfigletsByNetElementId.do=0.01')
+    parser.add_argument('--session-ttl', type=float, default=0,
+                        help='Session lifetime in seconds, 0 - sessions never expire. Default: 0')
+    parser.add_argument('--task-duration', type=float, default=0,
+                        help='Seconds a task stays in progress after execution. Default: 0')
+    parser.add_argument('--static-config-lines', type=int, default=1,
+                        help='Number of lines in the static configlet shared by all devices. Default: 1')
+    parser.add_argument('--task-failure-ratio', type=float, default=0.0,
+                        help='Share of executed tasks that fail. Default: 0')
+    parser.add_argument('--drift-ratio', type=float, default=0.0,
+                        help='Share of devices with a route outside of 239.0.0.0/8 not reflected in generated configlets. Default: 0')
+    parser.add_argument('--running-config-filter', default=None, metavar='REGEX',
+                        help='Python regex, matching running config lines are not streamed to CVP like with custom TerminAttr,\n'
+                             'for example "route\\s239". Disabled by default.')
+    args = parser.parse_args()
+
+    cvp = MockCVP(devices=args.devices, builders=args.builders, routes=args.routes, containers=args.containers,
+                  change_ratio=args.change_ratio, lost_ratio=args.lost_ratio, session_ttl=args.session_ttl,
+                  task_duration=args.task_duration, task_failure_ratio=args.task_failure_ratio,
+                  static_config_lines=args.static_config_lines, drift_ratio=args.drift_ratio,
+                  running_config_filter=args.running_config_filter)
+    server = MockCVPServer((args.host, args.port), cvp,
+                           latency=parse_endpoint_values(args.latency, scale=0.001),
+                           error_rate=parse_endpoint_values(args.error_rate),
+                           gen_latency_per_device=args.gen_latency_per_device / 1000)
+    print('Mock CVP is listening on http://%s:%s' % server.server_address[:2], flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -53,12 +53,55 @@ else:
     user = CVPGlobalVariables.getValue(GlobalVariableNames.CVP_USERNAME)
     passwd = CVPGlobalVariables.getValue(GlobalVariableNames.CVP_PASSWORD)
     
+# fetch `router multicast` section only instead of rendering the whole running config in JSON
+# set to False to collect the full running config in JSON format
+SECTION_SCOPED_FETCH = True
+
+
+def parse_mcast_ipv4_section(section_text):
+    # returns config lines right under `router multicast > ipv4` from `show running-config section` text output
+    lines = list()
+    in_router_multicast = False
+    ipv4_indent = None
+    child_indent = None
+    for raw_line in section_text.splitlines():
+        line = raw_line.rstrip()
+        stripped = line.lstrip()
+        if not stripped or stripped.startswith('!'):
+            continue
+        indent = len(line) - len(stripped)
+        if indent == 0:
+            in_router_multicast = (stripped == 'router multicast')
+            ipv4_indent = None
+            continue
+        if not in_router_multicast:
+            continue
+        if ipv4_indent is None:
+            if stripped == 'ipv4':
+                ipv4_indent = indent
+                child_indent = None
+            continue
+        if indent <= ipv4_indent:
+            # end of `ipv4` section
+            ipv4_indent = None
+            continue
+        if child_indent is None:
+            child_indent = indent
+        if indent == child_indent:
+            lines.append(stripped)
+    return lines
+
+
 device = Device(device_ip, username=user, password=passwd)
-cmdList = ['enable', 'show running-config']
-# get `router multicast` config section
-mcast_config = device.runCmds(cmdList)[1]['response']['cmds']['router multicast']['cmds']['ipv4']['cmds'].keys()
+if SECTION_SCOPED_FETCH:
+    cmdList = ['enable', 'show running-config section router multicast']
+    mcast_config = parse_mcast_ipv4_section(device.runCmds(cmdList, 'text')[1]['response']['output'])
+else:
+    cmdList = ['enable', 'show running-config']
+    # get `router multicast` config section
+    mcast_config = device.runCmds(cmdList)[1]['response']['cmds']['router multicast']['cmds']['ipv4']['cmds'].keys()
 # re-build multicast config from the device running config
-print('router multicast')
-print('   ipv4')
-for line in mcast_config:
-  print(' '*6+line)
+# the configlet is joined and printed at once, devices can have tens of thousands of routes
+configlet = ['router multicast', '   ipv4']
+configlet.extend(' '*6+line for line in mcast_config)
+print('\n'.join(configlet))
@@ -0,0 +1,653 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Asyncio API
+Asynchronous CVP client and reconcile pipeline for asyncio based services,
+so many reconciles and other CVP calls can share one event loop without blocking threads.
+Requires aiohttp, which is not needed by trigger-mcast-reconcile.py:
+
+    from mcast_reconcile.aio import AsyncCVP, reconcile
+
+    async with AsyncCVP('https://cvp.example.com', 'cvpadmin', password) as cvp_api:
+        result = await reconcile(cvp_api, containers=['Leafs'], batch=True)
+        print(result.to_dict())
+
+AsyncCVP mirrors the methods of mcast_reconcile.cvp.CVP. Steps that do not talk to CVP (discovery mapping,
+generation chunks, planning, commit journaling and task polling) are imported from mcast_reconcile.reconcile
+and mcast_reconcile.tasks, the coroutines here only await CVP requests.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is only required by the asyncio API
+    aiohttp = None
+
+from mcast_reconcile.compare import config_diff_summary
+from mcast_reconcile.cvp import BaseCVP, CVPError
+from mcast_reconcile.metrics import Metrics, instrument_methods
+from mcast_reconcile.models import ConfigletStore, Device
+from mcast_reconcile.reconcile import (
+    ReconcileResult, TargetNotFound, build_discovery, configlets_to_delete, generation_chunks, log_config_diff,
+    merge_generation_chunks, plan_changes, planned_assignments, reassign_configlets, record_drifted_devices,
+    recorded_save, replaced_configlets_to_log, select_devices_by_name, skip_drifted_devices, split_timed_out_chunk)
+from mcast_reconcile.tasks import TaskPoller, check_batch, task_batches
+
+
+class Response(object):
+    # aiohttp response with the body read at once and requests.Response attributes used by CVP error handling
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+
+@instrument_methods(exclude=['close', 'lock'])
+class AsyncCVP(BaseCVP):
+
+    # errors of failed CVP requests
+    request_errors = (CVPError, aiohttp.ClientError, asyncio.TimeoutError) if aiohttp else (CVPError, asyncio.TimeoutError)
+
+    def __init__(self, url_prefix, cvp_username, cvp_password, max_connections=10,
+                 retries=3, backoff=0.5, connect_timeout=10, metrics=None):
+        # max_connections: max number of concurrent connections, must be not less than the number of concurrent workers
+        # retries: number of retries for GET requests failed with 5xx, 429, timeout or connection error
+        # backoff: base delay in seconds, doubled on every retry with a random jitter
+        # metrics: Metrics instance to record request statistics, a new one is created if not specified
+        # the client is authenticated with login() or when used as an async context manager
+        if aiohttp is None:
+            raise ImportError('aiohttp is required by the asyncio API, install it with: pip install aiohttp')
+        self.metrics = metrics or Metrics()
+        self.session = None
+        self.max_connections = max_connections
+        self.cvp_url_prefix = url_prefix
+        self.cvp_username = cvp_username
+        self.cvp_password = cvp_password
+        self.timeout = 60
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.temp_task_list = list()  # list of temp tasks to save and execute
+        self.configlet_page_size = 500  # number of configlets requested from getConfiglets.do at once
+        self.configlet_name_index = None  # cached name index, see get_configlet_name_index()
+        # configlets interned by key, use get_configlet_config() to get the config, Configlet.config is not available
+        self.configlet_store = ConfigletStore()
+        self.login_count = 0  # incremented on every successful login
+        # asyncio locks by name, created by lock() in the running event loop:
+        # 'login' - one login at a time, 'configlet_name_index' - the name index is built once,
+        # 'commit' - temp actions and topology saves are shared by the session, commits of concurrent reconciles are serialized
+        self.locks = dict()
+
+    def lock(self, name):
+        # the client can be created outside of the event loop it's used in, so locks are created on first use
+        lock = self.locks.get(name)
+        if lock is None:
+            lock = self.locks[name] = asyncio.Lock()
+        return lock
+
+    async def __aenter__(self):
+        await self.login()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def login(self):
+        if self.session is None:
+            # CVP is often accessed by IP address, cookies for IP addresses are rejected by the default cookie jar
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, ssl=False),
+                cookie_jar=aiohttp.CookieJar(unsafe=True), headers={'Accept-Encoding': 'gzip, deflate'})
+        url = self.cvp_url_prefix + '/web/login/authenticate.do'
+        authdata = {'userId': self.cvp_username, 'password': self.cvp_password}
+        resp = await self._send('POST', url, data=json.dumps(authdata), timeout=self.timeout)
+        self.handle_errors(resp, task_description='Connecting to CVP')
+        self.login_count += 1
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def reset_session(self):
+        # start a new CVP session, temp actions added in the current session and not saved are dropped by CVP
+        self.temp_task_list = list()
+        async with self.lock('login'):
+            # login() creates the new session before the first await, other tasks never see a closed session
+            old_session, self.session = self.session, None
+            try:
+                await self.login()
+            except self.request_errors as e:
+                # the next request will log in again
+                logging.warning(f'Can not log in to CVP after the session reset: {e}')
+            finally:
+                if old_session is not None:
+                    await old_session.close()
+
+    async def _send(self, method, url, timeout=None, data=None, headers=None):
+        # send a request, GET requests are retried on 5xx, 429, timeouts and connection errors
+        # timeout: read timeout in seconds, endpoint specific timeout is used if not specified
+        timeout = timeout or self.read_timeout(url)
+        client_timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=timeout)
+        retries = self.retries if method == 'GET' else 0
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                async with self.session.request(method, url, data=data, headers=headers, timeout=client_timeout) as r:
+                    resp = Response(r.status, r.headers, await r.read())
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self.metrics.observe_request(url, method, time.perf_counter() - start, bytes_sent=len(data or ''))
+                if attempt == retries:
+                    raise
+                delay = self.retry_delay(attempt)
+                logging.warning(f'{method} {urlparse(url).path} failed: {e!r}. Retrying in {delay:.1f}s.')
+            else:
+                # Content-Length is the size on the wire for compressed responses
+                bytes_received = resp.headers.get('Content-Length', '')
+                self.metrics.observe_request(
+                    url, method, time.perf_counter() - start, status_code=resp.status_code, bytes_sent=len(data or ''),
+                    bytes_received=int(bytes_received) if bytes_received.isdigit() else len(resp.content))
+                if (resp.status_code not in self.retry_status_codes) or (attempt == retries):
+                    return resp
+                # a server asking to wait longer than the read timeout is not waited for longer than that
+                delay = self.retry_delay(attempt, resp, max_delay=timeout)
+                logging.warning(
+                    f'{method} {urlparse(url).path} failed with status code {resp.status_code}. Retrying in {delay:.1f}s.')
+            self.metrics.observe_retry(url)
+            await asyncio.sleep(delay)
+
+    async def _request(self, method, url, timeout=None, **kwargs):
+        # send a request to CVP and login again once if the session has expired
+        login_count = self.login_count
+        resp = await self._send(method, url, timeout=timeout, **kwargs)
+        if self.session_expired(resp):
+            async with self.lock('login'):
+                # other tasks could have already logged in again
+                if login_count == self.login_count:
+                    logging.info('CVP session has expired. Logging in again.')
+                    await self.login()
+            resp = await self._send(method, url, timeout=timeout, **kwargs)
+        return resp
+
+    async def iter_configlets(self, include_config=False):
+        # yields configlets page by page, every page has up to self.configlet_page_size configlets
+        # include_config: keep configlet config, it's dropped by default to save memory
+        start_index = 0
+        while True:
+            url = self.cvp_url_prefix + \
+                '/cvpservice/configlet/getConfiglets.do?startIndex=%s&endIndex=%s' % (
+                    start_index, start_index + self.configlet_page_size)
+            resp = await self._request('GET', url)
+            self.handle_errors(
+                resp, task_description='Collecting configlet inventory')
+            resp_json = resp.json()
+            del resp  # release the raw response before processing the page
+            for configlet in resp_json['data']:
+                if not include_config:
+                    configlet.pop('config', None)
+                yield configlet
+            start_index += self.configlet_page_size
+            if (len(resp_json['data']) < self.configlet_page_size) or (start_index >= resp_json.get('total', 0)):
+                break
+
+    async def get_configlets(self, include_config=True):
+        d = dict()
+        async for configlet in self.iter_configlets(include_config=include_config):
+            d.update({
+                configlet['key']: configlet
+            })
+        return d
+
+    async def get_configlet_name_index(self, refresh=False):
+        # returns { 'configlet name': { 'key': 'configlet key', 'type': 'configlet type' }, ... }
+        # the index is built once per session, use refresh to build it again
+        async with self.lock('configlet_name_index'):
+            if refresh or (self.configlet_name_index is None):
+                index = dict()
+                async for configlet in self.iter_configlets():
+                    index[configlet['name']] = {'key': configlet['key'], 'type': configlet['type']}
+                self.configlet_name_index = index
+            return self.configlet_name_index
+
+    async def get_devices(self, provisioned=False):
+        # provisioned: True - provisioned only, False - full inventory, including Undefined container
+        # returns { 'serialNumber': Device, ... }
+        url = self.cvp_url_prefix + '/cvpservice/inventory/devices?provisioned=%s' % provisioned
+        resp = await self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Collecting device inventory')
+        d = dict()
+        for device in resp.json():
+            d.update({
+                device['serialNumber']: Device.from_cvp(device)
+            })
+        return d
+
+    async def get_containers(self):
+        url = self.cvp_url_prefix + '/cvpservice/inventory/containers'
+        resp = await self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Collecting container inventory')
+        d = dict()
+        for container in resp.json():
+            d.update({
+                container['Key']: container
+            })
+        return d
+
+    async def find_container_id(self, container_name):
+        container_inventory = await self.get_containers()
+        for container_key, container_details in container_inventory.items():
+            if container_details['Name'] == container_name:
+                return container_key
+
+    async def find_builder_id(self, builder_name):
+        cfglet_details = (await self.get_configlet_name_index()).get(builder_name)
+        if cfglet_details and (cfglet_details['type'] == 'Builder'):
+            return cfglet_details['key']
+
+    async def get_device_serials_in_container(self, container_key):
+        url = self.cvp_url_prefix + \
+            '/cvpservice/provisioning/getNetElementList.do?nodeId=%s&startIndex=0&endIndex=0&ignoreAdd=true' % container_key
+        resp = await self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Collecting devices in a container')
+        d = dict()
+        for device in resp.json()['netElementList']:
+            d.update({
+                device['serialNumber']: device
+            })
+        return d
+
+    async def generate_configlets_from_builder(self, builder_key, netelement_key_list, container_key, timeout=None):
+        # timeout: request timeout in seconds, self.timeout is used if not specified
+        url = self.cvp_url_prefix + '/cvpservice/configlet/autoConfigletGenerator.do'
+        payload = {
+            'configletBuilderId': builder_key,
+            'netElementIds': netelement_key_list,
+            'containerId': container_key,
+            'pageType': 'string'
+        }
+        resp = await self._request('POST', url, data=json.dumps(payload), timeout=timeout)
+        self.handle_errors(
+            resp, task_description='Generating updated configlets from builder')
+        return resp.json()
+
+    async def _get_configlet_list_for_a_device(self, netelement_id):
+        url = self.cvp_url_prefix + \
+            '/cvpservice/provisioning/getConfigletsByNetElementId.do?netElementId=%s&startIndex=0&endIndex=0' % netelement_id
+        resp = await self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Collecting container inventory')
+        return resp.json()['configletList']
+
+    async def get_configlets_for_a_device(self, netelement_id):
+        # configlets shared by devices are stored once, config bodies are dropped
+        return [
+            self.configlet_store.intern(configlet) for configlet in await self._get_configlet_list_for_a_device(netelement_id)
+        ]
+
+    async def get_config_comparison(self, netelement_id):
+        # designed config (configlets assigned to a device applied to its running config) compared with the running
+        # config by CVP, lines filtered by TerminAttr are missing in the running config
+        # returns designed and running config lines: [ { 'command': 'config line', 'code': '' if not different }, ... ]
+        configlet_keys = [configlet['key'] for configlet in await self._get_configlet_list_for_a_device(netelement_id)]
+        url = self.cvp_url_prefix + '/cvpservice/provisioning/v2/validateAndCompareConfiglets.do'
+        payload = {'netElementId': netelement_id, 'configIdList': configlet_keys, 'pageType': 'viewConfig'}
+        resp = await self._request('POST', url, data=json.dumps(payload))
+        self.handle_errors(
+            resp, task_description='Comparing designed and running config of %s' % netelement_id)
+        result = resp.json()
+        return result['designedConfig'], result['runningConfig']
+
+    async def get_configlet_config(self, configlet_key):
+        url = self.cvp_url_prefix + '/cvpservice/configlet/getConfigletById.do?id=%s' % configlet_key
+        resp = await self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Collecting configlet %s' % configlet_key)
+        return resp.json()['config']
+
+    async def addTempAction(self, chunk_size=None):
+        # chunk_size: max number of temp tasks sent in a single request, None - send all tasks at once
+        if len(self.temp_task_list):
+            url = self.cvp_url_prefix + \
+                '/cvpservice/provisioning/addTempAction.do?nodeId=root&format=topology'
+            headers = {'content-type': "application/json", }
+            if not chunk_size:
+                chunk_size = len(self.temp_task_list)
+            for i in range(0, len(self.temp_task_list), chunk_size):
+                payload = {'data': self.temp_task_list[i:i+chunk_size]}
+                resp = await self._request('POST', url, data=json.dumps(
+                    payload), headers=headers)
+                self.handle_errors(
+                    resp, task_description='Trying to add temp tasks to CVP')
+            self.temp_task_list = list()  # clean temp task list
+
+    async def save_topology(self):
+        # returns the list of IDs of tasks created by CVP
+        url = self.cvp_url_prefix + '/cvpservice/provisioning/v2/saveTopology.do'
+        resp = await self._request('POST', url, data=json.dumps([]))
+        self.handle_errors(resp, task_description='Saving topology')
+        data = resp.json().get('data')
+        if not isinstance(data, dict):
+            return list()
+        return [str(task_id) for task_id in data.get('taskIds') or list()]
+
+    async def delete_configlets(self, configlet_list):
+        url = self.cvp_url_prefix + '/cvpservice/configlet/deleteConfiglet.do'
+        configlets_to_delete = list()
+        for configlet in configlet_list:
+            d = {'name': configlet.name, 'key': configlet.key}
+            configlets_to_delete.append(d)
+        resp = await self._request('POST', url, data=json.dumps(
+            configlets_to_delete))
+        self.handle_errors(resp, task_description='Deleting configlets')
+
+    async def get_tasks(self, query_param='Pending'):
+        url = self.cvp_url_prefix + \
+            '/cvpservice/task/getTasks.do?queryparam=%s&startIndex=0&endIndex=0' % query_param
+        resp = await self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Checking for existing tasks.')
+
+        d = {
+            'total': resp.json()['total'],
+            'data': resp.json()['data']
+        }
+
+        return d
+
+    async def execute_tasks(self, task_id_list):
+        url = self.cvp_url_prefix + '/cvpservice/task/executeTask.do'
+        payload = {'data': task_id_list}
+        headers = {'content-type': "application/json", }
+        resp = await self._request('POST', url, data=json.dumps(
+            payload), headers=headers)
+        self.handle_errors(
+            resp, task_description='Executing tasks')
+
+    async def get_task_by_id(self, task_id):
+        url = self.cvp_url_prefix + '/cvpservice/task/getTaskById.do?taskId=%s' % task_id
+        resp = await self._request('GET', url)
+        self.handle_errors(resp, task_description='Checking task %s' % task_id)
+        return resp.json()
+
+    async def device_is_compliant(self, device_id):
+        url = self.cvp_url_prefix + '/cvpservice/provisioning/checkCompliance.do'
+        d = {'nodeId': device_id, 'nodeType': 'netelement'}
+        resp = await self._request('POST', url, data=json.dumps(d))
+        self.handle_errors(resp, task_description='Checking compliance of %s' % device_id)
+        if resp.json()['complianceCode'] != '0000':
+            return False  # not compliant
+        else:
+            return True  # compliant
+
+
+async def gather_bounded(coroutines, limit):
+    # run coroutines concurrently, not more than limit at the same time
+    # returns results in the order of coroutines
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*[run(coroutine) for coroutine in coroutines])
+
+
+async def select_devices(cvp_api, device_inventory, containers=None, devices=None):
+    # select devices in containers or matching serial numbers, system MACs or hostnames
+    # returns device inventory subset, the full inventory is returned if nothing was selected
+    if not containers and not devices:
+        return device_inventory
+    selected_serials = set()
+    for container_name in containers or list():
+        container_key = await cvp_api.find_container_id(container_name)
+        if not container_key:
+            raise TargetNotFound(f'Container {container_name} was not found.')
+        selected_serials.update((await cvp_api.get_device_serials_in_container(container_key)).keys())
+    return select_devices_by_name(device_inventory, devices, selected_serials)
+
+
+async def find_builder_keys(cvp_api, builder_names):
+    # returns configlet builder keys for the list of builder names
+    builder_keys = list()
+    for builder_name in builder_names:
+        builder_key = await cvp_api.find_builder_id(builder_name)
+        if not builder_key:
+            raise TargetNotFound(f'Configlet builder {builder_name} was not found.')
+        builder_keys.append(builder_key)
+    return builder_keys
+
+
+async def discover(cvp_api, device_inventory, workers=10, known_configlets=None, builder_keys=None):
+    # find configlets assigned to every device in the inventory and map devices to builders
+    # known_configlets: { 'systemMacAddress': [ assigned Configlet, ... ] } already known and not requested from CVP
+    # builder_keys: reconcile only configlets generated by these builders, all builders are reconciled if not specified
+    known_configlets = known_configlets or dict()
+    device_list = list(device_inventory.values())
+
+    async def get_configlets(device):
+        if device.system_mac_address in known_configlets:
+            return known_configlets[device.system_mac_address]
+        return await cvp_api.get_configlets_for_a_device(device.system_mac_address)
+
+    configlet_lists = await gather_bounded([get_configlets(device) for device in device_list], workers)
+    return build_discovery(zip(device_list, configlet_lists), builder_keys=builder_keys)
+
+
+async def generate_configlets_for_device_chunk(cvp_api, builder_id, device_list, container_id, timeout=None):
+    # generate configlets for a chunk of devices
+    # if the request times out, the chunk is split in half and every half is retried
+    # returns [ ( 'netElementId', Configlet ), ... ]
+    try:
+        data = (await cvp_api.generate_configlets_from_builder(builder_id, device_list, container_id, timeout=timeout))['data']
+        return [(d.get('netElementId'), cvp_api.configlet_store.intern(d['configlet'])) for d in data]
+    except asyncio.TimeoutError:
+        first_half, second_half = split_timed_out_chunk(builder_id, device_list)
+        return await generate_configlets_for_device_chunk(cvp_api, builder_id, first_half, container_id, timeout) + \
+            await generate_configlets_for_device_chunk(cvp_api, builder_id, second_half, container_id, timeout)
+
+
+async def generate_configlets(cvp_api, builder_device_map, workers=4, chunk_size=100, timeout=None):
+    # use configlet builders to generate new configlets for every builder/container bundle
+    # device lists are split into chunks and not more than workers chunks are generated at the same time
+    # returns { ( 'cfglet_builder_key', 'parentContainerKey' ): [ ( 'netElementId', Configlet ), ... ], ... }
+    chunks = generation_chunks(builder_device_map, chunk_size=chunk_size)
+    results = await gather_bounded([
+        generate_configlets_for_device_chunk(cvp_api, bundle[0], device_list, bundle[1], timeout)
+        for bundle, device_list in chunks
+    ], workers)
+    return merge_generation_chunks(chunks, results)
+
+
+async def log_config_diffs(cvp_api, device_plans, workers=10):
+    # config text is not kept in memory, configs of replaced configlets are fetched concurrently to log the diff
+    replaced_configlets = replaced_configlets_to_log(device_plans)
+    if not replaced_configlets:
+        return
+
+    async def diff(configlet, new_cfglet):
+        old_config, new_config = await asyncio.gather(
+            cvp_api.get_configlet_config(configlet.key), cvp_api.get_configlet_config(new_cfglet.key))
+        return config_diff_summary(old_config, new_config)
+
+    diffs = await gather_bounded([diff(*pair) for pair in replaced_configlets], workers)
+    for (configlet, new_cfglet), diff_lines in zip(replaced_configlets, diffs):
+        log_config_diff(configlet, new_cfglet, diff_lines)
+
+
+async def verify_assigned_configlets(cvp_api, device_plans, known_configlets, workers=10):
+    # configlets assigned to devices planned with known configlets are collected from CVP again,
+    # see mcast_reconcile.reconcile.verify_assigned_configlets()
+    planned_keys = planned_assignments(device_plans, known_configlets)
+    configlet_lists = await gather_bounded([cvp_api.get_configlets_for_a_device(mac) for mac in planned_keys], workers)
+    return skip_drifted_devices(device_plans, planned_keys, dict(zip(planned_keys, configlet_lists)))
+
+
+async def make_plan(cvp_api, device_inventory, workers=10, gen_workers=4, gen_chunk_size=100, gen_timeout=180,
+                    known_configlets=None, builder_keys=None, log_diffs=True):
+    # read-only part of reconcile: discovery, configlet generation and matching
+    # known_configlets: configlets assigned to devices with a detected change are verified on CVP, changed devices are skipped
+    # log_diffs: log config diffs of replaced configlets, reconcile() logs them after the commit instead
+    # returns the discovery data and the list of plans for devices with a detected change
+    metrics = cvp_api.metrics
+    with metrics.phase('discovery'):
+        discovery = await discover(cvp_api, device_inventory, workers=workers, known_configlets=known_configlets,
+                                   builder_keys=builder_keys)
+    with metrics.phase('generation'):
+        generated_configlets = await generate_configlets(
+            cvp_api, discovery.builder_device_map, workers=gen_workers, chunk_size=gen_chunk_size, timeout=gen_timeout)
+    with metrics.phase('matching'):
+        device_plans = plan_changes(discovery, generated_configlets)
+    if known_configlets:
+        with metrics.phase('verification'):
+            device_plans, drifted_devices = await verify_assigned_configlets(
+                cvp_api, device_plans, known_configlets, workers=workers)
+        record_drifted_devices(discovery, drifted_devices)
+    if log_diffs:
+        with metrics.phase('diff'):
+            await log_config_diffs(cvp_api, device_plans, workers=workers)
+    return discovery, device_plans
+
+
+async def commit_changes(cvp_api, device_plans, batch=False, batch_size=500, journal=None):
+    # reassign configlets for every planned device, see mcast_reconcile.reconcile.commit_changes()
+    # returns the list of IDs of tasks created by CVP
+    task_ids = list()
+    async with cvp_api.lock('commit'):
+        try:
+            for plans_to_save in reassign_configlets(cvp_api, device_plans, batch=batch):
+                with recorded_save(cvp_api, plans_to_save, journal=journal) as saved_task_ids:
+                    await cvp_api.addTempAction(chunk_size=batch_size)
+                    saved_task_ids.extend(await cvp_api.save_topology())
+                task_ids.extend(saved_task_ids)
+        except Exception:
+            # temp actions added before the failure must not be saved by the next commit with the same client,
+            # failures caused by unexpected CVP responses included
+            logging.info('Starting a new CVP session to drop temp actions that were not saved.')
+            await cvp_api.reset_session()
+            raise
+        finally:
+            cvp_api.temp_task_list = list()
+    return task_ids
+
+
+async def delete_unused_configlets(cvp_api, device_plans, unused_configlets=()):
+    # delete configlets that are no longer required after the reassignment
+    configlets_to_be_deleted = configlets_to_delete(device_plans, unused_configlets)
+    if configlets_to_be_deleted:
+        logging.info('Deleting configlets that are no longer required.')
+        await cvp_api.delete_configlets(configlets_to_be_deleted)
+
+
+async def wait_for_tasks(cvp_api, task_ids, workers=10, timeout=3600, min_delay=1, max_delay=30):
+    # poll tasks until all of them reach a final state, see mcast_reconcile.tasks.wait_for_tasks()
+    # returns { 'task ID': 'final state' }
+    poller = TaskPoller(task_ids, timeout=timeout, min_delay=min_delay, max_delay=max_delay)
+    while True:
+        pending = poller.pending
+        poller.update(pending, await gather_bounded([cvp_api.get_task_by_id(task_id) for task_id in pending], workers))
+        if poller.done:
+            return poller.final_states
+        await asyncio.sleep(poller.next_delay())
+
+
+async def execute_tasks(cvp_api, task_ids, batch_size=50, workers=10, timeout=3600):
+    # execute tasks in batches of batch_size, see mcast_reconcile.tasks.execute_tasks()
+    for batch, not_executed in task_batches(task_ids, batch_size=batch_size):
+        await cvp_api.execute_tasks(batch)
+        check_batch(await wait_for_tasks(cvp_api, batch, workers=workers, timeout=timeout), not_executed)
+    logging.info(f'{len(task_ids)} tasks were executed successfully.')
+
+
+async def apply_changes(cvp_api, device_plans, batch=False, batch_size=500, execute=False, execute_batch_size=50,
+                        execute_timeout=3600, workers=10, journal=None, unused_configlets=(), log_diffs=False):
+    # write part of reconcile, see mcast_reconcile.reconcile.apply_changes()
+    # returns the list of IDs of tasks created by CVP
+    with cvp_api.metrics.phase('commit'):
+        task_ids = await commit_changes(cvp_api, device_plans, batch=batch, batch_size=batch_size, journal=journal)
+    if journal:
+        journal.record_phase('commit')
+    if log_diffs:
+        with cvp_api.metrics.phase('diff'):
+            await log_config_diffs(cvp_api, device_plans, workers=workers)
+    with cvp_api.metrics.phase('delete'):
+        await delete_unused_configlets(cvp_api, device_plans, unused_configlets)
+    if journal:
+        journal.record_phase('delete')
+    if execute and task_ids:
+        with cvp_api.metrics.phase('execute'):
+            await execute_tasks(cvp_api, task_ids, batch_size=execute_batch_size, workers=workers,
+                                timeout=execute_timeout)
+        if journal:
+            journal.record_phase('execute')
+    return task_ids
+
+
+async def reconcile(cvp_api, device_inventory=None, containers=None, devices=None, builders=None, workers=10,
+                    batch=False, batch_size=500, gen_workers=4, gen_chunk_size=100, gen_timeout=180,
+                    known_configlets=None, execute=False, execute_batch_size=50, execute_timeout=3600, journal=None):
+    # run discovery, configlet generation, planning and commit
+    # device_inventory: { 'serial number': Device } to reconcile, the full CVP inventory is used if not specified
+    # containers, devices, builders: reconcile only selected containers, devices and builders, see trigger options
+    # journal: mcast_reconcile.journal.Journal to record the plan, commit results and completed phases
+    # returns ReconcileResult
+    start = time.time()
+    if device_inventory is None:
+        with cvp_api.metrics.phase('inventory'):
+            device_inventory = await cvp_api.get_devices()
+    device_inventory = await select_devices(cvp_api, device_inventory, containers=containers, devices=devices)
+    builder_keys = await find_builder_keys(cvp_api, builders) if builders else None
+    discovery, device_plans = await make_plan(
+        cvp_api, device_inventory, workers=workers, gen_workers=gen_workers, gen_chunk_size=gen_chunk_size,
+        gen_timeout=gen_timeout, known_configlets=known_configlets, builder_keys=builder_keys, log_diffs=False)
+    if journal:
+        journal.record_plan(device_plans, discovery.unused_configlets)
+    task_ids = await apply_changes(
+        cvp_api, device_plans, batch=batch, batch_size=batch_size, execute=execute,
+        execute_batch_size=execute_batch_size, execute_timeout=execute_timeout, workers=workers, journal=journal,
+        unused_configlets=discovery.unused_configlets, log_diffs=True)
+    return ReconcileResult(device_inventory, discovery, device_plans, task_ids=task_ids, duration=time.time() - start)
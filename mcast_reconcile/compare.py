@@ -0,0 +1,161 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Configlet comparison
+Configlet text is normalized into a canonical set of config lines before comparison,
+so differences in line order, trailing whitespace, line endings, blank lines and comments
+do not cause configlet updates.
+Every canonical line includes its parent sections, for example `router multicast > ipv4 > route 239.1.1.1 ...`,
+so lines with the same text in different sections are not mixed up.
+Lines matching an ignore pattern are skipped together with their child lines,
+the same way as lines filtered by TerminAttr `-running_config_filter` are not streamed to CVP.
+Configlets with hundreds of thousands of routes are processed line by line:
+the digest is a sum of hashes of unique lines and comparisons keep line hashes instead of lines,
+so memory does not grow with the configlet size.
+"""
+
+import hashlib
+
+DIGEST_MASK = (1 << 128) - 1
+
+
+def iter_config_lines(config):
+    # yields config lines one by one without splitting the whole config at once
+    start = 0
+    find = config.find
+    while True:
+        end = find('\n', start)
+        if end < 0:
+            if start < len(config):
+                yield config[start:]
+            return
+        yield config[start:end]
+        start = end + 1
+
+
+def iter_canonical_lines(config, ignore=None, keep_skipped=False):
+    # yields canonical config lines, a line is yielded again if it's repeated in the config
+    # config: config text or an iterable of config lines
+    # ignore: compiled regex, matching lines and their child lines are skipped
+    # keep_skipped: yield None for skipped lines, so canonical lines can be matched with config lines
+    # siblings share the parent prefix, so it's built only when the indentation changes
+    search = ignore.search if ignore is not None else None
+    config_lines = iter_config_lines(config) if isinstance(config, str) else config
+    parents = list()  # [ ( indent, 'canonical parent line', ignored ), ... ]
+    prefix, parent_ignored = '', False  # 'canonical parent line > ' for the current indentation
+    previous_indent, previous_line, previous_ignored = -1, None, False
+    for raw_line in config_lines:
+        stripped = raw_line.strip()
+        if not stripped or stripped[0] == '!':
+            if keep_skipped:
+                yield None
+            continue
+        # all characters before the first character of the stripped line are whitespace
+        indent = raw_line.find(stripped[0])
+        if indent != previous_indent:
+            if indent > previous_indent and previous_line is not None:
+                parents.append((previous_indent, previous_line, previous_ignored))
+            else:
+                while parents and parents[-1][0] >= indent:
+                    parents.pop()
+            if parents:
+                _, parent_line, parent_ignored = parents[-1]
+                prefix = parent_line + ' > '
+            else:
+                prefix, parent_ignored = '', False
+            previous_indent = indent
+        canonical_line = prefix + stripped
+        ignored = parent_ignored or (search is not None and search(stripped) is not None)
+        if not ignored:
+            yield canonical_line
+        elif keep_skipped:
+            yield None
+        previous_line, previous_ignored = canonical_line, ignored
+
+
+def canonical_lines(config, ignore=None):
+    # returns a set of canonical config lines
+    return set(iter_canonical_lines(config, ignore=ignore))
+
+
+def canonical_line_hashes(config, ignore=None):
+    # returns a set of canonical line hashes, much smaller than the set of lines for large configs
+    # the hashes are only valid within the process and must not be stored
+    return {hash(line) for line in iter_canonical_lines(config, ignore=ignore)}
+
+
+def config_digest(config):
+    # hash of the canonical config, equal for configs that differ only in formatting, line order or repeated lines
+    # hashes of unique lines are summed up, so the config is hashed in a single pass without sorting or keeping lines
+    # lines are deduplicated by the same process local hashes as in configs_equal(), so both compare sets of lines
+    total = 0
+    seen = set()
+    blake2b = hashlib.blake2b
+    for line in iter_canonical_lines(config):
+        line_hash = hash(line)
+        if line_hash in seen:
+            continue
+        seen.add(line_hash)
+        total += int.from_bytes(blake2b(line.encode(), digest_size=16).digest(), 'big')
+    return '%032x' % (total & DIGEST_MASK)
+
+
+def configs_equal(old_config, new_config, ignore=None):
+    if old_config == new_config:
+        return True
+    return canonical_line_hashes(old_config, ignore=ignore) == canonical_line_hashes(new_config, ignore=ignore)
+
+
+def config_diff(old_config, new_config, ignore=None):
+    # returns sorted lists of added and removed canonical lines
+    # only line hashes of both configs and changed lines are kept in memory
+    old_hashes = canonical_line_hashes(old_config, ignore=ignore)
+    new_hashes = set()
+    added = set()
+    for line in iter_canonical_lines(new_config, ignore=ignore):
+        line_hash = hash(line)
+        new_hashes.add(line_hash)
+        if line_hash not in old_hashes:
+            added.add(line)
+    removed = {line for line in iter_canonical_lines(old_config, ignore=ignore) if hash(line) not in new_hashes}
+    return sorted(added), sorted(removed)
+
+
+def config_diff_summary(old_config, new_config, max_lines=20, ignore=None):
+    # returns a list of log lines describing the change
+    added, removed = config_diff(old_config, new_config, ignore=ignore)
+    summary = [f'{len(added)} lines added, {len(removed)} lines removed']
+    diff_lines = [f'+ {line}' for line in added] + [f'- {line}' for line in removed]
+    summary.extend(diff_lines[:max_lines])
+    if len(diff_lines) > max_lines:
+        summary.append(f'... and {len(diff_lines) - max_lines} more')
+    return summary
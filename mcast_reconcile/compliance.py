@@ -0,0 +1,144 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Compliance sweep
+Checks compliance of many devices concurrently with a limited rate of compliance checks,
+so only devices that are out of compliance are sent to reconcile.
+Devices with a custom TerminAttr are never compliant, as filtered config lines are not streamed to CVP.
+For such devices lines matching the ignore pattern are removed from the comparison of designed and running config
+done by CVP, and devices where only ignored lines differ are considered compliant.
+"""
+
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mcast_reconcile.compare import iter_canonical_lines
+
+# POSIX character classes supported by TerminAttr -running_config_filter and their Python equivalents
+POSIX_CLASSES = {
+    'alnum': 'a-zA-Z0-9',
+    'alpha': 'a-zA-Z',
+    'blank': ' \\t',
+    'cntrl': '\\x00-\\x1f\\x7f',
+    'digit': '0-9',
+    'graph': '\\x21-\\x7e',
+    'lower': 'a-z',
+    'print': '\\x20-\\x7e',
+    'punct': '!-/:-@\\[-`{-~',
+    'space': '\\s',
+    'upper': 'A-Z',
+    'word': '\\w',
+    'xdigit': '0-9A-Fa-f',
+}
+
+
+def compile_ignore_pattern(pattern):
+    # pattern: -running_config_filter regex, for example route[[:space:]]239
+    # raises re.error if the pattern is not valid
+    return re.compile(re.sub(
+        r'\[:(\w+):\]', lambda m: POSIX_CLASSES.get(m.group(1), m.group(0)), pattern))
+
+
+def differing_lines(config_lines, ignore=None):
+    # config_lines: designed or running config lines of the CVP config comparison
+    # returns canonical lines reported by CVP as different, lines matching ignore and their child lines are skipped
+    canonical_lines = iter_canonical_lines(
+        (config_line['command'] for config_line in config_lines), ignore=ignore, keep_skipped=True)
+    return [
+        canonical_line for config_line, canonical_line in zip(config_lines, canonical_lines)
+        if canonical_line is not None and config_line.get('code')
+    ]
+
+
+class RateLimiter(object):
+    # spreads calls evenly, at most rate calls per second from all threads
+
+    def __init__(self, rate=0):
+        # rate: max calls per second, 0 - unlimited
+        self.interval = 1 / rate if rate else 0
+        self.next_call = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            call_time = max(now, self.next_call)
+            self.next_call = call_time + self.interval
+        time.sleep(call_time - now)
+
+
+def device_is_compliant(cvp_api, device, rate_limiter, ignore=None):
+    # ignore: compiled regex, lines ignored when designed and running config are compared
+    # config lines CVP does not design (show running-config header, end, defaults, hashed secrets) are the same
+    # on both sides of the CVP comparison, so only lines CVP reports as different are checked
+    rate_limiter.wait()
+    if cvp_api.device_is_compliant(device.system_mac_address):
+        return True
+    if ignore is None:
+        return False
+    # the comparison is a heavier request than the compliance check, it's rate limited as well
+    rate_limiter.wait()
+    designed_lines, running_lines = cvp_api.get_config_comparison(device.system_mac_address)
+    missing_lines = differing_lines(designed_lines, ignore=ignore)
+    unexpected_lines = differing_lines(running_lines, ignore=ignore)
+    if not missing_lines and not unexpected_lines:
+        return True
+    diff_lines = [f'+ {line}' for line in missing_lines] + [f'- {line}' for line in unexpected_lines]
+    summary = [f'{device.hostname} ({device.system_mac_address}) is out of compliance:',
+               f'{len(missing_lines)} designed lines missing, {len(unexpected_lines)} running lines not designed']
+    summary.extend(diff_lines[:10])
+    if len(diff_lines) > 10:
+        summary.append(f'... and {len(diff_lines) - 10} more')
+    logging.info('\n    '.join(summary))
+    return False
+
+
+def compliance_sweep(cvp_api, device_inventory, workers=10, rate=10, ignore_pattern=None):
+    # device_inventory: { 'serial number': Device }
+    # rate: max compliance checks per second, 0 - unlimited
+    # ignore_pattern: -running_config_filter regex
+    # returns { 'serial number': Device } for devices out of compliance
+    ignore = compile_ignore_pattern(ignore_pattern) if ignore_pattern else None
+    rate_limiter = RateLimiter(rate)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            lambda device: device_is_compliant(cvp_api, device, rate_limiter, ignore=ignore), device_inventory.values())
+        non_compliant_devices = {
+            serial: device for (serial, device), compliant in zip(device_inventory.items(), results) if not compliant
+        }
+    logging.info(f'{len(non_compliant_devices)} of {len(device_inventory)} devices are out of compliance.')
+    return non_compliant_devices
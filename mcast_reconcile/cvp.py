@@ -0,0 +1,510 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""CVP REST API client
+Used by trigger-mcast-reconcile.py to collect inventory, generate configlets from builders and update device configlets.
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+import requests.packages.urllib3 as urllib3
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+from mcast_reconcile.metrics import Metrics, instrument_methods  # noqa: E402
+from mcast_reconcile.models import ConfigletStore, Device  # noqa: E402
+
+
+class CVPError(Exception):
+    # raised when a request to CVP REST API fails
+    pass
+
+
+@instrument_methods(exclude=['read_timeout', 'retry_delay'])
+class BaseCVP(object):
+    # request independent part of the CVP client shared by CVP and mcast_reconcile.aio.AsyncCVP
+
+    # response codes that are retried for idempotent requests
+    retry_status_codes = {429, 500, 502, 503, 504}
+    # read timeout in seconds for endpoints returning large data or doing heavy work on CVP, self.timeout is used for others
+    read_timeouts = {
+        'getConfiglets.do': 180,
+        'autoConfigletGenerator.do': 180,
+        'addTempAction.do': 180,
+        'saveTopology.do': 180,
+        'deleteConfiglet.do': 180,
+        'inventory/devices': 180,
+        'validateAndCompareConfiglets.do': 180,
+    }
+
+    @staticmethod
+    def session_expired(r):
+        # CVP returns 401 or an "Unauthorized User" error when the session has expired
+        if r.status_code == 401:
+            return True
+        # avoid parsing large responses, error messages are short
+        if (b'112498' not in r.content) and (b'Unauthorized User' not in r.content):
+            return False
+        try:
+            resp_json = r.json()
+        except ValueError:
+            return False
+        return isinstance(resp_json, dict) and (
+            str(resp_json.get('errorCode')) == '112498' or 'Unauthorized User' in str(resp_json.get('errorMessage', '')))
+
+    def read_timeout(self, url):
+        path = urlparse(url).path
+        for endpoint, read_timeout in self.read_timeouts.items():
+            if path.endswith(endpoint):
+                return read_timeout
+        return self.timeout
+
+    def retry_delay(self, attempt, resp=None, max_delay=None):
+        # exponential backoff with full jitter, Retry-After header is respected if provided
+        # max_delay: upper bound in seconds for Retry-After, self.timeout is used if not specified
+        if resp is not None and resp.headers.get('Retry-After', '').isdigit():
+            return min(int(resp.headers['Retry-After']), max_delay or self.timeout)
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    @staticmethod
+    def handle_errors(r, task_description='A request to CVP REST API'):
+        # handles possible CVP or requests errors
+        if isinstance(r, str):
+            raise CVPError('%s failed!\nERROR: %s' % (
+                task_description, r
+            ))
+        resp_json = None
+        # avoid parsing large responses twice, error messages are short
+        if b'errorCode' in r.content:
+            try:
+                resp_json = r.json()
+            except ValueError:
+                pass
+        if isinstance(resp_json, dict) and 'errorCode' in resp_json:
+            raise CVPError('%s failed!\nERROR code: %s\n   message: %s' % (
+                task_description, resp_json['errorCode'], resp_json.get('errorMessage')
+            ))
+        if not r.ok:
+            err_msg = 'ERROR: %s failed! Wrong status code %s received' % (
+                task_description, r.status_code)
+            raise CVPError(err_msg)
+
+    def addTempTask(self, temp_task_data, info=''):
+        # used to format and add new task to the temp task list
+        taskId = len(self.temp_task_list) + 1
+        d = {
+            "taskId": taskId,
+            "info": info,
+            "infoPreview": info,
+        }
+        d.update(temp_task_data)
+        self.temp_task_list.append(d)
+
+        return d
+
+    def reassign_configlets_to_device(self, device, configlet_list_to_unassign, configlet_list_to_assign):
+
+        info = "Reassigning configlets to device %s" % device.serial_number
+
+        c_names_to_remove = list()
+        c_keys_to_remove = list()
+        b_names_to_remove = list()
+        b_keys_to_remove = list()
+        c_names_to_add = list()
+        c_keys_to_add = list()
+        b_names_to_add = list()
+        b_keys_to_add = list()
+
+        for cfglet in configlet_list_to_unassign:
+            if cfglet.type == 'Builder':
+                b_names_to_remove.append(cfglet.name)
+                b_keys_to_remove.append(cfglet.key)
+            else:
+                c_names_to_remove.append(cfglet.name)
+                c_keys_to_remove.append(cfglet.key)
+
+        for cfglet in configlet_list_to_assign:
+            if cfglet.type == 'Builder':
+                b_names_to_add.append(cfglet.name)
+                b_keys_to_add.append(cfglet.key)
+            else:
+                c_names_to_add.append(cfglet.name)
+                c_keys_to_add.append(cfglet.key)
+
+        task_d = {
+            'action': 'associate',
+            'nodeType': 'configlet',
+            'nodeId': '',
+            'configletList': c_keys_to_add,
+            'configletNamesList': c_names_to_add,
+            'ignoreConfigletNamesList': c_names_to_remove,
+            'ignoreConfigletList': c_keys_to_remove,
+            'configletBuilderList': b_keys_to_add,
+            'configletBuilderNamesList': b_names_to_add,
+            'ignoreConfigletBuilderList': b_keys_to_remove,
+            'ignoreConfigletBuilderNamesList': b_names_to_remove,
+            'toId': device.system_mac_address,
+            'toIdType': 'netelement',
+            'fromId': '',
+            'nodeName': '',
+            'fromName': '',
+            'toName': device.fqdn,
+            'nodeIpAddress': device.ip_address,
+            # test with IP address change
+            'nodeTargetIpAddress': device.ip_address,
+            'childTasks': [],
+            'parentTask': ''
+        }
+        self.addTempTask(task_d, info)
+
+
+@instrument_methods()
+class CVP(BaseCVP):
+
+    # errors of failed CVP requests
+    request_errors = (CVPError, requests.exceptions.RequestException)
+
+    def __init__(self, url_prefix, cvp_username, cvp_password, pool_maxsize=10,
+                 retries=3, backoff=0.5, connect_timeout=10, metrics=None):
+        # pool_maxsize: number of connections kept alive, must be not less than the number of concurrent workers
+        # retries: number of retries for GET requests failed with 5xx, 429, timeout or connection error
+        # backoff: base delay in seconds, doubled on every retry with a random jitter
+        # metrics: Metrics instance to record request statistics, a new one is created if not specified
+        self.metrics = metrics or Metrics()
+        self.pool_maxsize = pool_maxsize
+        self.session = self.new_session()
+        self.cvp_url_prefix = url_prefix
+        self.cvp_username = cvp_username
+        self.cvp_password = cvp_password
+        self.timeout = 60
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.temp_task_list = list()  # list of temp tasks to save and execute
+        self.configlet_page_size = 500  # number of configlets requested from getConfiglets.do at once
+        self.configlet_name_index = None  # cached name index, see get_configlet_name_index()
+        self.configlet_name_index_lock = threading.Lock()
+        self.configlet_store = ConfigletStore(config_loader=self.get_configlet_config)  # configlets interned by key
+        self.login_lock = threading.Lock()
+        self.login_count = 0  # incremented on every successful login
+        # authenticate
+        self.login()
+
+    def new_session(self):
+        session = requests.session()
+        session.verify = False
+        session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        # size connection pool to the number of concurrent workers to keep connections alive
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def login(self):
+        url = self.cvp_url_prefix + '/web/login/authenticate.do'
+        authdata = {'userId': self.cvp_username, 'password': self.cvp_password}
+        resp = self._send('POST', url, data=json.dumps(authdata), timeout=self.timeout)
+        self.handle_errors(resp, task_description='Connecting to CVP')
+        self.login_count += 1
+
+    def reset_session(self):
+        # start a new CVP session, temp actions added in the current session and not saved are dropped by CVP
+        self.temp_task_list = list()
+        with self.login_lock:
+            self.session.close()
+            self.session = self.new_session()
+            try:
+                self.login()
+            except self.request_errors as e:
+                # the next request will log in again
+                logging.warning(f'Can not log in to CVP after the session reset: {e}')
+
+    def _send(self, method, url, timeout=None, **kwargs):
+        # send a request, GET requests are retried on 5xx, 429, timeouts and connection errors
+        # timeout: read timeout in seconds, endpoint specific timeout is used if not specified
+        timeout = (self.connect_timeout, timeout or self.read_timeout(url))
+        retries = self.retries if method == 'GET' else 0
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.metrics.observe_request(url, method, time.perf_counter() - start,
+                                             bytes_sent=len(kwargs.get('data') or ''))
+                if attempt == retries:
+                    raise
+                delay = self.retry_delay(attempt)
+                logging.warning(f'{method} {urlparse(url).path} failed: {e}. Retrying in {delay:.1f}s.')
+            else:
+                # Content-Length is the size on the wire for compressed responses
+                bytes_received = resp.headers.get('Content-Length', '')
+                self.metrics.observe_request(
+                    url, method, time.perf_counter() - start, status_code=resp.status_code,
+                    bytes_sent=len(resp.request.body or ''),
+                    bytes_received=int(bytes_received) if bytes_received.isdigit() else len(resp.content))
+                if (resp.status_code not in self.retry_status_codes) or (attempt == retries):
+                    return resp
+                # a server asking to wait longer than the read timeout is not waited for longer than that
+                delay = self.retry_delay(attempt, resp, max_delay=timeout[1])
+                logging.warning(
+                    f'{method} {urlparse(url).path} failed with status code {resp.status_code}. Retrying in {delay:.1f}s.')
+            self.metrics.observe_retry(url)
+            time.sleep(delay)
+
+    def _request(self, method, url, timeout=None, **kwargs):
+        # send a request to CVP and login again once if the session has expired
+        login_count = self.login_count
+        resp = self._send(method, url, timeout=timeout, **kwargs)
+        if self.session_expired(resp):
+            with self.login_lock:
+                # other threads could have already logged in again
+                if login_count == self.login_count:
+                    logging.info('CVP session has expired. Logging in again.')
+                    self.login()
+            resp = self._send(method, url, timeout=timeout, **kwargs)
+        return resp
+
+    def iter_configlets(self, include_config=False):
+        # yields configlets page by page, every page has up to self.configlet_page_size configlets
+        # include_config: keep configlet config, it's dropped by default to save memory
+        start_index = 0
+        while True:
+            url = self.cvp_url_prefix + \
+                '/cvpservice/configlet/getConfiglets.do?startIndex=%s&endIndex=%s' % (
+                    start_index, start_index + self.configlet_page_size)
+            resp = self._request('GET', url)
+            self.handle_errors(
+                resp, task_description='Collecting configlet inventory')
+            resp_json = resp.json()
+            del resp  # release the raw response before processing the page
+            for configlet in resp_json['data']:
+                if not include_config:
+                    configlet.pop('config', None)
+                yield configlet
+            start_index += self.configlet_page_size
+            if (len(resp_json['data']) < self.configlet_page_size) or (start_index >= resp_json.get('total', 0)):
+                break
+
+    def get_configlets(self, include_config=True):
+        d = dict()
+        for configlet in self.iter_configlets(include_config=include_config):
+            d.update({
+                configlet['key']: configlet
+            })
+        return d
+
+    def get_configlet_name_index(self, refresh=False):
+        # returns { 'configlet name': { 'key': 'configlet key', 'type': 'configlet type' }, ... }
+        # the index is built once per session, use refresh to build it again
+        with self.configlet_name_index_lock:
+            if refresh or (self.configlet_name_index is None):
+                index = dict()
+                for configlet in self.iter_configlets():
+                    index[configlet['name']] = {'key': configlet['key'], 'type': configlet['type']}
+                self.configlet_name_index = index
+            return self.configlet_name_index
+
+    def get_devices(self, provisioned=False):
+        # provisioned: True - provisioned only, False - full inventory, including Undefined container
+        # returns { 'serialNumber': Device, ... }
+        url = self.cvp_url_prefix + '/cvpservice/inventory/devices?provisioned=%s' % provisioned
+        resp = self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Collecting device inventory')
+        d = dict()
+        for device in resp.json():
+            d.update({
+                device['serialNumber']: Device.from_cvp(device)
+            })
+        return d
+
+    def get_containers(self):
+        url = self.cvp_url_prefix + '/cvpservice/inventory/containers'
+        resp = self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Collecting container inventory')
+        d = dict()
+        for container in resp.json():
+            d.update({
+                container['Key']: container
+            })
+        return d
+
+    def find_container_id(self, container_name):
+        container_inventory = self.get_containers()
+        for container_key, container_details in container_inventory.items():
+            if container_details['Name'] == container_name:
+                return container_key
+
+    def find_builder_id(self, builder_name):
+        cfglet_details = self.get_configlet_name_index().get(builder_name)
+        if cfglet_details and (cfglet_details['type'] == 'Builder'):
+            return cfglet_details['key']
+
+    def get_device_serials_in_container(self, container_key):
+        url = self.cvp_url_prefix + \
+            '/cvpservice/provisioning/getNetElementList.do?nodeId=%s&startIndex=0&endIndex=0&ignoreAdd=true' % container_key
+        resp = self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Collecting devices in a container')
+        d = dict()
+        for device in resp.json()['netElementList']:
+            d.update({
+                device['serialNumber']: device
+            })
+        return d
+
+    def generate_configlets_from_builder(self, builder_key, netelement_key_list, container_key, timeout=None):
+        # timeout: request timeout in seconds, self.timeout is used if not specified
+        url = self.cvp_url_prefix + '/cvpservice/configlet/autoConfigletGenerator.do'
+        payload = {
+            'configletBuilderId': builder_key,
+            'netElementIds': netelement_key_list,
+            'containerId': container_key,
+            'pageType': 'string'
+        }
+        resp = self._request('POST', url, data=json.dumps(payload), timeout=timeout)
+        self.handle_errors(
+            resp, task_description='Generating updated configlets from builder')
+        return resp.json()
+
+    def _get_configlet_list_for_a_device(self, netelement_id):
+        url = self.cvp_url_prefix + \
+            '/cvpservice/provisioning/getConfigletsByNetElementId.do?netElementId=%s&startIndex=0&endIndex=0' % netelement_id
+        resp = self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Collecting container inventory')
+        return resp.json()['configletList']
+
+    def get_configlets_for_a_device(self, netelement_id):
+        # configlets shared by devices are stored once, config bodies are dropped
+        return [self.configlet_store.intern(configlet) for configlet in self._get_configlet_list_for_a_device(netelement_id)]
+
+    def get_config_comparison(self, netelement_id):
+        # designed config (configlets assigned to a device applied to its running config) compared with the running
+        # config by CVP, lines filtered by TerminAttr are missing in the running config
+        # returns designed and running config lines: [ { 'command': 'config line', 'code': '' if not different }, ... ]
+        configlet_keys = [configlet['key'] for configlet in self._get_configlet_list_for_a_device(netelement_id)]
+        url = self.cvp_url_prefix + '/cvpservice/provisioning/v2/validateAndCompareConfiglets.do'
+        payload = {'netElementId': netelement_id, 'configIdList': configlet_keys, 'pageType': 'viewConfig'}
+        resp = self._request('POST', url, data=json.dumps(payload))
+        self.handle_errors(
+            resp, task_description='Comparing designed and running config of %s' % netelement_id)
+        result = resp.json()
+        return result['designedConfig'], result['runningConfig']
+
+    def get_configlet_config(self, configlet_key):
+        url = self.cvp_url_prefix + '/cvpservice/configlet/getConfigletById.do?id=%s' % configlet_key
+        resp = self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Collecting configlet %s' % configlet_key)
+        return resp.json()['config']
+
+    def addTempAction(self, chunk_size=None):
+        # chunk_size: max number of temp tasks sent in a single request, None - send all tasks at once
+        if len(self.temp_task_list):
+            url = self.cvp_url_prefix + \
+                '/cvpservice/provisioning/addTempAction.do?nodeId=root&format=topology'
+            headers = {'content-type': "application/json", }
+            if not chunk_size:
+                chunk_size = len(self.temp_task_list)
+            for i in range(0, len(self.temp_task_list), chunk_size):
+                payload = {'data': self.temp_task_list[i:i+chunk_size]}
+                resp = self._request('POST', url, data=json.dumps(
+                    payload), headers=headers)
+                self.handle_errors(
+                    resp, task_description='Trying to add temp tasks to CVP')
+            self.temp_task_list = list()  # clean temp task list
+
+    def save_topology(self):
+        # returns the list of IDs of tasks created by CVP
+        url = self.cvp_url_prefix + '/cvpservice/provisioning/v2/saveTopology.do'
+        resp = self._request('POST', url, data=json.dumps([]))
+        self.handle_errors(resp, task_description='Saving topology')
+        data = resp.json().get('data')
+        if not isinstance(data, dict):
+            return list()
+        return [str(task_id) for task_id in data.get('taskIds') or list()]
+
+    def delete_configlets(self, configlet_list):
+        url = self.cvp_url_prefix + '/cvpservice/configlet/deleteConfiglet.do'
+        configlets_to_delete = list()
+        for configlet in configlet_list:
+            d = {'name': configlet.name, 'key': configlet.key}
+            configlets_to_delete.append(d)
+        resp = self._request('POST', url, data=json.dumps(
+            configlets_to_delete))
+        self.handle_errors(resp, task_description='Deleting configlets')
+
+    def get_tasks(self, query_param='Pending'):
+        url = self.cvp_url_prefix + \
+            '/cvpservice/task/getTasks.do?queryparam=%s&startIndex=0&endIndex=0' % query_param
+        resp = self._request('GET', url)
+        self.handle_errors(
+            resp, task_description='Checking for existing tasks.')
+
+        d = {
+            'total': resp.json()['total'],
+            'data': resp.json()['data']
+        }
+
+        return d
+
+    def execute_tasks(self, task_id_list):
+        url = self.cvp_url_prefix + '/cvpservice/task/executeTask.do'
+        payload = {'data': task_id_list}
+        headers = {'content-type': "application/json", }
+        resp = self._request('POST', url, data=json.dumps(
+            payload), headers=headers)
+        self.handle_errors(
+            resp, task_description='Executing tasks')
+
+    def get_task_by_id(self, task_id):
+        url = self.cvp_url_prefix + '/cvpservice/task/getTaskById.do?taskId=%s' % task_id
+        resp = self._request('GET', url)
+        self.handle_errors(resp, task_description='Checking task %s' % task_id)
+        return resp.json()
+
+    def device_is_compliant(self, device_id):
+        url = self.cvp_url_prefix + '/cvpservice/provisioning/checkCompliance.do'
+        d = {'nodeId': device_id, 'nodeType': 'netelement'}
+        resp = self._request('POST', url, data=json.dumps(d))
+        self.handle_errors(resp, task_description='Checking compliance of %s' % device_id)
+        if resp.json()['complianceCode'] != '0000':
+            return False  # not compliant
+        else:
+            return True  # compliant
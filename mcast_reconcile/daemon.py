@@ -0,0 +1,218 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile daemon
+Runs reconcile cycles on an interval with a single authenticated CVP session and keeps device inventory warm in memory.
+A local HTTP endpoint allows to trigger an immediate reconcile, for example right before a Change Control:
+
+    curl -X POST 'http://127.0.0.1:8090/reconcile?container=Leafs'
+    curl -X POST 'http://127.0.0.1:8090/reconcile?device=leaf1&device=leaf2&builder=mcast_auto_reconcile'
+    curl 'http://127.0.0.1:8090/status'
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from mcast_reconcile.cvp import CVPError
+from mcast_reconcile.reconcile import (
+    TargetNotFound, configlets_to_delete, find_builder_keys, reconcile, select_devices)
+
+
+class ReconcileDaemon(object):
+
+    def __init__(self, cvp_api, interval=300, jitter=30, inventory_refresh=3600,
+                 metrics_json=None, metrics_prom=None, **reconcile_options):
+        # interval: seconds between scheduled reconcile cycles, randomized by +/- jitter seconds
+        # inventory_refresh: seconds after which configlets assigned to all devices are collected again
+        # metrics_json, metrics_prom: files to write metrics to after every cycle
+        # reconcile_options: keyword arguments passed to reconcile()
+        self.cvp_api = cvp_api
+        self.interval = interval
+        self.jitter = jitter
+        self.inventory_refresh = inventory_refresh
+        self.reconcile_options = reconcile_options
+        self.metrics_json = metrics_json
+        self.metrics_prom = metrics_prom
+        self.lock = threading.Lock()  # only one reconcile cycle can run at a time
+        self.stop_event = threading.Event()
+        self.device_inventory = dict()  # device details for every serial number
+        self.configlet_cache = dict()  # assigned configlets for every system MAC
+        self.last_inventory_refresh = 0
+        self.status = {'cycles': 0, 'lastCycle': None, 'lastError': None}
+
+    def refresh_inventory(self):
+        # collect device inventory and drop cached configlets for devices that were changed
+        device_inventory = self.cvp_api.get_devices()
+        if time.time() - self.last_inventory_refresh > self.inventory_refresh:
+            self.configlet_cache = dict()
+            self.cvp_api.configlet_name_index = None  # builder name index is built again on the next lookup
+            self.cvp_api.configlet_store.clear()  # drop configlets that are no longer assigned
+            self.last_inventory_refresh = time.time()
+        else:
+            for serial, device in device_inventory.items():
+                cached_device = self.device_inventory.get(serial)
+                if cached_device is None or (cached_device.system_mac_address != device.system_mac_address) or (
+                        cached_device.parent_container_key != device.parent_container_key) or (
+                        cached_device.last_sync_up != device.last_sync_up):
+                    self.configlet_cache.pop(device.system_mac_address, None)
+        self.device_inventory = device_inventory
+
+    def run_cycle(self, containers=None, devices=None, builders=None):
+        # run a reconcile cycle for all devices or only for selected containers, devices and builders
+        # returns the cycle summary
+        target = {'containers': containers, 'devices': devices, 'builders': builders}
+        with self.lock:
+            start = time.time()
+            try:
+                with self.cvp_api.metrics.phase('inventory'):
+                    self.refresh_inventory()
+                device_inventory = select_devices(
+                    self.cvp_api, self.device_inventory, containers=containers, devices=devices)
+                builder_keys = find_builder_keys(self.cvp_api, builders) if builders else None
+                logging.info(f"Starting reconcile cycle for {len(device_inventory)} devices.")
+                discovery, device_plans = reconcile(
+                    self.cvp_api, device_inventory, known_configlets=self.configlet_cache, builder_keys=builder_keys,
+                    **self.reconcile_options)
+            except Exception as e:
+                self.status['lastError'] = {'time': time.time(), 'target': target, 'error': str(e) or repr(e)}
+                raise
+            # configlet map is updated with planned changes, keep it warm for the next cycle
+            self.configlet_cache.update(discovery.device_sys_mac_to_configlet_map)
+            summary = {
+                'time': start,
+                'duration': time.time() - start,
+                'target': target,
+                'devices': len(device_inventory),
+                'changedDevices': sorted({plan.device.system_mac_address for plan in device_plans}),
+                'deletedConfiglets': len(configlets_to_delete(device_plans, discovery.unused_configlets)),
+                'driftedDevices': discovery.drifted_devices,
+            }
+            if discovery.drifted_devices:
+                logging.warning(f"Configlets assigned to {', '.join(discovery.drifted_devices)} were changed on CVP, "
+                                f"the devices will be reconciled on the next cycle.")
+            self.status['cycles'] += 1
+            self.status['lastCycle'] = summary
+            logging.info(f"Reconcile cycle finished in {summary['duration']:.1f}s.")
+            return summary
+
+    def next_delay(self):
+        return max(0, self.interval + random.uniform(-self.jitter, self.jitter))
+
+    def serve_forever(self, listen_address=None):
+        # listen_address: ( 'host', port ) for the HTTP endpoint, None - endpoint is disabled
+        server = None
+        if listen_address:
+            server = ThreadingHTTPServer(listen_address, ReconcileRequestHandler)
+            server.reconcile_daemon = self
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            logging.info(f'Listening for reconcile requests on http://{listen_address[0]}:{listen_address[1]}')
+        try:
+            while not self.stop_event.is_set():
+                # any error of a cycle, for example an unexpected CVP response, is logged and the next cycle is scheduled
+                try:
+                    self.run_cycle()
+                except Exception:
+                    logging.error('Reconcile cycle failed!', exc_info=True)
+                try:
+                    self.cvp_api.metrics.write(json_path=self.metrics_json, prometheus_path=self.metrics_prom)
+                except OSError:
+                    logging.error('Failed to write metrics!', exc_info=True)
+                delay = self.next_delay()
+                logging.info(f'Next reconcile cycle in {delay:.0f}s.')
+                self.stop_event.wait(delay)
+        except KeyboardInterrupt:
+            logging.info('Stopping reconcile daemon.')
+        finally:
+            if server:
+                server.shutdown()
+                server.server_close()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class ReconcileRequestHandler(BaseHTTPRequestHandler):
+    # POST /reconcile[?container=<name>&device=<name>&builder=<name>] - run reconcile cycle immediately and return the summary
+    # every parameter can be specified multiple times
+    # GET /status - return daemon status
+    # GET /metrics - return CVP request and reconcile phase metrics in Prometheus text format
+
+    def send_json(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/status':
+            self.send_json(200, self.server.reconcile_daemon.status)
+        elif path == '/metrics':
+            body = self.server.reconcile_daemon.cvp_api.metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/reconcile':
+            self.send_json(404, {'error': 'Not found'})
+            return
+        query = parse_qs(url.query)
+        try:
+            summary = self.server.reconcile_daemon.run_cycle(
+                containers=query.get('container'), devices=query.get('device'), builders=query.get('builder'))
+        except TargetNotFound as e:
+            self.send_json(404, {'error': str(e)})
+        except (CVPError, requests.exceptions.RequestException) as e:
+            self.send_json(500, {'error': str(e)})
+        except Exception as e:
+            logging.error('Reconcile cycle failed!', exc_info=True)
+            self.send_json(500, {'error': str(e) or repr(e)})
+        else:
+            self.send_json(200, summary)
+
+    def log_message(self, format, *args):
+        logging.info('%s - %s' % (self.address_string(), format % args))
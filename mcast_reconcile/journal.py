@@ -0,0 +1,173 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile journal
+Records the progress of a reconcile run, so a run interrupted by a CVP error can be resumed with `--resume`
+without repeating discovery and configlet generation.
+The journal is a JSON lines file: a header followed by a record for the plan (serialized as a plan file),
+every committed or failed device change with created task IDs and every completed phase.
+Records are appended and flushed to disk one by one, a partially written last record is discarded.
+"""
+
+import json
+import logging
+import os
+import time
+
+from mcast_reconcile.planfile import plan_to_dict
+
+JOURNAL_VERSION = 1
+
+
+class JournalError(Exception):
+    # raised when a journal file can not be used
+    pass
+
+
+class Journal(object):
+
+    def __init__(self, path, cvp_url):
+        # cvp_url: CVP the run was started for, a run can not be resumed on another CVP
+        self.path = path
+        self.cvp_url = cvp_url
+        self.started_at = None
+        self.phases = list()  # completed phases
+        self.plan = None  # planned changes in plan file format
+        self.committed = set()  # ( system MAC, builder key ) for every committed change
+        self.failed = dict()  # error for every ( system MAC, builder key ) failed to commit
+        self.task_ids = list()  # IDs of tasks created by committed changes
+        self.finished = False
+        self.file = None
+
+    @classmethod
+    def create(cls, path, cvp_url):
+        # start a new journal, an existing journal is replaced
+        journal = cls(path, cvp_url)
+        journal.file = open(path, 'w')
+        journal.record({'version': JOURNAL_VERSION, 'cvp': cvp_url, 'startedAt': time.time()})
+        return journal
+
+    @classmethod
+    def load(cls, path, cvp_url=None):
+        # cvp_url: fail if the journal was created for another CVP
+        # returns None if there is no journal or it has no records
+        if not os.path.exists(path):
+            return None
+        journal = cls(path, cvp_url)
+        valid_size = 0
+        try:
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('Partially written record')
+                        record = json.loads(line)
+                    except ValueError:
+                        # only the last record can be partially written
+                        if f.read():
+                            raise
+                        logging.warning(f'Partially written record in journal {path} is discarded.')
+                        break
+                    if not valid_size:
+                        if not isinstance(record, dict) or record.get('version') != JOURNAL_VERSION:
+                            raise JournalError(f'Journal {path} has an unsupported format!')
+                        if cvp_url and record['cvp'] != cvp_url:
+                            raise JournalError(f"Journal {path} was created for {record['cvp']}, not for {cvp_url}!")
+                        journal.started_at = record['startedAt']
+                    else:
+                        journal.apply(record)
+                    valid_size += len(line)
+            if not valid_size:
+                return None
+            os.truncate(path, valid_size)
+            journal.file = open(path, 'a')
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise JournalError(f'Can not read journal {path}!\nERROR: {e}')
+        return journal
+
+    def apply(self, record):
+        if 'plan' in record:
+            self.plan = record['plan']
+        for mac, builder_key in record.get('committed', list()):
+            self.committed.add((mac, builder_key))
+            self.failed.pop((mac, builder_key), None)
+        for mac, builder_key in record.get('failed', list()):
+            self.failed[(mac, builder_key)] = record.get('error')
+        self.task_ids.extend(record.get('taskIds', list()))
+        if 'phase' in record:
+            self.phases.append(record['phase'])
+        if record.get('finished'):
+            self.finished = True
+
+    def record(self, record):
+        # append a record and make sure it's on disk before the next CVP request
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        if 'version' not in record:
+            self.apply(record)
+
+    def is_committed(self, device_plan):
+        return (device_plan.device.system_mac_address, device_plan.builder_key) in self.committed
+
+    def commit_error(self, device_plan):
+        return self.failed.get((device_plan.device.system_mac_address, device_plan.builder_key))
+
+    def phase_done(self, phase):
+        return phase in self.phases
+
+    def record_phase(self, phase):
+        self.record({'phase': phase})
+
+    def record_plan(self, device_plans, unused_configlets=()):
+        self.record({'phase': 'plan', 'plan': plan_to_dict(self.cvp_url, device_plans, unused_configlets)})
+
+    def record_commit(self, device_plans, task_ids):
+        self.record({
+            'committed': [[p.device.system_mac_address, p.builder_key] for p in device_plans],
+            'taskIds': task_ids,
+        })
+
+    def record_failure(self, device_plans, error):
+        self.record({
+            'failed': [[p.device.system_mac_address, p.builder_key] for p in device_plans],
+            'error': str(error),
+        })
+
+    def finish(self):
+        self.record({'finished': True})
+        self.close()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,298 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Run metrics
+Collects CVP request and method statistics and reconcile phase durations.
+Metrics can be exported as JSON or in Prometheus text format, for example for the node_exporter textfile collector.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180)
+
+METRIC_PREFIX = 'mcast_reconcile'
+
+
+def endpoint_name(url):
+    # short endpoint name for the URL, for example configlet/getConfiglets.do
+    path = urlparse(url).path
+    for prefix in ['/cvpservice/', '/web/']:
+        if path.startswith(prefix):
+            return path[len(prefix):]
+    return path
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)  # not cumulative, the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def to_dict(self):
+        cumulative_count = 0
+        buckets = dict()
+        for upper_bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            cumulative_count += bucket_count
+            buckets[str(upper_bound)] = cumulative_count
+        buckets['+Inf'] = self.count
+        return {'count': self.count, 'sum': round(self.sum, 6), 'buckets': buckets}
+
+
+class Metrics(object):
+    # thread safe registry, CVP requests are sent from multiple worker threads
+
+    def __init__(self, labels=None):
+        # labels: { 'label': 'value' } added to every Prometheus sample, for example the CVP cluster name
+        self.labels = labels or dict()
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.requests = dict()  # request statistics for every endpoint
+        self.methods = dict()  # call statistics for every CVP method
+        self.phases = dict()  # duration of every reconcile phase
+
+    def observe_request(self, url, method, duration, status_code=None, bytes_sent=0, bytes_received=0):
+        # status_code: None if the request failed with a connection error or a timeout
+        with self.lock:
+            endpoint = self.requests.setdefault(endpoint_name(url), {
+                'requests': dict(), 'errors': 0, 'retries': 0, 'bytesSent': 0, 'bytesReceived': 0,
+                'latency': Histogram()})
+            key = f"{method} {status_code or 'error'}"
+            endpoint['requests'][key] = endpoint['requests'].get(key, 0) + 1
+            if status_code is None or status_code >= 400:
+                endpoint['errors'] += 1
+            endpoint['bytesSent'] += bytes_sent
+            endpoint['bytesReceived'] += bytes_received
+            endpoint['latency'].observe(duration)
+
+    def observe_retry(self, url):
+        with self.lock:
+            # the failed attempt is always observed before the retry
+            self.requests[endpoint_name(url)]['retries'] += 1
+
+    def observe_call(self, name, duration, failed=False):
+        with self.lock:
+            method = self.methods.setdefault(name, {'calls': 0, 'errors': 0, 'duration': Histogram()})
+            method['calls'] += 1
+            if failed:
+                method['errors'] += 1
+            method['duration'].observe(duration)
+
+    @contextmanager
+    def phase(self, name):
+        # measure the duration of a reconcile phase: inventory, discovery, generation, matching, commit or delete
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self.lock:
+                phase = self.phases.setdefault(name, {'runs': 0, 'seconds': 0.0, 'lastSeconds': 0.0})
+                phase['runs'] += 1
+                phase['seconds'] += duration
+                phase['lastSeconds'] = duration
+            logging.info(f'Phase {name} took {duration:.2f}s.')
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'labels': self.labels,
+                'startTime': self.start_time,
+                'duration': round(time.time() - self.start_time, 6),
+                'requests': {
+                    name: dict(endpoint, latency=endpoint['latency'].to_dict())
+                    for name, endpoint in sorted(self.requests.items())
+                },
+                'methods': {
+                    name: dict(method, duration=method['duration'].to_dict())
+                    for name, method in sorted(self.methods.items())
+                },
+                'phases': {name: dict(phase) for name, phase in self.phases.items()},
+            }
+
+    def to_prometheus(self):
+        # render metrics in Prometheus text exposition format
+        metrics = self.to_dict()
+        lines = list()
+
+        def add(name, metric_type, help_text, samples):
+            # samples: [ ( 'name suffix', { 'label': 'value' }, value ), ... ]
+            full_name = f'{METRIC_PREFIX}_{name}'
+            lines.append(f'# HELP {full_name} {help_text}')
+            lines.append(f'# TYPE {full_name} {metric_type}')
+            for suffix, labels, value in samples:
+                label_str = ','.join(
+                    '%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                    for k, v in dict(self.labels, **labels).items())
+                lines.append(f'{full_name}{suffix}{{{label_str}}} {value}' if label_str else f'{full_name}{suffix} {value}')
+
+        def histogram_samples(label_name, items, field):
+            samples = list()
+            for name, d in items:
+                for upper_bound, bucket_count in d[field]['buckets'].items():
+                    samples.append(('_bucket', {label_name: name, 'le': upper_bound}, bucket_count))
+                samples.append(('_sum', {label_name: name}, d[field]['sum']))
+                samples.append(('_count', {label_name: name}, d[field]['count']))
+            return samples
+
+        requests = metrics['requests'].items()
+        samples = list()
+        for name, d in requests:
+            for key, count in d['requests'].items():
+                method, code = key.split()
+                samples.append(('', {'endpoint': name, 'method': method, 'code': code}, count))
+        add('cvp_requests_total', 'counter', 'CVP REST API requests including retries.', samples)
+        add('cvp_request_retries_total', 'counter', 'Retried CVP REST API requests.',
+            [('', {'endpoint': name}, d['retries']) for name, d in requests])
+        add('cvp_request_bytes_sent_total', 'counter', 'Request body bytes sent to CVP.',
+            [('', {'endpoint': name}, d['bytesSent']) for name, d in requests])
+        add('cvp_request_bytes_received_total', 'counter', 'Response body bytes received from CVP.',
+            [('', {'endpoint': name}, d['bytesReceived']) for name, d in requests])
+        add('cvp_request_duration_seconds', 'histogram', 'CVP REST API request latency.',
+            histogram_samples('endpoint', requests, 'latency'))
+        methods = metrics['methods'].items()
+        add('cvp_method_calls_total', 'counter', 'CVP client method calls.',
+            [('', {'method': name}, d['calls']) for name, d in methods])
+        add('cvp_method_errors_total', 'counter', 'CVP client method calls failed with an exception.',
+            [('', {'method': name}, d['errors']) for name, d in methods])
+        add('cvp_method_duration_seconds', 'histogram', 'CVP client method duration including retries.',
+            histogram_samples('method', methods, 'duration'))
+        phases = metrics['phases'].items()
+        add('phase_duration_seconds', 'gauge', 'Duration of the last run of the reconcile phase.',
+            [('', {'phase': name}, round(d['lastSeconds'], 6)) for name, d in phases])
+        add('phase_runs_total', 'counter', 'Reconcile phase runs.',
+            [('', {'phase': name}, d['runs']) for name, d in phases])
+        add('run_start_time_seconds', 'gauge', 'Start time of the reconcile run since epoch.',
+            [('', dict(), metrics['startTime'])])
+        add('run_duration_seconds', 'gauge', 'Duration of the reconcile run.', [('', dict(), metrics['duration'])])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path=None, prometheus_path=None):
+        # write metrics to a JSON file and/or a Prometheus textfile
+        if json_path:
+            write_atomically(json_path, json.dumps(self.to_dict(), indent=2))
+        if prometheus_path:
+            write_atomically(prometheus_path, self.to_prometheus())
+
+
+def write_atomically(path, text):
+    # collectors can read the file at any time, never expose a partially written file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def instrument_methods(exclude=()):
+    # class decorator recording duration of every public method call in self.metrics
+    # exclude: names of cheap helper methods that are not worth recording
+    def decorator(cls):
+        for name, func in list(vars(cls).items()):
+            if name.startswith('_') or name in exclude or not inspect.isfunction(func):
+                continue
+            setattr(cls, name, timed_method(func))
+        return cls
+    return decorator
+
+
+def timed_method(func):
+    name = func.__name__
+
+    if inspect.isgeneratorfunction(func):
+        # time the whole iteration for generators
+        @functools.wraps(func)
+        def generator_wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                yield from func(self, *args, **kwargs)
+                failed = False
+            finally:
+                self.metrics.observe_call(name, time.perf_counter() - start, failed=failed)
+        return generator_wrapper
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def async_generator_wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                async for item in func(self, *args, **kwargs):
+                    yield item
+                failed = False
+            finally:
+                self.metrics.observe_call(name, time.perf_counter() - start, failed=failed)
+        return async_generator_wrapper
+
+    if inspect.iscoroutinefunction(func):
+        # time until the coroutine is finished, not until it's created
+        @functools.wraps(func)
+        async def coroutine_wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = await func(self, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self.metrics.observe_call(name, time.perf_counter() - start, failed=failed)
+        return coroutine_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = func(self, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self.metrics.observe_call(name, time.perf_counter() - start, failed=failed)
+    return wrapper
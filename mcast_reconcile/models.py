@@ -0,0 +1,134 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Inventory models
+Compact representations of CVP devices and configlets keeping only the fields used by reconcile.
+Configlets are interned by key, so a configlet assigned to thousands of devices is stored only once.
+Config bodies are replaced with a digest of the canonical config and fetched from CVP only when required,
+for example to log a diff.
+"""
+
+import sys
+import threading
+
+from mcast_reconcile.compare import config_digest
+
+
+class Device(object):
+    # CVP inventory field for every attribute
+    cvp_fields = {
+        'serial_number': 'serialNumber',
+        'system_mac_address': 'systemMacAddress',
+        'hostname': 'hostname',
+        'fqdn': 'fqdn',
+        'ip_address': 'ipAddress',
+        'parent_container_key': 'parentContainerKey',
+        'last_sync_up': 'lastSyncUp',
+    }
+    __slots__ = tuple(cvp_fields)
+
+    def __init__(self, serial_number, system_mac_address, hostname=None, fqdn=None, ip_address=None,
+                 parent_container_key=None, last_sync_up=None):
+        self.serial_number = serial_number
+        self.system_mac_address = system_mac_address
+        self.hostname = hostname
+        self.fqdn = fqdn
+        self.ip_address = ip_address
+        # thousands of devices share a few containers
+        self.parent_container_key = sys.intern(parent_container_key) if parent_container_key else parent_container_key
+        self.last_sync_up = last_sync_up
+
+    @classmethod
+    def from_cvp(cls, device):
+        # device: device details from CVP inventory
+        return cls(**{attr: device.get(field) for attr, field in cls.cvp_fields.items()})
+
+    def to_cvp(self):
+        return {field: getattr(self, attr) for attr, field in self.cvp_fields.items()}
+
+    def __repr__(self):
+        return f'Device({self.serial_number}, {self.system_mac_address})'
+
+
+class Configlet(object):
+    __slots__ = ('key', 'name', 'type', 'digest', 'store')
+
+    def __init__(self, key, name, configlet_type, digest=None, store=None):
+        # digest: canonical config digest, only calculated for generated configlets
+        # store: ConfigletStore used to fetch config text
+        self.key = key
+        self.name = name
+        self.type = configlet_type
+        self.digest = digest
+        self.store = store
+
+    @property
+    def config(self):
+        # config text is not kept in memory and is requested from CVP every time
+        return self.store.get_config(self.key)
+
+    def to_ref(self):
+        # configlet fields required to reassign and delete the configlet
+        return {'key': self.key, 'name': self.name, 'type': self.type}
+
+    def __repr__(self):
+        return f'Configlet({self.name}, {self.key})'
+
+
+class ConfigletStore(object):
+    # interns configlets by key
+
+    def __init__(self, config_loader=None):
+        # config_loader: function returning config text for a configlet key
+        self.config_loader = config_loader
+        self.configlets = dict()
+        self.lock = threading.Lock()  # configlets are interned from worker threads
+
+    def intern(self, configlet):
+        # configlet: configlet data from CVP or a configlet reference from a plan
+        # returns the stored Configlet, configlet content is expected to be the same for the same key
+        cached = self.configlets.get(configlet['key'])
+        if cached is not None:
+            return cached
+        digest = configlet.get('digest')  # configlet references can carry a digest calculated before
+        if configlet['type'] == 'Generated' and configlet.get('config') is not None:
+            digest = config_digest(configlet['config'])
+        with self.lock:
+            return self.configlets.setdefault(configlet['key'], Configlet(
+                configlet['key'], configlet['name'], configlet['type'], digest=digest, store=self))
+
+    def get_config(self, key):
+        return self.config_loader(key)
+
+    def clear(self):
+        with self.lock:
+            self.configlets = dict()
@@ -0,0 +1,102 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile plan file
+A plan is created by `trigger-mcast-reconcile.py plan` and applied by `trigger-mcast-reconcile.py commit`.
+It lists the planned configlet changes for review and records configlets assigned to every planned device,
+so the commit can detect devices changed on CVP after the plan was created.
+"""
+
+import json
+import time
+
+from mcast_reconcile.metrics import write_atomically
+
+PLAN_VERSION = 1
+
+
+class PlanError(Exception):
+    # raised when a plan file can not be used
+    pass
+
+
+def plan_to_dict(cvp_url, device_plans, unused_configlets=()):
+    # cvp_url: CVP the plan was created for, a plan can not be applied to another CVP
+    # unused_configlets: generated configlets that were not assigned, they are deleted by the commit
+    devices = dict()
+    changes = list()
+    for device_plan in device_plans:
+        mac = device_plan.device.system_mac_address
+        # the first plan of a device assigned to multiple builders has configlets assigned before any change
+        if mac not in devices:
+            devices[mac] = {
+                'device': device_plan.device.to_cvp(),
+                'assignedConfigletKeys': [c.key for c in device_plan.configlets_assigned],
+                'builderKeys': list(),
+            }
+        devices[mac]['builderKeys'].append(device_plan.builder_key)
+        changes.append({
+            'systemMacAddress': mac,
+            'builderKey': device_plan.builder_key,
+            'assign': [c.to_ref() for c in device_plan.configlets_to_be_assigned],
+            'unassign': [c.to_ref() for c in device_plan.configlets_to_be_unassigned],
+            'delete': [c.to_ref() for c in device_plan.configlets_to_be_deleted],
+        })
+    return {
+        'version': PLAN_VERSION,
+        'createdAt': time.time(),
+        'cvp': cvp_url,
+        'devices': devices,
+        'changes': changes,
+        'unused': [c.to_ref() for c in unused_configlets],
+    }
+
+
+def write_plan(path, plan):
+    write_atomically(path, json.dumps(plan, indent=2))
+
+
+def read_plan(path, cvp_url=None, max_age=0):
+    # cvp_url: fail if the plan was created for another CVP
+    # max_age: fail if the plan is older than the specified number of seconds, 0 - plan never expires
+    try:
+        with open(path) as f:
+            plan = json.load(f)
+    except (OSError, ValueError) as e:
+        raise PlanError(f'Can not read reconcile plan {path}!\nERROR: {e}')
+    if not isinstance(plan, dict) or plan.get('version') != PLAN_VERSION:
+        raise PlanError(f'Reconcile plan {path} has an unsupported format!')
+    if cvp_url and plan['cvp'] != cvp_url:
+        raise PlanError(f"Reconcile plan {path} was created for {plan['cvp']}, not for {cvp_url}!")
+    if max_age and time.time() - plan['createdAt'] > max_age:
+        raise PlanError(f'Reconcile plan {path} is older than {max_age} seconds, create a new plan!')
+    return plan
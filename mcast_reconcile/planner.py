@@ -0,0 +1,167 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile planner
+Matches configlets assigned to a device with configlets generated by a builder
+and decides which configlets have to be assigned, unassigned and deleted.
+Generated configlets are indexed once per builder/container bundle, so matching runs in linear time.
+"""
+
+import logging
+
+
+def configlet_name_prefix(configlet_name):
+    # find generated configlet name prefix
+    # for example for mcast_auto_reconcile_192.168.122.11_5 the prefix will be mcast_auto_reconcile_192.168.122.11
+    return configlet_name[:configlet_name.rfind('_')]
+
+
+class BuilderNameIndex(object):
+    # finds the builder that created a generated configlet
+    # generated configlet names are built as <builder name>_<device IP>_<version>
+
+    def __init__(self, builder_names):
+        self.builder_names = set(builder_names)
+
+    def match(self, configlet_name):
+        # check every '_' position from the right, so the longest matching builder name wins
+        # returns an empty string if no matching builder was found
+        pos = configlet_name.rfind('_')
+        while pos > 0:
+            if configlet_name[:pos] in self.builder_names:
+                return configlet_name[:pos]
+            pos = configlet_name.rfind('_', 0, pos)
+        return ''
+
+
+class GeneratedConfigletIndex(object):
+    # indexes configlets generated for a builder/container bundle by name prefix and device
+
+    def __init__(self, new_configlets):
+        # new_configlets: [ ( 'netElementId' or None, Configlet ), ... ]
+        self.by_prefix = dict()
+        self.by_device = dict()
+        for net_element_id, new_cfglet in new_configlets:
+            self.by_prefix.setdefault(configlet_name_prefix(new_cfglet.name), new_cfglet)
+            if net_element_id:
+                self.by_device.setdefault(net_element_id, new_cfglet)
+
+    def find_for_device(self, device, builder_name):
+        # find the configlet generated by the builder for a device
+        new_cfglet = self.by_device.get(device.system_mac_address)
+        if new_cfglet is None:
+            new_cfglet = self.by_prefix.get(f"{builder_name}_{device.ip_address}")
+        return new_cfglet
+
+
+class DevicePlan(object):
+    # configlet changes required for a device
+
+    def __init__(self, device, builder_key=None):
+        self.device = device
+        self.builder_key = builder_key  # key of the builder that generated the new configlets
+        self.change_detected = False  # but default we assume that there is no change
+        self.configlets_assigned = list()  # configlets assigned to the device before the change
+        self.configlets_to_be_assigned = list()  # configlets to be assigned to the device
+        self.configlets_to_be_unassigned = list()  # configlets to be unassigned from the device
+        self.configlets_to_be_deleted = list()  # configlets that are not in use after the change
+        self.replaced_configlets = list()  # ( old configlet, new configlet ) pairs with a config change
+        self.unused_configlets = list()  # new configlets not assigned as the assigned ones have the same config
+
+
+def plan_device(device, configlets_assigned_to_device, builder_name_index, bundle_builder_name, generated_index,
+                bundle_builder_key=None):
+    # compare configlets assigned to a device with configlets generated by the bundle builder
+    # device: Device from CVP inventory, configlets_assigned_to_device: list of Configlet
+    # bundle_builder_name: name of the builder that was used to generate configlets in generated_index
+    plan = DevicePlan(device, builder_key=bundle_builder_key)
+    plan.configlets_assigned = configlets_assigned_to_device
+
+    # for every builder we expect a generated configlet to be assigned to a device
+    # in some cases generated configlets can be removed by operator by mistake and lost
+    # if we'll find a matching generated configlet, the builder is marked as discovered
+    # otherwise we'll recreate corresponding generated configlets
+    builder_is_assigned = False
+    generated_configlet_discovered = False
+
+    for configlet in configlets_assigned_to_device:
+        if configlet.type == 'Builder':
+            if configlet.name == bundle_builder_name:
+                builder_is_assigned = True
+            plan.configlets_to_be_assigned.append(configlet)
+            continue
+        if configlet.type != 'Generated':
+            # just keep configlets of any other type
+            plan.configlets_to_be_assigned.append(configlet)
+            continue
+
+        # if configlet is generated, find the name of the corresponding configlet builder
+        builder_name = builder_name_index.match(configlet.name)
+        if builder_name != bundle_builder_name:
+            # configlets generated by other builders are reconciled with their own bundle
+            plan.configlets_to_be_assigned.append(configlet)
+            continue
+        new_cfglet = generated_index.by_prefix.get(configlet_name_prefix(configlet.name))
+        if new_cfglet is None:
+            # the builder no longer generates this configlet for the device
+            continue
+
+        generated_configlet_discovered = True
+        # if generated configlet was not changed
+        # configs are compared in canonical form, so formatting and line order changes are ignored
+        if configlet.key == new_cfglet.key:
+            plan.configlets_to_be_assigned.append(configlet)  # keep old configlet
+        elif configlet.digest is not None and configlet.digest == new_cfglet.digest:
+            plan.configlets_to_be_assigned.append(configlet)  # keep old configlet
+            # the builder has created a new configlet version that differs only in formatting, it's deleted
+            plan.unused_configlets.append(new_cfglet)
+        else:
+            logging.info(f"A change was detected. {configlet.name} will be replaced with {new_cfglet.name}")
+            plan.replaced_configlets.append((configlet, new_cfglet))
+            plan.change_detected = True
+            plan.configlets_to_be_assigned.append(new_cfglet)  # assign new configlet
+            plan.configlets_to_be_unassigned.append(configlet)  # unassign old configlet
+            plan.configlets_to_be_deleted.append(configlet)  # delete old configlet
+
+    # if lost generated configlet discovered
+    if builder_is_assigned and not generated_configlet_discovered:
+        new_cfglet = generated_index.find_for_device(device, bundle_builder_name)
+        if new_cfglet is not None:
+            # generated configlet has to be inserted right after the builder
+            for cfglet_index, to_be_assigned_cfglet in enumerate(plan.configlets_to_be_assigned):
+                if (to_be_assigned_cfglet.type == 'Builder') and (to_be_assigned_cfglet.name == bundle_builder_name):
+                    plan.configlets_to_be_assigned.insert(cfglet_index+1, new_cfglet)
+                    logging.info(f"Recovering configlet {new_cfglet.name} that was lost due to operator error.")
+                    plan.change_detected = True
+                    break
+
+    return plan
@@ -0,0 +1,653 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile pipeline
+Discovers configlets assigned to devices, generates new configlets from builders,
+plans configlet changes and commits them to CVP.
+Steps that do not talk to CVP are shared with the asyncio pipeline in mcast_reconcile.aio,
+which only replaces CVP requests.
+"""
+
+import cProfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+
+from mcast_reconcile.compare import config_diff_summary
+from mcast_reconcile.cvp import CVPError
+from mcast_reconcile.models import Device
+from mcast_reconcile.planner import BuilderNameIndex, DevicePlan, GeneratedConfigletIndex, plan_device
+from mcast_reconcile.tasks import execute_tasks, resume_tasks
+
+
+class TargetNotFound(CVPError):
+    # raised when a container, device or builder selected for reconcile does not exist
+    pass
+
+
+class Discovery(object):
+    # devices and configlets collected for a reconcile run
+
+    def __init__(self):
+        # map builder keys to device parent container and system MACs
+        self.builder_device_map = dict()
+        # { 'cfglet_builder_key': { 'parentContainerKey': [ 'systemMacAddress', ... ], ... }, ... }
+        self.builder_names = dict()  # configlet builder name for every builder key
+        self.device_dict = dict()  # Device for every system MAC
+        self.device_sys_mac_to_configlet_map = dict()  # assigned Configlet list for every system MAC to avoid additional API calls
+        self.drifted_devices = list()  # system MACs of devices skipped as configlets were reassigned on CVP
+        self.unused_configlets = list()  # generated configlets that are not assigned and have to be deleted
+
+    def add_device(self, v, configlets_assigned_to_device, builder_keys=None):
+        # v - device details data
+        # builder_keys: reconcile only configlets generated by these builders, all builders are reconciled if not specified
+        self.device_sys_mac_to_configlet_map.update({
+            v.system_mac_address: configlets_assigned_to_device
+        })
+        for cfglet in configlets_assigned_to_device:
+            # for every builder add information about device system MAC and parent container to builder_device_map
+            if cfglet.type == 'Builder':
+                self.builder_names[cfglet.key] = cfglet.name
+                if builder_keys and cfglet.key not in builder_keys:
+                    continue
+                # add device to the dict first
+                self.device_dict.update({v.system_mac_address: v})
+                if cfglet.key not in self.builder_device_map.keys():
+                    self.builder_device_map.update({
+                        cfglet.key: dict()
+                    })
+                if v.parent_container_key not in self.builder_device_map[cfglet.key].keys():
+                    self.builder_device_map[cfglet.key].update({
+                        v.parent_container_key: list()
+                    })
+                if v.system_mac_address not in self.builder_device_map[cfglet.key][v.parent_container_key]:
+                    self.builder_device_map[cfglet.key][v.parent_container_key].append(
+                        v.system_mac_address)
+
+
+class ReconcileResult(object):
+    # result of a reconcile run returned by mcast_reconcile.aio.reconcile()
+
+    def __init__(self, device_inventory, discovery, device_plans, task_ids=None, duration=0):
+        self.device_inventory = device_inventory  # { 'serial number': Device } for reconciled devices
+        self.discovery = discovery
+        self.device_plans = device_plans  # committed device plans
+        self.task_ids = task_ids or list()  # IDs of tasks created by CVP
+        self.duration = duration
+
+    @property
+    def changed_devices(self):
+        return sorted({plan.device.system_mac_address for plan in self.device_plans})
+
+    @property
+    def deleted_configlets(self):
+        return configlets_to_delete(self.device_plans, self.discovery.unused_configlets)
+
+    def to_dict(self):
+        return {
+            'devices': len(self.device_inventory),
+            'changedDevices': self.changed_devices,
+            'deletedConfiglets': [configlet.name for configlet in self.deleted_configlets],
+            'taskIds': self.task_ids,
+            'duration': self.duration,
+        }
+
+
+def collect_assigned_configlets(cvp_api, device_inventory, workers=10, known_configlets=None):
+    # find configlets assigned to every device using a bounded number of concurrent requests
+    # known_configlets: { 'systemMacAddress': [ assigned Configlet, ... ] } already known and not requested from CVP
+    # results are yielded in device inventory order to keep the log output stable
+    if known_configlets is None:
+        known_configlets = dict()
+    device_list = list(device_inventory.values())
+
+    def get_configlets(device):
+        if device.system_mac_address in known_configlets:
+            return known_configlets[device.system_mac_address]
+        return cvp_api.get_configlets_for_a_device(device.system_mac_address)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        configlet_lists = executor.map(get_configlets, device_list)
+        for device, configlets_assigned_to_device in zip(device_list, configlet_lists):
+            yield device, configlets_assigned_to_device
+
+
+def build_discovery(assigned_configlets, builder_keys=None):
+    # assigned_configlets: [ ( Device, [ assigned Configlet, ... ] ), ... ] in device inventory order
+    # builder_keys: reconcile only configlets generated by these builders, all builders are reconciled if not specified
+    discovery = Discovery()
+    for v, configlets_assigned_to_device in assigned_configlets:
+        # v - device details data
+        logging.info(f"Find configlets assigned to {v.system_mac_address}")
+        discovery.add_device(v, configlets_assigned_to_device, builder_keys=builder_keys)
+    return discovery
+
+
+def generation_chunks(builder_device_map, chunk_size=100):
+    # split device lists of every builder/container bundle into chunks generated by a single request
+    # returns [ ( ( 'cfglet_builder_key', 'parentContainerKey' ), [ 'systemMacAddress', ... ] ), ... ]
+    chunks = list()
+    for builder_id, cont_device_bundle in builder_device_map.items():
+        for container_id, device_list in cont_device_bundle.items():
+            logging.info(
+                f'Generating configlets from builder {builder_id} for devices {device_list} in container {container_id}')
+            chunks.extend(
+                ((builder_id, container_id), device_list[i:i+chunk_size]) for i in range(0, len(device_list), chunk_size))
+    return chunks
+
+
+def merge_generation_chunks(chunks, results):
+    # merge configlets generated for chunks back in the original device order
+    # returns { ( 'cfglet_builder_key', 'parentContainerKey' ): [ ( 'netElementId', Configlet ), ... ], ... }
+    new_configlets = dict()
+    for (bundle, _), generated in zip(chunks, results):
+        new_configlets.setdefault(bundle, list()).extend(generated)
+    return new_configlets
+
+
+def split_timed_out_chunk(builder_id, device_list):
+    # returns halves of a chunk to generate again after the request timed out, a single device can not be split
+    if len(device_list) == 1:
+        raise CVPError(f'Generating configlets from builder {builder_id} for device {device_list[0]} timed out!')
+    half = len(device_list) // 2
+    logging.warning(
+        f'Generating configlets from builder {builder_id} for {len(device_list)} devices timed out. Splitting the request in half.')
+    return device_list[:half], device_list[half:]
+
+
+def generate_configlets_for_device_chunk(cvp_api, builder_id, device_list, container_id, timeout=None):
+    # generate configlets for a chunk of devices
+    # if the request times out, the chunk is split in half and every half is retried
+    # returns [ ( 'netElementId', Configlet ), ... ]
+    try:
+        data = cvp_api.generate_configlets_from_builder(builder_id, device_list, container_id, timeout=timeout)['data']
+        return [(d.get('netElementId'), cvp_api.configlet_store.intern(d['configlet'])) for d in data]
+    except requests.exceptions.Timeout:
+        first_half, second_half = split_timed_out_chunk(builder_id, device_list)
+        return generate_configlets_for_device_chunk(cvp_api, builder_id, first_half, container_id, timeout) + \
+            generate_configlets_for_device_chunk(cvp_api, builder_id, second_half, container_id, timeout)
+
+
+def generate_configlets(cvp_api, builder_device_map, workers=4, chunk_size=100, timeout=None):
+    # use configlet builders to generate new configlets for every builder/container bundle
+    # device lists are split into chunks and chunks are generated concurrently
+    # every builder run opens eAPI sessions to devices, so not more than workers x chunk_size devices are contacted at the same time
+    # returns { ( 'cfglet_builder_key', 'parentContainerKey' ): [ ( 'netElementId', Configlet ), ... ], ... }
+    chunks = generation_chunks(builder_device_map, chunk_size=chunk_size)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            lambda chunk: generate_configlets_for_device_chunk(cvp_api, chunk[0][0], chunk[1], chunk[0][1], timeout),
+            chunks)
+        return merge_generation_chunks(chunks, results)
+
+
+def select_devices(cvp_api, device_inventory, containers=None, devices=None):
+    # select devices in containers or matching serial numbers, system MACs or hostnames
+    # returns device inventory subset, the full inventory is returned if nothing was selected
+    if not containers and not devices:
+        return device_inventory
+    selected_serials = set()
+    for container_name in containers or list():
+        container_key = cvp_api.find_container_id(container_name)
+        if not container_key:
+            raise TargetNotFound(f'Container {container_name} was not found.')
+        selected_serials.update(cvp_api.get_device_serials_in_container(container_key).keys())
+    return select_devices_by_name(device_inventory, devices, selected_serials)
+
+
+def select_devices_by_name(device_inventory, devices, selected_serials=()):
+    # select devices matching serial numbers, system MACs or hostnames in addition to selected_serials
+    selected_serials = set(selected_serials)
+    device_index = dict()  # serial number for every serial number, system MAC, hostname and FQDN
+    for serial, device in device_inventory.items():
+        for name in [device.serial_number, device.system_mac_address, device.hostname, device.fqdn]:
+            if name:
+                device_index.setdefault(name.lower(), serial)
+    for device_name in devices or list():
+        if device_name.lower() not in device_index:
+            raise TargetNotFound(f'Device {device_name} was not found.')
+        selected_serials.add(device_index[device_name.lower()])
+    return {k: v for k, v in device_inventory.items() if k in selected_serials}
+
+
+def find_builder_keys(cvp_api, builder_names):
+    # returns configlet builder keys for the list of builder names
+    builder_keys = list()
+    for builder_name in builder_names:
+        builder_key = cvp_api.find_builder_id(builder_name)
+        if not builder_key:
+            raise TargetNotFound(f'Configlet builder {builder_name} was not found.')
+        builder_keys.append(builder_key)
+    return builder_keys
+
+
+def discover(cvp_api, device_inventory, workers=10, known_configlets=None, builder_keys=None):
+    # find configlets assigned to every device in the inventory and map devices to builders
+    # builder_keys: reconcile only configlets generated by these builders, all builders are reconciled if not specified
+    return build_discovery(collect_assigned_configlets(
+        cvp_api, device_inventory, workers=workers, known_configlets=known_configlets), builder_keys=builder_keys)
+
+
+def plan_changes(discovery, generated_configlets):
+    # compare assigned configlets with generated configlets for every device
+    # returns a list of plans for devices with a detected change
+    device_plans = list()
+    builder_name_index = BuilderNameIndex(discovery.builder_names.values())
+    for builder_id, cont_device_bundle in discovery.builder_device_map.items():
+        for container_id, device_list in cont_device_bundle.items():
+            # index configlets generated for the bundle once
+            generated_index = GeneratedConfigletIndex(generated_configlets[(builder_id, container_id)])
+
+            for device_id in device_list:
+
+                device_details = discovery.device_dict[device_id]
+                device_plan = plan_device(
+                    device_details, discovery.device_sys_mac_to_configlet_map[device_id], builder_name_index,
+                    discovery.builder_names[builder_id], generated_index, bundle_builder_key=builder_id)
+
+                # compliance is not checked here, devices can be selected with a compliance sweep before reconcile
+
+                discovery.unused_configlets.extend(device_plan.unused_configlets)
+                if device_plan.change_detected:
+                    device_plans.append(device_plan)
+                    # the device can be assigned to another builder as well, keep the configlet map up to date
+                    discovery.device_sys_mac_to_configlet_map[device_id] = device_plan.configlets_to_be_assigned
+                else:
+                    logging.info(f'No change was detected for {device_id}. Nothing to do.')
+    return device_plans
+
+
+def replaced_configlets_to_log(device_plans):
+    # returns [ ( replaced Configlet, new Configlet ), ... ] to log the diff for, nothing if the diff is not logged
+    if not logging.getLogger().isEnabledFor(logging.INFO):
+        return list()
+    return [pair for device_plan in device_plans for pair in device_plan.replaced_configlets]
+
+
+def log_config_diff(configlet, new_cfglet, diff_lines):
+    logging.info(f"Changes from {configlet.name} to {new_cfglet.name}:")
+    for line in diff_lines:
+        logging.info(f"   {line}")
+
+
+def log_config_diffs(device_plans, workers=10):
+    # config text is not kept in memory, configs of replaced configlets are fetched concurrently to log the diff
+    # replaced configlets have to be fetched before they are deleted
+    replaced_configlets = replaced_configlets_to_log(device_plans)
+    if not replaced_configlets:
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        diffs = executor.map(lambda pair: config_diff_summary(pair[0].config, pair[1].config), replaced_configlets)
+        for (configlet, new_cfglet), diff_lines in zip(replaced_configlets, diffs):
+            log_config_diff(configlet, new_cfglet, diff_lines)
+
+
+def reassign_configlets(cvp_api, device_plans, batch=False):
+    # add temp tasks reassigning configlets for every planned device to cvp_api.temp_task_list
+    # batch: yield all device plans at once after temp tasks for all devices were added
+    # yields device plans with temp tasks to be saved, the caller creates temp actions and saves topology
+    for device_plan in device_plans:
+        logging.info(f"Re-assigning configlets to {device_plan.device.system_mac_address}")
+        cvp_api.reassign_configlets_to_device(
+            device_plan.device, device_plan.configlets_to_be_unassigned, device_plan.configlets_to_be_assigned)
+        if not batch:
+            logging.info("Adding temp actions and saving topology.")
+            yield [device_plan]
+
+    # in batch mode temp actions for all devices are created at once and topology is saved only once
+    if cvp_api.temp_task_list:
+        logging.info(f"Adding {len(cvp_api.temp_task_list)} temp actions and saving topology.")
+        yield device_plans
+
+
+@contextmanager
+def recorded_save(cvp_api, device_plans, journal=None):
+    # record the result of saving temp tasks of device_plans in the journal
+    # yields a list to add IDs of tasks created by CVP to
+    task_ids = list()
+    try:
+        yield task_ids
+    except cvp_api.request_errors as e:
+        if journal:
+            journal.record_failure(device_plans, e)
+        raise
+    if journal:
+        journal.record_commit(device_plans, task_ids)
+
+
+def commit_changes(cvp_api, device_plans, batch=False, batch_size=500, journal=None):
+    # reassign configlets for every planned device
+    # batch: create temp actions for all devices at once and save topology only once
+    # journal: record the result of every commit
+    # returns the list of IDs of tasks created by CVP
+    task_ids = list()
+    try:
+        for plans_to_save in reassign_configlets(cvp_api, device_plans, batch=batch):
+            with recorded_save(cvp_api, plans_to_save, journal=journal) as saved_task_ids:
+                cvp_api.addTempAction(chunk_size=batch_size)
+                saved_task_ids.extend(cvp_api.save_topology())
+            task_ids.extend(saved_task_ids)
+    except Exception:
+        # temp actions added before the failure must not be saved by the next commit with the same client,
+        # failures caused by unexpected CVP responses included
+        logging.info('Starting a new CVP session to drop temp actions that were not saved.')
+        cvp_api.reset_session()
+        raise
+    finally:
+        cvp_api.temp_task_list = list()
+    return task_ids
+
+
+def configlets_to_delete(device_plans, unused_configlets=()):
+    # returns configlets that are no longer required after the reassignment
+    # unused_configlets: generated configlets that were never assigned, configlets assigned by the plans are kept
+    configlets_to_be_deleted = list()
+    for device_plan in device_plans:
+        configlets_to_be_deleted.extend(device_plan.configlets_to_be_deleted)
+    keys_to_keep = {c.key for device_plan in device_plans for c in device_plan.configlets_to_be_assigned}
+    keys_to_keep.update(c.key for c in configlets_to_be_deleted)
+    for configlet in unused_configlets:
+        if configlet.key not in keys_to_keep:
+            configlets_to_be_deleted.append(configlet)
+            keys_to_keep.add(configlet.key)
+    return configlets_to_be_deleted
+
+
+def delete_unused_configlets(cvp_api, device_plans, unused_configlets=()):
+    # delete configlets that are no longer required after the reassignment
+    configlets_to_be_deleted = configlets_to_delete(device_plans, unused_configlets)
+    if configlets_to_be_deleted:
+        logging.info('Deleting configlets that are no longer required.')
+        cvp_api.delete_configlets(configlets_to_be_deleted)
+
+
+def planned_assignments(device_plans, known_configlets):
+    # returns { 'systemMacAddress': { configlet keys } } assigned before any change to devices planned with known configlets
+    planned_keys = dict()
+    for device_plan in device_plans:
+        mac = device_plan.device.system_mac_address
+        if mac in known_configlets:
+            # the first plan of a device assigned to multiple builders has configlets assigned before any change
+            planned_keys.setdefault(mac, {c.key for c in device_plan.configlets_assigned})
+    return planned_keys
+
+
+def skip_drifted_devices(device_plans, planned_keys, assigned_configlets):
+    # assigned_configlets: { 'systemMacAddress': [ assigned Configlet, ... ] } collected from CVP for planned_keys
+    # returns plans of devices without a change and { 'systemMacAddress': [ assigned Configlet, ... ] } for changed devices
+    drifted_devices = dict()
+    for mac, configlets in assigned_configlets.items():
+        # CVP can list builders and configlets in another order than they were assigned in
+        if {c.key for c in configlets} != planned_keys[mac]:
+            logging.warning(f'Configlets assigned to {mac} were changed on CVP. The device is skipped.')
+            drifted_devices[mac] = configlets
+    return [p for p in device_plans if p.device.system_mac_address not in drifted_devices], drifted_devices
+
+
+def record_drifted_devices(discovery, drifted_devices):
+    # keep configlets currently assigned to skipped devices, so they are planned correctly next time
+    discovery.device_sys_mac_to_configlet_map.update(drifted_devices)
+    discovery.drifted_devices = sorted(drifted_devices)
+
+
+def verify_assigned_configlets(cvp_api, device_plans, known_configlets, workers=10):
+    # configlets assigned to devices planned with known configlets are collected from CVP again,
+    # as they could be reassigned on CVP after they were cached
+    # returns plans of devices without a change and { 'systemMacAddress': [ assigned Configlet, ... ] } for changed devices
+    planned_keys = planned_assignments(device_plans, known_configlets)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        assigned_configlets = dict(zip(planned_keys, executor.map(cvp_api.get_configlets_for_a_device, planned_keys)))
+    return skip_drifted_devices(device_plans, planned_keys, assigned_configlets)
+
+
+def make_plan(cvp_api, device_inventory, workers=10, gen_workers=4, gen_chunk_size=100, gen_timeout=180,
+              known_configlets=None, builder_keys=None, profile=None, log_diffs=True):
+    # read-only part of reconcile: discovery, configlet generation and matching
+    # known_configlets: { 'systemMacAddress': [ assigned Configlet, ... ] } already known and not requested from CVP,
+    # configlets assigned to devices with a detected change are verified on CVP, changed devices are skipped
+    # builder_keys: reconcile only configlets generated by these builders
+    # profile: file name to dump cProfile stats of the planner to, the planner is not profiled if not specified
+    # log_diffs: log config diffs of replaced configlets, reconcile() logs them after the commit instead
+    # returns the discovery data and the list of plans for devices with a detected change
+    metrics = cvp_api.metrics
+    with metrics.phase('discovery'):
+        discovery = discover(cvp_api, device_inventory, workers=workers, known_configlets=known_configlets,
+                             builder_keys=builder_keys)
+    # use confilet builders to generate new configlets for every device
+    with metrics.phase('generation'):
+        generated_configlets = generate_configlets(
+            cvp_api, discovery.builder_device_map, workers=gen_workers, chunk_size=gen_chunk_size, timeout=gen_timeout)
+    with metrics.phase('matching'):
+        if profile:
+            profiler = cProfile.Profile()
+            device_plans = profiler.runcall(plan_changes, discovery, generated_configlets)
+            profiler.dump_stats(profile)
+            logging.info(f'Planner profile was saved to {profile}')
+        else:
+            device_plans = plan_changes(discovery, generated_configlets)
+    if known_configlets:
+        with metrics.phase('verification'):
+            device_plans, drifted_devices = verify_assigned_configlets(
+                cvp_api, device_plans, known_configlets, workers=workers)
+        record_drifted_devices(discovery, drifted_devices)
+    if log_diffs:
+        with metrics.phase('diff'):
+            log_config_diffs(device_plans, workers=workers)
+    return discovery, device_plans
+
+
+def apply_changes(cvp_api, device_plans, batch=False, batch_size=500, execute=False, execute_batch_size=50,
+                  execute_timeout=3600, workers=10, journal=None, unused_configlets=(), log_diffs=False):
+    # write part of reconcile: reassign configlets and delete configlets that are no longer required
+    # unused_configlets: generated configlets that were not assigned and have to be deleted
+    # log_diffs: log config diffs of replaced configlets after the topology was saved, not to delay the commit
+    # execute: execute tasks created by CVP in batches of execute_batch_size and wait for them to complete
+    # execute_timeout: max time in seconds to wait for a batch of tasks
+    # journal: record commit results and completed phases
+    with cvp_api.metrics.phase('commit'):
+        task_ids = commit_changes(cvp_api, device_plans, batch=batch, batch_size=batch_size, journal=journal)
+    if journal:
+        journal.record_phase('commit')
+    if log_diffs:
+        with cvp_api.metrics.phase('diff'):
+            log_config_diffs(device_plans, workers=workers)
+    with cvp_api.metrics.phase('delete'):
+        delete_unused_configlets(cvp_api, device_plans, unused_configlets)
+    if journal:
+        journal.record_phase('delete')
+    if execute and task_ids:
+        with cvp_api.metrics.phase('execute'):
+            execute_tasks(cvp_api, task_ids, batch_size=execute_batch_size, workers=workers, timeout=execute_timeout)
+        if journal:
+            journal.record_phase('execute')
+
+
+def reconcile(cvp_api, device_inventory, workers=10, batch=False, batch_size=500,
+              gen_workers=4, gen_chunk_size=100, gen_timeout=180, known_configlets=None, builder_keys=None,
+              profile=None, execute=False, execute_batch_size=50, execute_timeout=3600, journal=None):
+    # run discovery, configlet generation, planning and commit for devices in the inventory
+    # journal: record the plan, commit results and completed phases to resume the run if it fails
+    # returns the discovery data and the list of committed device plans
+    discovery, device_plans = make_plan(
+        cvp_api, device_inventory, workers=workers, gen_workers=gen_workers, gen_chunk_size=gen_chunk_size,
+        gen_timeout=gen_timeout, known_configlets=known_configlets, builder_keys=builder_keys, profile=profile,
+        log_diffs=False)
+    if journal:
+        journal.record_plan(device_plans, discovery.unused_configlets)
+    apply_changes(cvp_api, device_plans, batch=batch, batch_size=batch_size, execute=execute,
+                  execute_batch_size=execute_batch_size, execute_timeout=execute_timeout, workers=workers,
+                  journal=journal, unused_configlets=discovery.unused_configlets, log_diffs=True)
+    return discovery, device_plans
+
+
+def device_plans_from_plan(cvp_api, plan):
+    # rebuild device plans saved with mcast_reconcile.planfile
+    # returns the list of device plans in plan order and keys of configlets assigned before every change
+    devices = {mac: Device.from_cvp(d['device']) for mac, d in plan['devices'].items()}
+    assigned_keys = {mac: d['assignedConfigletKeys'] for mac, d in plan['devices'].items()}
+    intern = cvp_api.configlet_store.intern
+    device_plans = list()
+    keys_before_change = list()
+    for change in plan['changes']:
+        mac = change['systemMacAddress']
+        device_plan = DevicePlan(devices[mac], builder_key=change['builderKey'])
+        device_plan.change_detected = True
+        device_plan.configlets_to_be_assigned = [intern(c) for c in change['assign']]
+        device_plan.configlets_to_be_unassigned = [intern(c) for c in change['unassign']]
+        device_plan.configlets_to_be_deleted = [intern(c) for c in change['delete']]
+        device_plans.append(device_plan)
+        keys_before_change.append(assigned_keys[mac])
+        # the next change of a device assigned to multiple builders starts with configlets assigned by this one
+        assigned_keys[mac] = [c.key for c in device_plan.configlets_to_be_assigned]
+    return device_plans, keys_before_change
+
+
+def configlets_created_by_plan(cvp_api, plan):
+    # returns configlets assigned by a plan in place of replaced configlets, they were generated when the plan was created
+    # configlets generated again by the commit can have a newer version, so the planned ones have to be deleted
+    device_plans, keys_before_change = device_plans_from_plan(cvp_api, plan)
+    created_configlets = list()
+    for device_plan, keys in zip(device_plans, keys_before_change):
+        keys = set(keys)
+        created_configlets.extend(c for c in device_plan.configlets_to_be_assigned if c.key not in keys)
+    return created_configlets
+
+
+def resume_reconcile(cvp_api, journal, workers=10, batch=False, batch_size=500, execute=False,
+                     execute_batch_size=50, execute_timeout=3600):
+    # continue a run interrupted after the plan was recorded in the journal
+    # discovery and configlet generation are not repeated, changes committed before the interruption are skipped
+    # devices with configlets reassigned on CVP after the interruption are skipped as well
+    # returns the list of committed device plans and system MACs of skipped devices
+    metrics = cvp_api.metrics
+    device_plans, keys_before_change = device_plans_from_plan(cvp_api, journal.plan)
+    drifted_devices = list()
+    if not journal.phase_done('commit'):
+        pending = [(p, keys) for p, keys in zip(device_plans, keys_before_change) if not journal.is_committed(p)]
+        pending_devices = sorted({p.device.system_mac_address for p, _ in pending})
+        with metrics.phase('discovery'):
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                assigned_keys = dict(zip(pending_devices, executor.map(
+                    lambda mac: {c.key for c in cvp_api.get_configlets_for_a_device(mac)}, pending_devices)))
+        device_plans_to_commit = list()
+        for device_plan, keys in pending:
+            mac = device_plan.device.system_mac_address
+            if mac in drifted_devices:
+                continue
+            keys_after_change = {c.key for c in device_plan.configlets_to_be_assigned}
+            if assigned_keys[mac] == set(keys):
+                if journal.commit_error(device_plan):
+                    logging.info(f'Retrying the change of {mac} failed with: {journal.commit_error(device_plan)}')
+                device_plans_to_commit.append(device_plan)
+            elif assigned_keys[mac] == keys_after_change:
+                # topology was saved, but the response was not received before the interruption
+                logging.info(f'Configlets were already reassigned to {mac}.')
+                journal.record_commit([device_plan], list())
+            else:
+                logging.warning(f'Configlets assigned to {mac} were changed after the interruption. The device is skipped.')
+                drifted_devices.append(mac)
+                continue
+            assigned_keys[mac] = keys_after_change
+        logging.info(f'{len(device_plans) - len(pending)} changes were committed before the interruption, '
+                     f'{len(device_plans_to_commit)} changes will be committed now.')
+        with metrics.phase('commit'):
+            commit_changes(cvp_api, device_plans_to_commit, batch=batch, batch_size=batch_size, journal=journal)
+        journal.record_phase('commit')
+    # configlets replaced on skipped devices are still assigned and must not be deleted
+    committed_device_plans = [p for p in device_plans if journal.is_committed(p)]
+    if not journal.phase_done('delete'):
+        unused_configlets = [cvp_api.configlet_store.intern(c) for c in journal.plan.get('unused', list())]
+        with metrics.phase('delete'):
+            delete_unused_configlets(cvp_api, committed_device_plans, unused_configlets)
+        journal.record_phase('delete')
+    if execute and journal.task_ids and not journal.phase_done('execute'):
+        with metrics.phase('execute'):
+            resume_tasks(cvp_api, journal.task_ids, batch_size=execute_batch_size, workers=workers,
+                         timeout=execute_timeout)
+        journal.record_phase('execute')
+    return committed_device_plans, drifted_devices
+
+
+def commit_plan(cvp_api, plan, workers=10, batch_size=500, gen_workers=4, gen_chunk_size=100, gen_timeout=180,
+                execute=False, execute_batch_size=50, execute_timeout=3600, journal=None):
+    # apply a plan created by make_plan() and saved with mcast_reconcile.planfile
+    # configlets are generated again only for planned devices and builders to include the latest changes
+    # devices with configlets reassigned on CVP after the plan was created are skipped
+    # all temp actions are created in batch mode and topology is saved only once
+    # journal: record the regenerated plan, commit results and completed phases to resume the commit if it fails
+    # returns the list of committed device plans and system MACs of skipped devices
+    metrics = cvp_api.metrics
+    planned_devices = plan['devices']
+    device_inventory = {d['device']['serialNumber']: Device.from_cvp(d['device']) for d in planned_devices.values()}
+    builder_keys = {builder_key for d in planned_devices.values() for builder_key in d['builderKeys']}
+    with metrics.phase('discovery'):
+        discovery = discover(cvp_api, device_inventory, workers=workers, builder_keys=builder_keys)
+    drifted_devices = list()
+    for mac, planned_device in planned_devices.items():
+        # CVP can list builders and configlets in another order than they were assigned in
+        assigned_keys = {c.key for c in discovery.device_sys_mac_to_configlet_map.get(mac, list())}
+        if assigned_keys != set(planned_device['assignedConfigletKeys']):
+            logging.warning(f'Configlets assigned to {mac} were changed after the plan was created. The device is skipped.')
+            drifted_devices.append(mac)
+    assigned_configlet_keys = {c.key for configlets in discovery.device_sys_mac_to_configlet_map.values() for c in configlets}
+    # generate configlets only for planned device and builder pairs
+    for builder_id in list(discovery.builder_device_map):
+        cont_device_bundle = discovery.builder_device_map[builder_id]
+        for container_id in list(cont_device_bundle):
+            device_list = [
+                mac for mac in cont_device_bundle[container_id]
+                if mac not in drifted_devices and builder_id in planned_devices[mac]['builderKeys']
+            ]
+            if device_list:
+                cont_device_bundle[container_id] = device_list
+            else:
+                del cont_device_bundle[container_id]
+        if not cont_device_bundle:
+            del discovery.builder_device_map[builder_id]
+    with metrics.phase('generation'):
+        generated_configlets = generate_configlets(
+            cvp_api, discovery.builder_device_map, workers=gen_workers, chunk_size=gen_chunk_size, timeout=gen_timeout)
+    with metrics.phase('matching'):
+        device_plans = plan_changes(discovery, generated_configlets)
+    # diffs were logged by make_plan(), config of replaced configlets is not downloaded again
+    # configlets created by the generation of the plan are deleted as well, unless they are assigned now
+    unused_configlets = [cvp_api.configlet_store.intern(c) for c in plan.get('unused', list())]
+    unused_configlets.extend(c for c in configlets_created_by_plan(cvp_api, plan) if c.key not in assigned_configlet_keys)
+    unused_configlets.extend(discovery.unused_configlets)
+    if journal:
+        journal.record_plan(device_plans, unused_configlets)
+    apply_changes(cvp_api, device_plans, batch=True, batch_size=batch_size, execute=execute,
+                  execute_batch_size=execute_batch_size, execute_timeout=execute_timeout, workers=workers,
+                  journal=journal, unused_configlets=unused_configlets)
+    return device_plans, drifted_devices
@@ -0,0 +1,292 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile runner
+Runs reconcile, plan or commit against a CVP cluster.
+Multiple clusters are reconciled concurrently in a process pool, every cluster with its own CVP session,
+so the total run time is close to the run time of the slowest cluster.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+from mcast_reconcile.compliance import compliance_sweep
+from mcast_reconcile.cvp import CVP, CVPError
+from mcast_reconcile.journal import Journal, JournalError
+from mcast_reconcile.metrics import Metrics
+from mcast_reconcile.planfile import PlanError, plan_to_dict, read_plan, write_plan
+from mcast_reconcile.reconcile import (
+    commit_plan, find_builder_keys, make_plan, reconcile, resume_reconcile, select_devices)
+from mcast_reconcile.state import StateCache
+
+
+class InventoryError(Exception):
+    # raised when the cluster inventory file can not be used
+    pass
+
+
+class Cluster(object):
+
+    def __init__(self, name, address, username, password=None):
+        # address: CVP IP address, DNS name or URL
+        self.name = name
+        self.address = address
+        self.username = username
+        self.password = password
+
+    @property
+    def url(self):
+        return self.address if '://' in self.address else f'https://{self.address}'
+
+
+def load_cluster_inventory(path, default_username=None):
+    # cluster inventory is a JSON list:
+    # [ { "name": "emea", "cvp": "cvp-emea.example.com", "username": "cvpadmin", "passwordEnv": "CVP_EMEA_PASSWORD" }, ... ]
+    # "password" can be used instead of "passwordEnv", the password is requested later if not provided
+    try:
+        with open(path) as f:
+            inventory = json.load(f)
+    except (OSError, ValueError) as e:
+        raise InventoryError(f'Can not read cluster inventory {path}!\nERROR: {e}')
+    if not isinstance(inventory, list):
+        raise InventoryError(f'Cluster inventory {path} must be a list of clusters!')
+    clusters = list()
+    for entry in inventory:
+        if not isinstance(entry, dict) or not entry.get('cvp'):
+            raise InventoryError(f'Every cluster in {path} must have a "cvp" address!')
+        password = entry.get('password')
+        if entry.get('passwordEnv'):
+            password = os.environ.get(entry['passwordEnv'])
+            if not password:
+                raise InventoryError(f"Environment variable {entry['passwordEnv']} is not set!")
+        clusters.append(Cluster(entry.get('name') or entry['cvp'], entry['cvp'],
+                                entry.get('username') or default_username, password=password))
+    return clusters
+
+
+def cluster_file_name(path, cluster_name):
+    # mcast-reconcile-plan.json -> mcast-reconcile-plan.<cluster name>.json
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{re.sub(r'[^A-Za-z0-9_.-]', '_', cluster_name)}{ext}"
+
+
+def connect(cluster, options, metrics=None):
+    logging.info(f'Connecting to {cluster.url}')
+    return CVP(url_prefix=cluster.url, cvp_username=cluster.username, cvp_password=cluster.password,
+               pool_maxsize=max(options.workers, options.gen_workers), retries=options.retries, metrics=metrics)
+
+
+def run_cluster(cluster, options, per_cluster_files=False):
+    # run options.command ( run, plan or commit ) for a cluster with the trigger options
+    # per_cluster_files: add the cluster name to plan, state and metrics file names and metrics labels
+    # returns the run summary, errors are reported in the summary
+    file_name = (lambda path: cluster_file_name(path, cluster.name)) if per_cluster_files else (lambda path: path)
+    plan_file = file_name(options.plan_file)
+    metrics = Metrics(labels={'cluster': cluster.name} if per_cluster_files else None)
+    summary = {'cluster': cluster.name, 'cvp': cluster.url, 'command': options.command, 'error': None,
+               'devices': 0, 'changedDevices': 0}
+    plan_options = {
+        'workers': options.workers,
+        'gen_workers': options.gen_workers,
+        'gen_chunk_size': options.gen_chunk_size,
+        'gen_timeout': options.gen_timeout,
+    }
+    execute_options = {
+        'execute': options.execute,
+        'execute_batch_size': options.execute_batch_size,
+        'execute_timeout': options.execute_timeout,
+    }
+    start = time.time()
+    journal = None
+    try:
+        if options.command in ['run', 'commit']:
+            journal_file = file_name(options.journal)
+            journal = Journal.load(journal_file, cvp_url=cluster.url) if options.resume else None
+            if journal and not journal.finished and journal.plan is not None:
+                cvp_api = connect(cluster, options, metrics=metrics)
+                logging.info(f'Resuming the run started at {time.ctime(journal.started_at)} from journal {journal_file}.')
+                # commit saves all changes in batch mode
+                device_plans, drifted_devices = resume_reconcile(
+                    cvp_api, journal, workers=options.workers, batch=options.batch or options.command == 'commit',
+                    batch_size=options.batch_size, **execute_options)
+                journal.finish()
+                summary['devices'] = len(journal.plan['devices'])
+                summary['changedDevices'] = len({p.device.system_mac_address for p in device_plans})
+                if drifted_devices:
+                    summary['error'] = (
+                        f"ERROR: {len(drifted_devices)} devices were skipped as assigned configlets were changed after the interruption: "
+                        f"{', '.join(drifted_devices)}\nRun reconcile again for these devices.")
+                return summary
+            if options.resume:
+                logging.info(f'There is no interrupted run to resume in journal {journal_file}, starting a new run.')
+            if journal:
+                journal.close()
+                journal = None
+
+        if options.command == 'commit':
+            # check the plan before connecting to CVP
+            plan = read_plan(plan_file, cvp_url=cluster.url, max_age=options.plan_max_age)
+            cvp_api = connect(cluster, options, metrics=metrics)
+            # a commit is recorded like a run, so it can be resumed if it fails
+            journal = Journal.create(journal_file, cluster.url)
+            logging.info(f"Committing reconcile plan {plan_file} for {len(plan['devices'])} devices.")
+            device_plans, drifted_devices = commit_plan(
+                cvp_api, plan, batch_size=options.batch_size, journal=journal, **plan_options, **execute_options)
+            journal.finish()
+            summary['devices'] = len(plan['devices'])
+            summary['changedDevices'] = len({p.device.system_mac_address for p in device_plans})
+            logging.info(f"Configlets were reassigned for {summary['changedDevices']} devices.")
+            if drifted_devices:
+                summary['error'] = (
+                    f"ERROR: {len(drifted_devices)} devices were skipped as assigned configlets were changed after the plan was created: "
+                    f"{', '.join(drifted_devices)}\nCreate a new plan for these devices.")
+            return summary
+
+        if options.command == 'run':
+            # every run is recorded, so it can be resumed if it fails
+            journal = Journal.create(journal_file, cluster.url)
+
+        cvp_api = connect(cluster, options, metrics=metrics)
+        # state cache is only used in incremental mode or to rebuild it with a full run
+        state_cache = None
+        if options.incremental or options.full:
+            state_cache = StateCache(file_name(options.state_db))
+            if options.full:
+                state_cache.clear()
+
+        # get device inventory
+        logging.info('Collecting device inventory.')
+        with metrics.phase('inventory'):
+            device_inventory = cvp_api.get_devices()
+            devices_to_reconcile = select_devices(
+                cvp_api, device_inventory, containers=options.containers, devices=options.devices)
+        if options.containers or options.devices:
+            logging.info(f'{len(devices_to_reconcile)} devices were selected for reconcile.')
+        builder_keys = find_builder_keys(cvp_api, options.builders) if options.builders else None
+        known_configlets = None
+        if options.incremental:
+            # configlets are generated for all devices, as routes filtered by TerminAttr do not change the inventory
+            # only configlets assigned to unchanged devices are taken from the state cache
+            unchanged_devices = {
+                k: v for k, v in devices_to_reconcile.items() if state_cache.device_is_unchanged(v, max_age=options.state_max_age)
+            }
+            if options.compliance_sweep:
+                # configlets assigned to unchanged devices out of compliance are collected from CVP again
+                with metrics.phase('compliance'):
+                    non_compliant_devices = compliance_sweep(
+                        cvp_api, unchanged_devices, workers=options.workers, rate=options.compliance_rate,
+                        ignore_pattern=options.compliance_ignore)
+                unchanged_devices = {k: v for k, v in unchanged_devices.items() if k not in non_compliant_devices}
+            known_configlets = {
+                v.system_mac_address: state_cache.assigned_configlets(v, cvp_api.configlet_store)
+                for v in unchanged_devices.values()
+            }
+            logging.info(f'{len(unchanged_devices)} devices were not changed since the last run, '
+                         f'configlets assigned to them will not be collected from CVP.')
+        elif options.compliance_sweep:
+            with metrics.phase('compliance'):
+                devices_to_reconcile = compliance_sweep(
+                    cvp_api, devices_to_reconcile, workers=options.workers, rate=options.compliance_rate,
+                    ignore_pattern=options.compliance_ignore)
+        summary['devices'] = len(devices_to_reconcile)
+
+        if options.command == 'plan':
+            discovery, device_plans = make_plan(
+                cvp_api, devices_to_reconcile, builder_keys=builder_keys, profile=file_name(options.profile),
+                **plan_options)
+            write_plan(plan_file, plan_to_dict(cluster.url, device_plans, discovery.unused_configlets))
+            summary['changedDevices'] = len({p.device.system_mac_address for p in device_plans})
+            logging.info(f"Changes for {summary['changedDevices']} devices were saved to {plan_file}.")
+            return summary
+
+        discovery, device_plans = reconcile(
+            cvp_api, devices_to_reconcile, known_configlets=known_configlets, builder_keys=builder_keys,
+            profile=file_name(options.profile), batch=options.batch, batch_size=options.batch_size, journal=journal,
+            **plan_options, **execute_options)
+        journal.finish()
+        summary['changedDevices'] = len({p.device.system_mac_address for p in device_plans})
+        if discovery.drifted_devices:
+            summary['error'] = (
+                f"ERROR: {len(discovery.drifted_devices)} devices were skipped as assigned configlets were changed on CVP: "
+                f"{', '.join(discovery.drifted_devices)}\nRun reconcile again for these devices.")
+
+        if state_cache:
+            # record device state after a successful run
+            for v in devices_to_reconcile.values():
+                state_cache.update(v, discovery.device_sys_mac_to_configlet_map[v.system_mac_address])
+            state_cache.prune([v.system_mac_address for v in device_inventory.values()])
+            state_cache.commit()
+            state_cache.close()
+        return summary
+    except (CVPError, PlanError, JournalError, requests.exceptions.RequestException) as e:
+        summary['error'] = str(e)
+        if journal and not journal.finished:
+            summary['error'] += f'\nUse --resume to continue the run from journal {journal.path}.'
+        return summary
+    finally:
+        if journal:
+            journal.close()
+        summary['duration'] = time.time() - start
+        # metrics are written for failed runs as well
+        metrics.write(json_path=file_name(options.metrics_json), prometheus_path=file_name(options.metrics_prom))
+
+
+def run_cluster_process(cluster, options):
+    # entry point of a process pool worker, log messages are prefixed with the cluster name
+    logging.basicConfig(level=logging.INFO, format=f'%(levelname)s:{cluster.name}:%(message)s', force=True)
+    return run_cluster(cluster, options, per_cluster_files=True)
+
+
+def run_clusters(clusters, options, workers=None):
+    # run options.command for every cluster in a separate process
+    # workers: max number of clusters processed at the same time, all clusters are processed at once by default
+    # returns the list of run summaries in cluster order
+    with ProcessPoolExecutor(max_workers=workers or len(clusters)) as executor:
+        futures = [executor.submit(run_cluster_process, cluster, options) for cluster in clusters]
+        summaries = list()
+        for cluster, future in zip(clusters, futures):
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                # unexpected errors or a crashed worker process must not hide results of other clusters
+                summaries.append({'cluster': cluster.name, 'cvp': cluster.url, 'command': options.command,
+                                  'error': f'ERROR: {type(e).__name__}: {e}', 'devices': 0, 'changedDevices': 0,
+                                  'duration': 0})
+    return summaries
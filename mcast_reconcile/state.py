@@ -0,0 +1,127 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile state cache
+Persistent device state used by incremental reconcile runs.
+Every device is keyed by its system MAC and the cache records configlets assigned after the last run,
+with canonical config digests of generated configlets, and inventory fields used to detect a change.
+Configlets of unchanged devices are not collected from CVP again, but configlets are always generated,
+as routes filtered by the custom TerminAttr do not change any inventory field.
+"""
+
+import json
+import sqlite3
+import time
+
+# the cache is rebuilt if it was created with another format or configlet digest
+STATE_VERSION = 3
+
+
+class StateCache(object):
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != STATE_VERSION:
+            self.connection.execute('DROP TABLE IF EXISTS devices')
+            self.connection.execute(f'PRAGMA user_version = {STATE_VERSION}')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS devices ('
+            'system_mac TEXT PRIMARY KEY, '
+            'serial_number TEXT, '
+            'parent_container_key TEXT, '
+            'last_sync_up INTEGER, '
+            'assigned_configlets TEXT, '
+            'updated_at REAL)'
+        )
+        self.connection.commit()
+        self.devices = dict()  # cached state for every system MAC
+        for row in self.connection.execute(
+                'SELECT system_mac, serial_number, parent_container_key, last_sync_up, '
+                'assigned_configlets, updated_at FROM devices'):
+            self.devices[row[0]] = {
+                'serialNumber': row[1],
+                'parentContainerKey': row[2],
+                'lastSyncUp': row[3],
+                'assignedConfiglets': json.loads(row[4]),
+                'updatedAt': row[5],
+            }
+
+    def clear(self):
+        # drop all cached records, used to rebuild the cache from scratch
+        self.connection.execute('DELETE FROM devices')
+        self.connection.commit()
+        self.devices = dict()
+
+    def device_is_unchanged(self, device, max_age=0):
+        # device: Device from CVP inventory
+        # max_age: max age of the cached record in seconds, 0 - records never expire
+        cached = self.devices.get(device.system_mac_address)
+        if not cached:
+            return False
+        if max_age and (time.time() - cached['updatedAt'] > max_age):
+            return False
+        return (cached['parentContainerKey'] == device.parent_container_key) and (
+            cached['lastSyncUp'] == device.last_sync_up)
+
+    def assigned_configlets(self, device, configlet_store):
+        # returns the list of Configlet assigned to the device after the last run
+        # configlet_store: ConfigletStore to intern configlets in
+        return [configlet_store.intern(c) for c in self.devices[device.system_mac_address]['assignedConfiglets']]
+
+    def update(self, device, assigned_configlet_list):
+        # record device state after reconcile
+        d = {
+            'serialNumber': device.serial_number,
+            'parentContainerKey': device.parent_container_key,
+            'lastSyncUp': device.last_sync_up,
+            'assignedConfiglets': [dict(cfglet.to_ref(), digest=cfglet.digest) for cfglet in assigned_configlet_list],
+            'updatedAt': time.time(),
+        }
+        self.devices[device.system_mac_address] = d
+        self.connection.execute(
+            'INSERT OR REPLACE INTO devices VALUES (?, ?, ?, ?, ?, ?)',
+            (device.system_mac_address, d['serialNumber'], d['parentContainerKey'], d['lastSyncUp'],
+             json.dumps(d['assignedConfiglets']), d['updatedAt'])
+        )
+
+    def prune(self, system_mac_list):
+        # remove devices that are no longer in the inventory
+        known_macs = set(system_mac_list)
+        for system_mac in [mac for mac in self.devices if mac not in known_macs]:
+            del self.devices[system_mac]
+            self.connection.execute('DELETE FROM devices WHERE system_mac = ?', (system_mac,))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
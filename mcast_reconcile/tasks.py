@@ -0,0 +1,148 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Task execution
+Executes tasks created by a reconcile run in batches and waits for every task to complete.
+Only tasks created by the run are polled, with a delay growing while no task changes its state.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mcast_reconcile.cvp import CVPError
+
+# task states that will not change anymore
+TASK_FINAL_STATES = {'Completed', 'Failed', 'Cancelled'}
+
+
+class TaskPoller(object):
+    # final states of polled tasks and the delay before the next poll, shared by the sync and asyncio pipelines
+    # the delay between polls is doubled while no task is finished and reset to min_delay otherwise
+
+    def __init__(self, task_ids, timeout=3600, min_delay=1, max_delay=30):
+        self.task_ids = task_ids
+        self.timeout = timeout
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.deadline = time.time() + timeout
+        self.delay = min_delay
+        self.final_states = dict()  # final state for every finished task ID
+
+    @property
+    def pending(self):
+        return [task_id for task_id in self.task_ids if task_id not in self.final_states]
+
+    @property
+    def done(self):
+        return len(self.final_states) == len(self.task_ids)
+
+    def update(self, task_ids, tasks):
+        # tasks: task details returned by CVP for task_ids
+        finished = 0
+        for task_id, task in zip(task_ids, tasks):
+            state = task.get('workOrderUserDefinedStatus')
+            if state in TASK_FINAL_STATES:
+                self.final_states[task_id] = state
+                finished += 1
+                log = logging.info if state == 'Completed' else logging.error
+                log(f"Task {task_id} ({task.get('description', '')}) {state.lower()}.")
+        self.delay = self.min_delay if finished else min(self.delay * 2, self.max_delay)
+
+    def next_delay(self):
+        # returns seconds to wait before the next poll, raises CVPError when the timeout is over
+        if time.time() >= self.deadline:
+            raise CVPError(f"Tasks {', '.join(self.pending)} were not finished in {self.timeout} seconds!")
+        return min(self.delay, max(0, self.deadline - time.time()))
+
+
+def task_batches(task_ids, batch_size=50):
+    # yields batches of task IDs to execute one after another and tasks that are not executed if the batch fails
+    for i in range(0, len(task_ids), batch_size):
+        batch = task_ids[i:i+batch_size]
+        logging.info(f"Executing tasks {', '.join(batch)}")
+        yield batch, task_ids[i+batch_size:]
+
+
+def check_batch(final_states, not_executed):
+    # raises CVPError if a task of an executed batch did not complete
+    failed = [task_id for task_id, state in final_states.items() if state != 'Completed']
+    if failed:
+        raise CVPError(f"Tasks {', '.join(failed)} failed!" + (
+            f" Tasks {', '.join(not_executed)} were not executed." if not_executed else ''))
+
+
+def wait_for_tasks(cvp_api, task_ids, workers=10, timeout=3600, min_delay=1, max_delay=30):
+    # poll tasks until all of them reach a final state
+    # returns { 'task ID': 'final state' }
+    poller = TaskPoller(task_ids, timeout=timeout, min_delay=min_delay, max_delay=max_delay)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            pending = poller.pending
+            poller.update(pending, executor.map(cvp_api.get_task_by_id, pending))
+            if poller.done:
+                return poller.final_states
+            time.sleep(poller.next_delay())
+
+
+def execute_tasks(cvp_api, task_ids, batch_size=50, workers=10, timeout=3600):
+    # execute tasks in batches of batch_size, the next batch is started only after the previous one has finished
+    # execution is stopped if a task in a batch fails
+    # timeout: max time in seconds to wait for every batch
+    for batch, not_executed in task_batches(task_ids, batch_size=batch_size):
+        cvp_api.execute_tasks(batch)
+        check_batch(wait_for_tasks(cvp_api, batch, workers=workers, timeout=timeout), not_executed)
+    logging.info(f'{len(task_ids)} tasks were executed successfully.')
+
+
+def resume_tasks(cvp_api, task_ids, batch_size=50, workers=10, timeout=3600):
+    # execute tasks created by an interrupted run
+    # tasks executed before the interruption are only waited for, a failed task fails the run again
+    # cancelled tasks are skipped as they were cancelled by an operator
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        states = {
+            task_id: task.get('workOrderUserDefinedStatus')
+            for task_id, task in zip(task_ids, executor.map(cvp_api.get_task_by_id, task_ids))
+        }
+    in_progress = [task_id for task_id in task_ids if states[task_id] not in TASK_FINAL_STATES | {'Pending'}]
+    if in_progress:
+        logging.info(f"Waiting for tasks {', '.join(in_progress)}")
+        states.update(wait_for_tasks(cvp_api, in_progress, workers=workers, timeout=timeout))
+    failed = [task_id for task_id in task_ids if states[task_id] == 'Failed']
+    if failed:
+        raise CVPError(f"Tasks {', '.join(failed)} failed! Cancel them on CVP to resume the run without them.")
+    cancelled = [task_id for task_id in task_ids if states[task_id] == 'Cancelled']
+    if cancelled:
+        logging.warning(f"Tasks {', '.join(cancelled)} were cancelled and will not be executed.")
+    pending = [task_id for task_id in task_ids if states[task_id] == 'Pending']
+    if pending:
+        execute_tasks(cvp_api, pending, batch_size=batch_size, workers=workers, timeout=timeout)
@@ -0,0 +1,51 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Test helpers
+Build devices and configlets used by reconcile the same way as they are received from CVP.
+"""
+
+from mcast_reconcile.models import Device
+
+
+def make_device(n=1, container='container_1', last_sync_up=1000):
+    return Device(f'SN{n:04d}', f'00:1c:73:00:00:{n:02x}', hostname=f'leaf{n}', fqdn=f'leaf{n}.example.com',
+                  ip_address=f'10.0.0.{n}', parent_container_key=container, last_sync_up=last_sync_up)
+
+
+def make_configlet(store, key, name, configlet_type='Static', config=''):
+    # configlets are interned like configlets received from CVP, generated configlets get a digest
+    return store.intern({'key': key, 'name': name, 'type': configlet_type, 'config': config})
+
+
+def mcast_config(*routes):
+    return 'router multicast\n   ipv4\n' + ''.join(f'      route {route}\n' for route in routes)
@@ -0,0 +1,94 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Asyncio API tests"""
+
+import asyncio
+
+import pytest
+from mock_cvp import MockCVP
+
+from mcast_reconcile.cvp import CVPError
+from mcast_reconcile.journal import Journal
+
+pytest.importorskip('aiohttp')
+
+from mcast_reconcile.aio import AsyncCVP, reconcile  # noqa: E402
+
+
+def saved_devices(cvp):
+    # system MACs of devices with a task created by saved topology
+    return sorted(task['netElementId'] for task in cvp.tasks.values())
+
+
+def test_failed_commit_is_journaled_and_not_saved_by_the_next_reconcile(serve_mock_cvp, tmp_path):
+    # every device has a route that is not reflected in the generated configlet yet
+    cvp = MockCVP(devices=3, change_ratio=1.0)
+    server = serve_mock_cvp(cvp)
+    url = 'http://%s:%s' % server.server_address[:2]
+    macs = [device['systemMacAddress'] for device in cvp.devices]
+    journal_path = str(tmp_path / 'journal.jsonl')
+
+    async def run():
+        async with AsyncCVP(url, 'cvpadmin', 'cvpadmin', retries=0) as cvp_api:
+            journal = Journal.create(journal_path, url)
+            server.error_rate = {'saveTopology.do': 1.0}
+            with pytest.raises(CVPError):
+                await reconcile(cvp_api, devices=['leaf0'], batch=True, journal=journal)
+            journal.close()
+            assert cvp_api.temp_task_list == []
+
+            server.error_rate = dict()
+            return await reconcile(cvp_api, devices=['leaf1'], batch=True)
+
+    result = asyncio.run(run())
+    assert result.changed_devices == [macs[1]]
+    assert saved_devices(cvp) == [macs[1]]
+    journal = Journal.load(journal_path, cvp_url=url)
+    assert journal.plan is not None and not journal.finished
+    assert list(journal.failed) == [(macs[0], cvp.assigned[macs[0]][1])]
+    journal.close()
+
+
+def test_client_created_outside_of_the_event_loop(serve_mock_cvp):
+    cvp = MockCVP(devices=2, change_ratio=1.0)
+    server = serve_mock_cvp(cvp)
+    cvp_api = AsyncCVP('http://%s:%s' % server.server_address[:2], 'cvpadmin', 'cvpadmin', retries=0)
+    assert cvp_api.locks == dict()
+
+    async def run():
+        async with cvp_api:
+            return await reconcile(cvp_api, batch=True)
+
+    result = asyncio.run(run())
+    assert sorted(result.changed_devices) == saved_devices(cvp)
+    assert 'commit' in cvp_api.locks
@@ -0,0 +1,106 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Plan commit tests"""
+
+import pytest
+from mock_cvp import MockCVP, mcast_route
+
+from mcast_reconcile.cvp import CVP, CVPError
+from mcast_reconcile.journal import Journal
+from mcast_reconcile.planfile import plan_to_dict
+from mcast_reconcile.reconcile import commit_plan, make_plan, resume_reconcile
+
+
+def test_failed_commit_is_resumed_from_journal(serve_mock_cvp, tmp_path):
+    # every device has a route that is not reflected in the generated configlet yet
+    cvp = MockCVP(devices=3, change_ratio=1.0)
+    server = serve_mock_cvp(cvp)
+    url = 'http://%s:%s' % server.server_address[:2]
+    cvp_api = CVP(url, 'cvpadmin', 'cvpadmin', retries=0)
+    discovery, device_plans = make_plan(cvp_api, cvp_api.get_devices(), workers=2, gen_workers=2)
+    plan = plan_to_dict(url, device_plans, discovery.unused_configlets)
+
+    journal_path = str(tmp_path / 'journal.jsonl')
+    journal = Journal.create(journal_path, url)
+    server.error_rate = {'saveTopology.do': 1.0}
+    with pytest.raises(CVPError):
+        commit_plan(cvp_api, plan, workers=2, gen_workers=2, journal=journal)
+    journal.close()
+    assert cvp.tasks == dict()
+
+    server.error_rate = dict()
+    journal = Journal.load(journal_path, cvp_url=url)
+    assert journal.plan is not None and not journal.finished
+    assert len(journal.failed) == len(device_plans)
+    cvp_api = CVP(url, 'cvpadmin', 'cvpadmin', retries=0)
+    committed_device_plans, drifted_devices = resume_reconcile(cvp_api, journal, workers=2, batch=True)
+    journal.finish()
+    assert drifted_devices == []
+    assert len(committed_device_plans) == len(device_plans)
+    assert sorted(task['netElementId'] for task in cvp.tasks.values()) == sorted(plan['devices'])
+
+
+def test_configlets_generated_by_the_plan_are_deleted(serve_mock_cvp):
+    cvp = MockCVP(devices=4, change_ratio=1.0)
+    server = serve_mock_cvp(cvp)
+    url = 'http://%s:%s' % server.server_address[:2]
+    cvp_api = CVP(url, 'cvpadmin', 'cvpadmin', retries=0)
+    discovery, device_plans = make_plan(cvp_api, cvp_api.get_devices(), workers=2, gen_workers=2)
+    plan = plan_to_dict(url, device_plans, discovery.unused_configlets)
+    # routes change after the plan was created, so the commit generates newer configlet versions
+    for n, routes in enumerate(cvp.running_routes.values()):
+        routes.append(mcast_route(20000000 + n))
+
+    committed_device_plans, drifted_devices = commit_plan(cvp_api, plan, workers=2, gen_workers=2)
+    assert drifted_devices == []
+    assert len(committed_device_plans) == len(device_plans)
+    assigned_keys = {key for keys in cvp.assigned.values() for key in keys}
+    generated = [c['name'] for c in cvp.configlets.values() if c['type'] == 'Generated']
+    assert len(generated) == len(plan['devices'])
+    assert all(c['key'] in assigned_keys for c in cvp.configlets.values())
+    assert all(name.endswith('_3') for name in generated)
+
+
+def test_devices_with_configlets_listed_in_another_order_are_committed(serve_mock_cvp):
+    cvp = MockCVP(devices=2, change_ratio=1.0)
+    server = serve_mock_cvp(cvp)
+    url = 'http://%s:%s' % server.server_address[:2]
+    cvp_api = CVP(url, 'cvpadmin', 'cvpadmin', retries=0)
+    discovery, device_plans = make_plan(cvp_api, cvp_api.get_devices(), workers=2, gen_workers=2)
+    plan = plan_to_dict(url, device_plans, discovery.unused_configlets)
+    for keys in cvp.assigned.values():
+        keys.reverse()
+
+    committed_device_plans, drifted_devices = commit_plan(cvp_api, plan, workers=2, gen_workers=2)
+    assert drifted_devices == []
+    assert len(committed_device_plans) == len(device_plans)
@@ -0,0 +1,124 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Canonical config comparison tests"""
+
+import re
+
+from mcast_reconcile.compare import (
+    canonical_lines, config_diff, config_diff_summary, config_digest, configs_equal, iter_canonical_lines,
+    iter_config_lines)
+
+CONFIG = (
+    'router multicast\n'
+    '   ipv4\n'
+    '      route 239.1.1.1 10.0.0.1 iif Ethernet1\n'
+    '      route 239.1.1.2 10.0.0.1 iif Ethernet2\n'
+    '!\n'
+    'interface Ethernet1\n'
+    '   shutdown\n'
+)
+# the same config with another line order, trailing spaces, CRLF line endings, blank lines and comments
+REFORMATTED_CONFIG = (
+    'interface Ethernet1\r\n'
+    '   shutdown   \r\n'
+    '\r\n'
+    'router multicast\r\n'
+    '   ipv4\r\n'
+    '      route 239.1.1.2 10.0.0.1 iif Ethernet2\r\n'
+    '      ! a comment\r\n'
+    '      route 239.1.1.1 10.0.0.1 iif Ethernet1\r\n'
+)
+
+
+def test_iter_config_lines():
+    assert list(iter_config_lines('a\nb\n\nc')) == ['a', 'b', '', 'c']
+    assert list(iter_config_lines('a\n')) == ['a']
+    assert list(iter_config_lines('')) == []
+
+
+def test_canonical_lines_include_parents():
+    assert canonical_lines(CONFIG) == {
+        'router multicast',
+        'router multicast > ipv4',
+        'router multicast > ipv4 > route 239.1.1.1 10.0.0.1 iif Ethernet1',
+        'router multicast > ipv4 > route 239.1.1.2 10.0.0.1 iif Ethernet2',
+        'interface Ethernet1',
+        'interface Ethernet1 > shutdown',
+    }
+
+
+def test_formatting_and_line_order_are_ignored():
+    assert configs_equal(CONFIG, REFORMATTED_CONFIG)
+    assert config_digest(CONFIG) == config_digest(REFORMATTED_CONFIG)
+    assert config_diff(CONFIG, REFORMATTED_CONFIG) == ([], [])
+
+
+def test_repeated_lines_are_ignored():
+    repeated = CONFIG + 'interface Ethernet1\n   shutdown\n   shutdown\n'
+    assert configs_equal(CONFIG, repeated)
+    assert config_digest(CONFIG) == config_digest(repeated)
+    assert config_diff(CONFIG, repeated) == ([], [])
+
+
+def test_same_line_under_another_parent_is_a_change():
+    moved = CONFIG.replace('interface Ethernet1', 'interface Ethernet2')
+    assert not configs_equal(CONFIG, moved)
+    assert config_digest(CONFIG) != config_digest(moved)
+    assert config_diff(CONFIG, moved) == (
+        ['interface Ethernet2', 'interface Ethernet2 > shutdown'],
+        ['interface Ethernet1', 'interface Ethernet1 > shutdown'])
+
+
+def test_config_diff_summary_is_bounded():
+    new_config = CONFIG + ''.join(f'vlan {n}\n' for n in range(10))
+    summary = config_diff_summary(CONFIG, new_config, max_lines=3)
+    assert summary[0] == '10 lines added, 0 lines removed'
+    assert summary[1:4] == ['+ vlan 0', '+ vlan 1', '+ vlan 2']
+    assert len(summary) == 5
+
+
+def test_ignored_lines_and_their_children_are_skipped():
+    ignore = re.compile(r'route\s239|interface')
+    running_config = 'router multicast\n   ipv4\n      routing\n'
+    designed_config = CONFIG.replace('!\n', '      routing\n!\n')
+    assert configs_equal(designed_config, running_config, ignore=ignore)
+    assert not configs_equal(designed_config, running_config)
+
+
+def test_skipped_lines_can_be_kept_in_place():
+    ignore = re.compile(r'route\s239')
+    lines = list(iter_config_lines(REFORMATTED_CONFIG))
+    canonical = list(iter_canonical_lines(lines, ignore=ignore, keep_skipped=True))
+    assert len(canonical) == len(lines)
+    assert [line for line in canonical if line is not None] == list(iter_canonical_lines(REFORMATTED_CONFIG, ignore=ignore))
+    assert canonical[2] is None and canonical[5] is None
@@ -0,0 +1,93 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Compliance sweep tests"""
+
+from mock_cvp import MockCVP, drift_route
+
+from mcast_reconcile.compliance import (
+    RateLimiter, compile_ignore_pattern, compliance_sweep, device_is_compliant, differing_lines)
+from mcast_reconcile.cvp import CVP
+
+
+class CountingRateLimiter(RateLimiter):
+    # counts rate limited calls without waiting
+
+    def __init__(self):
+        super().__init__(rate=0)
+        self.calls = 0
+
+    def wait(self):
+        self.calls += 1
+
+
+def test_differing_lines_skip_ignored_lines_with_child_lines():
+    config_lines = [
+        {'command': 'router multicast', 'code': ''},
+        {'command': '   ipv4', 'code': ''},
+        {'command': '      route 239.1.1.1 10.0.0.1 iif Ethernet1', 'code': 'new'},
+        {'command': '      route 232.1.1.1 10.0.0.1 iif Ethernet1', 'code': 'new'},
+        {'command': 'ip igmp static-group 239.1.1.1', 'code': 'mismatch'},
+        {'command': '   interface Ethernet1', 'code': 'mismatch'},
+        {'command': 'end', 'code': ''},
+    ]
+    ignore = compile_ignore_pattern('239[[:punct:]]')
+    assert differing_lines(config_lines, ignore=ignore) == ['router multicast > ipv4 > route 232.1.1.1 10.0.0.1 iif Ethernet1']
+    assert len(differing_lines(config_lines)) == 4
+
+
+def test_only_devices_with_not_ignored_differences_are_out_of_compliance(serve_mock_cvp):
+    # routes in 239.0.0.0/8 are not streamed to CVP like with a custom TerminAttr, leaf1 has another route
+    cvp = MockCVP(devices=3, change_ratio=0.0, running_config_filter=r'route\s239')
+    mac = cvp.devices[1]['systemMacAddress']
+    cvp.running_routes[mac].append(drift_route(1))
+    server = serve_mock_cvp(cvp)
+    cvp_api = CVP('http://%s:%s' % server.server_address[:2], 'cvpadmin', 'cvpadmin', retries=0)
+    device_inventory = cvp_api.get_devices()
+    # running config has lines that are not in any configlet, they are not reported by the CVP comparison
+    assert 'end' in cvp.running_config(mac).splitlines()
+
+    assert compliance_sweep(cvp_api, device_inventory, rate=0) == device_inventory
+    non_compliant_devices = compliance_sweep(cvp_api, device_inventory, rate=0, ignore_pattern='route[[:space:]]239')
+    assert [device.system_mac_address for device in non_compliant_devices.values()] == [mac]
+
+
+def test_config_comparison_is_rate_limited(serve_mock_cvp):
+    cvp = MockCVP(devices=2, change_ratio=0.0, running_config_filter=r'route\s239')
+    server = serve_mock_cvp(cvp)
+    cvp_api = CVP('http://%s:%s' % server.server_address[:2], 'cvpadmin', 'cvpadmin', retries=0)
+    rate_limiter = CountingRateLimiter()
+    ignore = compile_ignore_pattern('route[[:space:]]239')
+    for device in cvp_api.get_devices().values():
+        assert device_is_compliant(cvp_api, device, rate_limiter, ignore=ignore)
+    # a compliance check and a config comparison for every device
+    assert rate_limiter.calls == 4
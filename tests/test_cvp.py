@@ -0,0 +1,85 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""CVP client tests"""
+
+import requests
+
+from mcast_reconcile import cvp as cvp_module
+from mcast_reconcile.cvp import CVP
+from mcast_reconcile.metrics import Metrics
+
+
+class FakeSession:
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def request(self, method, url, timeout=None, **kwargs):
+        return self.responses.pop(0)
+
+
+def make_response(status_code, headers=None):
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp.headers.update(headers or dict())
+    resp._content = b'{}'
+    resp.request = requests.Request('GET', 'https://cvp/').prepare()
+    return resp
+
+
+def make_cvp(responses):
+    # CVP client without login
+    cvp_api = CVP.__new__(CVP)
+    cvp_api.metrics = Metrics()
+    cvp_api.session = FakeSession(responses)
+    cvp_api.timeout = 60
+    cvp_api.connect_timeout = 10
+    cvp_api.retries = 3
+    cvp_api.backoff = 0.5
+    return cvp_api
+
+
+def test_retry_after_is_respected():
+    cvp_api = make_cvp([])
+    assert cvp_api.retry_delay(0, make_response(429, {'Retry-After': '5'})) == 5
+
+
+def test_retry_after_is_limited_to_read_timeout(monkeypatch):
+    delays = list()
+    monkeypatch.setattr(cvp_module.time, 'sleep', delays.append)
+    cvp_api = make_cvp([make_response(503, {'Retry-After': '86400'}), make_response(200)])
+    url = 'https://cvp/cvpservice/inventory/devices'
+    resp = cvp_api._send('GET', url)
+    assert resp.status_code == 200
+    assert delays == [cvp_api.read_timeout(url)]
+    assert cvp_api.retry_delay(0, make_response(503, {'Retry-After': '86400'})) == cvp_api.timeout
@@ -0,0 +1,140 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile daemon tests
+Reconcile cycles run with the CVP client against the mock CVP server from the bench directory.
+"""
+
+import pytest
+from mock_cvp import MockCVP, mcast_route
+
+from mcast_reconcile.cvp import CVP, CVPError
+from mcast_reconcile.daemon import ReconcileDaemon
+
+
+@pytest.fixture
+def mock_cvp(serve_mock_cvp):
+    # every device has a route that is not reflected in the generated configlet yet
+    cvp = MockCVP(devices=4, change_ratio=1.0)
+    return cvp, serve_mock_cvp(cvp)
+
+
+def new_daemon(server):
+    cvp_api = CVP('http://%s:%s' % server.server_address[:2], 'cvpadmin', 'cvpadmin', retries=0)
+    return ReconcileDaemon(cvp_api, workers=2, gen_workers=2)
+
+
+def saved_devices(cvp):
+    # system MACs of devices with a task created by saved topology
+    return sorted(task['netElementId'] for task in cvp.tasks.values())
+
+
+@pytest.mark.parametrize('failed_endpoint', ['saveTopology.do', 'addTempAction.do'])
+def test_failed_commit_is_not_saved_by_the_next_cycle(mock_cvp, failed_endpoint):
+    cvp, server = mock_cvp
+    daemon = new_daemon(server)
+    macs = [device['systemMacAddress'] for device in cvp.devices]
+    assigned_before = list(cvp.assigned[macs[0]])
+
+    server.error_rate = {failed_endpoint: 1.0}
+    with pytest.raises(CVPError):
+        daemon.run_cycle(devices=['leaf0'])
+    assert daemon.cvp_api.temp_task_list == []
+
+    server.error_rate = dict()
+    summary = daemon.run_cycle(devices=['leaf1'])
+    assert summary['changedDevices'] == [macs[1]]
+    assert saved_devices(cvp) == [macs[1]]
+    assert cvp.assigned[macs[0]] == assigned_before
+
+
+def test_devices_reassigned_on_cvp_are_skipped(mock_cvp):
+    cvp, server = mock_cvp
+    daemon = new_daemon(server)
+    macs = [device['systemMacAddress'] for device in cvp.devices]
+    daemon.run_cycle()
+    assert saved_devices(cvp) == sorted(macs)
+
+    # an operator assigns a configlet and the controller adds a route, cached assignments are outdated
+    operator_configlet = cvp.add_configlet('operator', 'Static', 'hostname leaf0\n')
+    cvp.assigned[macs[0]].append(operator_configlet['key'])
+    for n, mac in enumerate(macs[:2]):
+        cvp.running_routes[mac].append(mcast_route(20000000 + n))
+    summary = daemon.run_cycle()
+    assert summary['driftedDevices'] == [macs[0]]
+    assert summary['changedDevices'] == [macs[1]]
+    assert operator_configlet['key'] in cvp.assigned[macs[0]]
+
+    # the current assignment is cached after the drift, so the device is reconciled on the next cycle
+    summary = daemon.run_cycle()
+    assert summary['changedDevices'] == [macs[0]]
+    assert summary['driftedDevices'] == []
+    assert operator_configlet['key'] in cvp.assigned[macs[0]]
+
+
+def test_daemon_keeps_running_after_an_unexpected_error(mock_cvp, monkeypatch, caplog):
+    cvp, server = mock_cvp
+    daemon = new_daemon(server)
+    daemon.interval, daemon.jitter = 0, 0
+    refresh_inventory = daemon.refresh_inventory
+    calls = list()
+
+    def refresh_inventory_once_failing():
+        calls.append(None)
+        if len(calls) == 1:
+            raise KeyError('data')
+        refresh_inventory()
+        daemon.stop()
+
+    monkeypatch.setattr(daemon, 'refresh_inventory', refresh_inventory_once_failing)
+    daemon.serve_forever()
+    assert len(calls) == 2
+    assert daemon.status['cycles'] == 1
+    assert daemon.status['lastError']['error'] == "'data'"
+    assert saved_devices(cvp) == sorted(device['systemMacAddress'] for device in cvp.devices)
+    assert any(record.exc_info and record.exc_info[0] is KeyError for record in caplog.records)
+
+
+def test_commit_failed_with_an_unexpected_error_is_not_saved_by_the_next_cycle(mock_cvp, monkeypatch):
+    cvp, server = mock_cvp
+    daemon = new_daemon(server)
+    macs = [device['systemMacAddress'] for device in cvp.devices]
+
+    # temp actions are added, but the save topology response can not be read
+    monkeypatch.setattr(daemon.cvp_api, 'save_topology', lambda: {}['taskIds'])
+    with pytest.raises(KeyError):
+        daemon.run_cycle(devices=['leaf0'])
+    monkeypatch.undo()
+
+    summary = daemon.run_cycle(devices=['leaf1'])
+    assert summary['changedDevices'] == [macs[1]]
+    assert saved_devices(cvp) == [macs[1]]
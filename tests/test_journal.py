@@ -0,0 +1,128 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile journal tests"""
+
+import json
+
+import pytest
+
+from helpers import make_configlet, make_device
+from mcast_reconcile.journal import Journal, JournalError
+from mcast_reconcile.models import ConfigletStore
+from mcast_reconcile.planner import DevicePlan
+
+CVP_URL = 'https://cvp.example.com'
+
+
+def make_device_plans():
+    store = ConfigletStore()
+    device_plans = list()
+    for n in [1, 2]:
+        device_plan = DevicePlan(make_device(n), builder_key='builder_1')
+        old = make_configlet(store, f'configlet_gen_{n}_1', f'mcast_10.0.0.{n}_1', 'Generated', f'vlan {n}\n')
+        new = make_configlet(store, f'configlet_gen_{n}_2', f'mcast_10.0.0.{n}_2', 'Generated', f'vlan {n + 10}\n')
+        device_plan.change_detected = True
+        device_plan.configlets_assigned = [old]
+        device_plan.configlets_to_be_assigned = [new]
+        device_plan.configlets_to_be_unassigned = [old]
+        device_plan.configlets_to_be_deleted = [old]
+        device_plans.append(device_plan)
+    return device_plans
+
+
+def test_progress_is_restored(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    device_plans = make_device_plans()
+    journal = Journal.create(path, CVP_URL)
+    journal.record_plan(device_plans)
+    journal.record_commit(device_plans[:1], ['101'])
+    journal.record_failure(device_plans[1:], 'Saving topology failed!')
+    journal.close()
+
+    journal = Journal.load(path, cvp_url=CVP_URL)
+    assert journal.phase_done('plan') and not journal.phase_done('commit')
+    assert [c['systemMacAddress'] for c in journal.plan['changes']] == [p.device.system_mac_address for p in device_plans]
+    assert journal.is_committed(device_plans[0]) and not journal.is_committed(device_plans[1])
+    assert journal.commit_error(device_plans[1]) == 'Saving topology failed!'
+    assert journal.task_ids == ['101']
+    assert not journal.finished
+
+    # a retried commit clears the failure
+    journal.record_commit(device_plans[1:], ['102'])
+    journal.finish()
+    journal = Journal.load(path, cvp_url=CVP_URL)
+    assert journal.is_committed(device_plans[1]) and journal.commit_error(device_plans[1]) is None
+    assert journal.task_ids == ['101', '102']
+    assert journal.finished
+    journal.close()
+
+
+def test_partially_written_record_is_truncated(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = Journal.create(str(path), CVP_URL)
+    journal.record_phase('commit')
+    journal.close()
+    valid_size = path.stat().st_size
+    with open(path, 'a') as f:
+        f.write('{"phase": "del')
+
+    journal = Journal.load(str(path), cvp_url=CVP_URL)
+    assert journal.phases == ['commit']
+    assert path.stat().st_size == valid_size
+    # new records are appended after the last complete record
+    journal.record_phase('delete')
+    journal.close()
+    assert Journal.load(str(path)).phases == ['commit', 'delete']
+
+
+def test_corrupted_record_is_an_error(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = Journal.create(str(path), CVP_URL)
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('not json\n' + json.dumps({'phase': 'commit'}) + '\n')
+    with pytest.raises(JournalError):
+        Journal.load(str(path))
+
+
+def test_journal_of_another_cvp_is_an_error(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    Journal.create(path, CVP_URL).close()
+    with pytest.raises(JournalError):
+        Journal.load(path, cvp_url='https://another-cvp.example.com')
+
+
+def test_missing_or_empty_journal(tmp_path):
+    assert Journal.load(str(tmp_path / 'missing.jsonl')) is None
+    (tmp_path / 'empty.jsonl').write_text('')
+    assert Journal.load(str(tmp_path / 'empty.jsonl')) is None
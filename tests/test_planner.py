@@ -0,0 +1,150 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile planner tests"""
+
+from helpers import make_configlet, make_device, mcast_config
+from mcast_reconcile.models import ConfigletStore
+from mcast_reconcile.planner import BuilderNameIndex, GeneratedConfigletIndex, configlet_name_prefix, plan_device
+
+BUILDER = 'mcast_auto_reconcile'
+
+
+def setup_device(generated_config=None, new_config=None, new_key='configlet_gen_2'):
+    # returns device, assigned configlets and the index of configlets generated for the device
+    store = ConfigletStore()
+    device = make_device()
+    assigned = [
+        make_configlet(store, 'configlet_static', 'static'),
+        make_configlet(store, 'builder_1', BUILDER, 'Builder'),
+    ]
+    if generated_config is not None:
+        assigned.append(make_configlet(store, 'configlet_gen_1', f'{BUILDER}_10.0.0.1_1', 'Generated', generated_config))
+    assigned.append(make_configlet(store, 'configlet_tail', 'tail'))
+    new_cfglet = make_configlet(store, new_key, f'{BUILDER}_10.0.0.1_2', 'Generated', new_config)
+    return device, assigned, GeneratedConfigletIndex([(device.system_mac_address, new_cfglet)]), new_cfglet
+
+
+def test_configlet_name_prefix():
+    assert configlet_name_prefix('mcast_auto_reconcile_192.168.122.11_5') == 'mcast_auto_reconcile_192.168.122.11'
+
+
+def test_builder_name_index_prefers_longest_builder_name():
+    index = BuilderNameIndex(['mcast', 'mcast_auto'])
+    assert index.match('mcast_auto_10.0.0.1_3') == 'mcast_auto'
+    assert index.match('mcast_10.0.0.1_3') == 'mcast'
+
+
+def test_builder_name_index_matches_prefix_only():
+    # the original substring match assigned configlets to builders with a name inside the configlet name
+    index = BuilderNameIndex(['reconcile'])
+    assert index.match('mcast_auto_reconcile_10.0.0.1_1') == ''
+    assert index.match('reconcile') == ''
+
+
+def test_unchanged_configlet_is_kept():
+    config = mcast_config('239.1.1.1 10.0.0.1 iif Ethernet1')
+    device, assigned, index, _ = setup_device(config, config, new_key='configlet_gen_1')
+    plan = plan_device(device, assigned, BuilderNameIndex([BUILDER]), BUILDER, index)
+    assert not plan.change_detected
+    assert plan.configlets_to_be_assigned == assigned
+    assert plan.configlets_to_be_unassigned == plan.configlets_to_be_deleted == []
+
+
+def test_changed_configlet_is_replaced_in_place():
+    device, assigned, index, new_cfglet = setup_device(
+        mcast_config('239.1.1.1 10.0.0.1 iif Ethernet1'),
+        mcast_config('239.1.1.1 10.0.0.1 iif Ethernet1', '239.1.1.2 10.0.0.1 iif Ethernet1'))
+    plan = plan_device(device, assigned, BuilderNameIndex([BUILDER]), BUILDER, index, bundle_builder_key='builder_1')
+    assert plan.change_detected
+    assert plan.builder_key == 'builder_1'
+    assert [c.key for c in plan.configlets_to_be_assigned] == [
+        'configlet_static', 'builder_1', 'configlet_gen_2', 'configlet_tail']
+    assert plan.configlets_to_be_unassigned == plan.configlets_to_be_deleted == [assigned[2]]
+    assert plan.replaced_configlets == [(assigned[2], new_cfglet)]
+
+
+def test_configlets_of_other_builders_are_kept():
+    store = ConfigletStore()
+    device = make_device()
+    other = make_configlet(store, 'configlet_other', 'other_builder_10.0.0.1_7', 'Generated', 'hostname leaf1\n')
+    assigned = [make_configlet(store, 'builder_1', BUILDER, 'Builder'), other]
+    new_cfglet = make_configlet(store, 'configlet_gen_2', f'{BUILDER}_10.0.0.1_1', 'Generated', mcast_config())
+    index = GeneratedConfigletIndex([(device.system_mac_address, new_cfglet)])
+    plan = plan_device(device, assigned, BuilderNameIndex([BUILDER, 'other_builder']), BUILDER, index)
+    # the generated configlet of this builder is lost and recovered, the other one is not touched
+    assert [c.key for c in plan.configlets_to_be_assigned] == ['builder_1', 'configlet_gen_2', 'configlet_other']
+    assert plan.configlets_to_be_unassigned == plan.configlets_to_be_deleted == []
+
+
+def test_lost_configlet_is_recovered_after_the_builder():
+    device, assigned, index, new_cfglet = setup_device(new_config=mcast_config('239.1.1.1 10.0.0.1 iif Ethernet1'))
+    plan = plan_device(device, assigned, BuilderNameIndex([BUILDER]), BUILDER, index)
+    assert plan.change_detected
+    assert [c.key for c in plan.configlets_to_be_assigned] == [
+        'configlet_static', 'builder_1', 'configlet_gen_2', 'configlet_tail']
+    assert plan.configlets_to_be_assigned.count(new_cfglet) == 1
+    assert plan.configlets_to_be_unassigned == plan.configlets_to_be_deleted == []
+
+
+def test_lost_configlet_is_found_by_device_ip_without_net_element_id():
+    store = ConfigletStore()
+    device = make_device()
+    assigned = [make_configlet(store, 'builder_1', BUILDER, 'Builder')]
+    new_cfglet = make_configlet(store, 'configlet_gen_2', f'{BUILDER}_10.0.0.1_1', 'Generated', mcast_config())
+    plan = plan_device(device, assigned, BuilderNameIndex([BUILDER]), BUILDER,
+                       GeneratedConfigletIndex([(None, new_cfglet)]))
+    assert plan.change_detected
+    assert plan.configlets_to_be_assigned == [assigned[0], new_cfglet]
+
+
+def test_nothing_is_recovered_without_the_builder():
+    store = ConfigletStore()
+    device = make_device()
+    assigned = [make_configlet(store, 'configlet_static', 'static')]
+    new_cfglet = make_configlet(store, 'configlet_gen_2', f'{BUILDER}_10.0.0.1_1', 'Generated', mcast_config())
+    plan = plan_device(device, assigned, BuilderNameIndex([BUILDER]), BUILDER,
+                       GeneratedConfigletIndex([(device.system_mac_address, new_cfglet)]))
+    assert not plan.change_detected
+    assert plan.configlets_to_be_assigned == assigned
+
+
+def test_reformatted_configlet_is_not_assigned_and_deleted():
+    config = mcast_config('239.1.1.1 10.0.0.1 iif Ethernet1', '239.1.1.2 10.0.0.1 iif Ethernet1')
+    reordered_config = mcast_config('239.1.1.2 10.0.0.1 iif Ethernet1', '239.1.1.1 10.0.0.1 iif Ethernet1')
+    device, assigned, index, new_cfglet = setup_device(config, reordered_config)
+    plan = plan_device(device, assigned, BuilderNameIndex([BUILDER]), BUILDER, index)
+    # the assigned configlet is kept and the new version with the same canonical config is not left on CVP
+    assert not plan.change_detected
+    assert plan.configlets_to_be_assigned == assigned
+    assert plan.configlets_to_be_deleted == []
+    assert plan.unused_configlets == [new_cfglet]
@@ -0,0 +1,158 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""Reconcile pipeline tests"""
+
+import logging
+
+from helpers import make_configlet, make_device
+from mock_cvp import MockCVP, mcast_config
+
+from mcast_reconcile.cvp import CVP
+from mcast_reconcile.models import ConfigletStore
+from mcast_reconcile.planfile import plan_to_dict
+from mcast_reconcile.planner import DevicePlan
+from mcast_reconcile.reconcile import configlets_to_delete, device_plans_from_plan, reconcile, verify_assigned_configlets
+
+
+class FakeCVP(object):
+    # serves configlets assigned to devices from memory
+
+    def __init__(self, assigned=None):
+        # assigned: { 'systemMacAddress': [ 'configlet key', ... ] }
+        self.configlet_store = ConfigletStore()
+        self.assigned = assigned or dict()
+        self.requested = list()
+
+    def get_configlets_for_a_device(self, netelement_id):
+        self.requested.append(netelement_id)
+        return [make_configlet(self.configlet_store, key, key) for key in self.assigned[netelement_id]]
+
+
+def make_device_plans(store, device, steps):
+    # steps: [ ( 'builder key', [ assigned keys before ], [ assigned keys after ], [ deleted keys ] ), ... ]
+    configlet = lambda key: make_configlet(store, key, key)  # noqa: E731
+    device_plans = list()
+    for builder_key, before, after, deleted in steps:
+        device_plan = DevicePlan(device, builder_key=builder_key)
+        device_plan.change_detected = True
+        device_plan.configlets_assigned = [configlet(key) for key in before]
+        device_plan.configlets_to_be_assigned = [configlet(key) for key in after]
+        device_plan.configlets_to_be_unassigned = [configlet(key) for key in deleted]
+        device_plan.configlets_to_be_deleted = [configlet(key) for key in deleted]
+        device_plans.append(device_plan)
+    return device_plans
+
+
+def make_plan(store, device, steps):
+    return plan_to_dict('https://cvp.example.com', make_device_plans(store, device, steps))
+
+
+def test_device_plans_are_rebuilt_in_plan_order():
+    store = ConfigletStore()
+    device = make_device()
+    plan = make_plan(store, device, [
+        ('builder_1', ['b1', 'gen_a_1', 'b2', 'gen_b_1'], ['b1', 'gen_a_2', 'b2', 'gen_b_1'], ['gen_a_1']),
+        ('builder_2', ['b1', 'gen_a_2', 'b2', 'gen_b_1'], ['b1', 'gen_a_2', 'b2', 'gen_b_2'], ['gen_b_1']),
+    ])
+    cvp_api = FakeCVP()
+    device_plans, keys_before_change = device_plans_from_plan(cvp_api, plan)
+
+    assert [p.builder_key for p in device_plans] == ['builder_1', 'builder_2']
+    assert all(p.change_detected and p.device.system_mac_address == device.system_mac_address for p in device_plans)
+    assert [c.key for c in device_plans[1].configlets_to_be_assigned] == ['b1', 'gen_a_2', 'b2', 'gen_b_2']
+    assert [c.key for c in device_plans[0].configlets_to_be_deleted] == ['gen_a_1']
+    # the second change of the device starts with configlets assigned by the first one
+    assert keys_before_change == [['b1', 'gen_a_1', 'b2', 'gen_b_1'], ['b1', 'gen_a_2', 'b2', 'gen_b_1']]
+    # configlets are interned in the CVP client store
+    assert cvp_api.configlet_store.configlets['b1'] is device_plans[0].configlets_to_be_assigned[0]
+
+
+def test_devices_planned_with_known_configlets_are_verified():
+    store = ConfigletStore()
+    devices = [make_device(n) for n in [1, 2, 3]]
+    device_plans = list()
+    for device in devices:
+        device_plans.extend(make_device_plans(store, device, [('builder_1', ['b1', 'gen_1'], ['b1', 'gen_2'], ['gen_1'])]))
+    macs = [device.system_mac_address for device in devices]
+    # the second device has configlets reassigned by an operator, the third one was discovered in this run
+    cvp_api = FakeCVP({macs[0]: ['b1', 'gen_1'], macs[1]: ['b1', 'gen_1', 'static'], macs[2]: ['b1', 'gen_1']})
+    known_configlets = {macs[0]: list(), macs[1]: list()}
+
+    verified_plans, drifted_devices = verify_assigned_configlets(cvp_api, device_plans, known_configlets)
+
+    assert [p.device.system_mac_address for p in verified_plans] == [macs[0], macs[2]]
+    assert [c.key for c in drifted_devices[macs[1]]] == ['b1', 'gen_1', 'static']
+    assert sorted(cvp_api.requested) == macs[:2]
+
+
+def test_unused_configlets_are_deleted_unless_assigned():
+    store = ConfigletStore()
+    device_plans = make_device_plans(store, make_device(), [('builder_1', ['b1', 'gen_1'], ['b1', 'gen_2'], ['gen_1'])])
+    unused = [make_configlet(store, key, key) for key in ['gen_3', 'gen_2', 'gen_1', 'gen_3']]
+    assert [c.key for c in configlets_to_delete(device_plans, unused)] == ['gen_1', 'gen_3']
+    # unused configlets are recorded in the plan and restored to be deleted by the commit
+    plan = plan_to_dict('https://cvp.example.com', device_plans, unused[:1])
+    assert plan['unused'] == [{'key': 'gen_3', 'name': 'gen_3', 'type': 'Static'}]
+
+
+def test_reformatted_configlets_are_reconciled_repeatedly(serve_mock_cvp):
+    cvp = MockCVP(devices=2, change_ratio=0.0)
+    # assigned generated configlets list the routes in another order than the builder generates them
+    for mac, keys in cvp.assigned.items():
+        cvp.configlets[keys[-1]]['config'] = mcast_config(reversed(cvp.running_routes[mac]))
+    assigned = {mac: list(keys) for mac, keys in cvp.assigned.items()}
+    server = serve_mock_cvp(cvp)
+    cvp_api = CVP('http://%s:%s' % server.server_address[:2], 'cvpadmin', 'cvpadmin', retries=0)
+
+    for _ in range(2):
+        discovery, device_plans = reconcile(cvp_api, cvp_api.get_devices(), workers=2, gen_workers=2)
+        assert device_plans == []
+        # new versions with the same canonical config are deleted, assigned configlets are kept
+        assert cvp.assigned == assigned
+        generated_keys = {c['key'] for c in cvp.configlets.values() if c['type'] == 'Generated'}
+        assert generated_keys == {keys[-1] for keys in assigned.values()}
+
+
+def test_diffs_are_logged_after_the_topology_is_saved(serve_mock_cvp, caplog):
+    cvp = MockCVP(devices=2, change_ratio=1.0)
+    server = serve_mock_cvp(cvp)
+    cvp_api = CVP('http://%s:%s' % server.server_address[:2], 'cvpadmin', 'cvpadmin', retries=0)
+    caplog.set_level(logging.INFO)
+
+    discovery, device_plans = reconcile(cvp_api, cvp_api.get_devices(), workers=2, gen_workers=2, batch=True)
+    assert len(device_plans) == 2
+    messages = [record.getMessage() for record in caplog.records]
+    saved = messages.index('Adding 2 temp actions and saving topology.')
+    diffs = [n for n, message in enumerate(messages) if message.startswith('Changes from ')]
+    assert len(diffs) == 2 and min(diffs) > saved
+    assert 'diff' in cvp_api.metrics.phases
@@ -0,0 +1,107 @@
+#
+# Copyright (c) 2021, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""State cache tests"""
+
+import sqlite3
+import time
+
+from helpers import make_configlet, make_device
+from mcast_reconcile.models import ConfigletStore
+from mcast_reconcile.state import StateCache
+
+
+def test_state_is_persisted(tmp_path):
+    path = str(tmp_path / 'state.sqlite')
+    store = ConfigletStore()
+    device = make_device()
+    configlets = [make_configlet(store, 'builder_1', 'mcast', 'Builder'),
+                  make_configlet(store, 'configlet_gen_1', 'mcast_10.0.0.1_1', 'Generated', 'vlan 1\n')]
+    state_cache = StateCache(path)
+    state_cache.update(device, configlets)
+    state_cache.commit()
+    state_cache.close()
+
+    state_cache = StateCache(path)
+    cached = state_cache.devices[device.system_mac_address]
+    assert cached['serialNumber'] == device.serial_number
+    assert state_cache.device_is_unchanged(device)
+    # cached configlets keep digests of generated configlets to compare them with new generated configlets
+    restored = state_cache.assigned_configlets(device, ConfigletStore())
+    assert [(c.key, c.name, c.type, c.digest) for c in restored] == [
+        (c.key, c.name, c.type, c.digest) for c in configlets]
+    assert restored[1].digest is not None
+    state_cache.close()
+
+
+def test_cache_of_another_format_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'state.sqlite')
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE devices (system_mac TEXT PRIMARY KEY, serial_number TEXT, parent_container_key TEXT, '
+                       'last_sync_up INTEGER, assigned_configlet_keys TEXT, generated_config_hash TEXT, updated_at REAL)')
+    connection.execute("INSERT INTO devices VALUES ('00:1c:73:00:00:01', 'SN0001', 'container_1', 1000, '[]', '', 0)")
+    connection.commit()
+    connection.close()
+    state_cache = StateCache(path)
+    assert state_cache.devices == dict()
+    state_cache.update(make_device(), list())
+    state_cache.commit()
+    state_cache.close()
+    assert len(StateCache(path).devices) == 1
+
+
+def test_changed_devices_are_detected(tmp_path):
+    state_cache = StateCache(str(tmp_path / 'state.sqlite'))
+    device = make_device()
+    assert not state_cache.device_is_unchanged(device)
+    state_cache.update(device, list())
+    assert state_cache.device_is_unchanged(device)
+    assert not state_cache.device_is_unchanged(make_device(last_sync_up=2000))
+    assert not state_cache.device_is_unchanged(make_device(container='container_2'))
+    state_cache.devices[device.system_mac_address]['updatedAt'] = time.time() - 120
+    assert state_cache.device_is_unchanged(device, max_age=0)
+    assert not state_cache.device_is_unchanged(device, max_age=60)
+    state_cache.close()
+
+
+def test_clear_and_prune(tmp_path):
+    path = str(tmp_path / 'state.sqlite')
+    state_cache = StateCache(path)
+    devices = [make_device(n) for n in [1, 2, 3]]
+    for device in devices:
+        state_cache.update(device, list())
+    state_cache.prune([devices[0].system_mac_address])
+    state_cache.commit()
+    assert list(StateCache(path).devices) == [devices[0].system_mac_address]
+    state_cache.clear()
+    assert StateCache(path).devices == dict()
+    state_cache.close()
@@ -34,264 +34,18 @@
 
 __author__ = 'Petr Ankudinov'
 
-import json
+import os
 import sys
 import argparse
 import getpass
 import logging
+import re
 
-import requests
-import requests.packages.urllib3 as urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-
-class CVP(object):
-
-    def __init__(self, url_prefix, cvp_username, cvp_password):
-        self.session = requests.session()
-        self.session.verify = False
-        self.cvp_url_prefix = url_prefix
-        self.timeout = 180
-        self.temp_task_list = list()  # list of temp tasks to save and execute
-        # authenticate
-        url = self.cvp_url_prefix + '/web/login/authenticate.do'
-        authdata = {'userId': cvp_username, 'password': cvp_password}
-        resp = self.session.post(url, data=json.dumps(
-            authdata), timeout=self.timeout)
-        if resp.raise_for_status():
-            sys.exit('ERROR: Received wrong status code when connecting to CVP!')
-
-    @staticmethod
-    def handle_errors(r, task_description='A request to CVP REST API'):
-        # handles possible CVP or requests errors
-        if isinstance(r, str):
-            sys.exit('%s failed!\nERROR: %s' % (
-                task_description, r
-            ))
-        if 'errorCode' in r.json():
-            sys.exit('%s failed!\nERROR code: %s\n   message: %s' % (
-                task_description, r.json()['errorCode'], r.json()[
-                    'errorMessage']
-            ))
-        if r.raise_for_status():
-            err_msg = 'ERROR: %s failed! Wrong status code %s received' % (
-                task_description, r.status_code)
-            sys.exit(err_msg)
-
-    def get_configlets(self):
-        url = self.cvp_url_prefix + \
-            '/cvpservice/configlet/getConfiglets.do?startIndex=0&endIndex=0'
-        resp = self.session.get(url, timeout=self.timeout)
-        self.handle_errors(
-            resp, task_description='Collecting configlet inventory')
-        d = dict()
-        for configlet in resp.json()['data']:
-            d.update({
-                configlet['key']: configlet
-            })
-        return d
-
-    def get_devices(self, provisioned=False):
-        # provisioned: True - provisioned only, False - full inventory, including Undefined container
-        url = self.cvp_url_prefix + '/cvpservice/inventory/devices?provisioned=%s' % provisioned
-        resp = self.session.get(url, timeout=self.timeout)
-        self.handle_errors(
-            resp, task_description='Collecting device inventory')
-        d = dict()
-        for device in resp.json():
-            d.update({
-                device['serialNumber']: device
-            })
-        return d
-
-    def get_containers(self):
-        url = self.cvp_url_prefix + '/cvpservice/inventory/containers'
-        resp = self.session.get(url, timeout=self.timeout)
-        self.handle_errors(
-            resp, task_description='Collecting container inventory')
-        d = dict()
-        for container in resp.json():
-            d.update({
-                container['Key']: container
-            })
-        return d
-
-    def find_container_id(self, container_name):
-        container_inventory = self.get_containers()
-        for container_key, container_details in container_inventory.items():
-            if container_details['Name'] == container_name:
-                return container_key
-
-    def find_builder_id(self, builder_name):
-        configlet_inventory = self.get_configlets()
-        for cfglet_id, cfglet_details in configlet_inventory.items():
-            if (cfglet_details['name'] == builder_name) and (cfglet_details['type'] == 'Builder'):
-                return cfglet_id
-
-    def get_device_serials_in_container(self, container_key):
-        url = self.cvp_url_prefix + \
-            '/cvpservice/provisioning/getNetElementList.do?nodeId=%s&startIndex=0&endIndex=0&ignoreAdd=true' % container_key
-        resp = self.session.get(url, timeout=self.timeout)
-        self.handle_errors(
-            resp, task_description='Collecting devices in a container')
-        d = dict()
-        for device in resp.json()['netElementList']:
-            d.update({
-                device['serialNumber']: device
-            })
-        return d
-
-    def generate_configlets_from_builder(self, builder_key, netelement_key_list, container_key):
-        url = self.cvp_url_prefix + '/cvpservice/configlet/autoConfigletGenerator.do'
-        payload = {
-            'configletBuilderId': builder_key,
-            'netElementIds': netelement_key_list,
-            'containerId': container_key,
-            'pageType': 'string'
-        }
-        resp = self.session.post(
-            url, data=json.dumps(payload), timeout=self.timeout)
-        self.handle_errors(
-            resp, task_description='Generating updated configlets from builder')
-        return resp.json()
-
-    def get_configlets_for_a_device(self, netelement_id):
-        url = self.cvp_url_prefix + \
-            '/cvpservice/provisioning/getConfigletsByNetElementId.do?netElementId=%s&startIndex=0&endIndex=0' % netelement_id
-        resp = self.session.get(url, timeout=self.timeout)
-        self.handle_errors(
-            resp, task_description='Collecting container inventory')
-        assigned_configlet_list = resp.json()['configletList']
-        return assigned_configlet_list
-
-    def addTempTask(self, temp_task_data, info=''):
-        # used to format and add new task to the temp task list
-        taskId = len(self.temp_task_list) + 1
-        d = {
-            "taskId": taskId,
-            "info": info,
-            "infoPreview": info,
-        }
-        d.update(temp_task_data)
-        self.temp_task_list.append(d)
-
-        return d
-
-    def reassign_configlets_to_device(self, device, configlet_list_to_unassign, configlet_list_to_assign):
-
-        info = "Reassigning configlets to device %s" % device_details['serialNumber']
-
-        c_names_to_remove = list()
-        c_keys_to_remove = list()
-        b_names_to_remove = list()
-        b_keys_to_remove = list()
-        c_names_to_add = list()
-        c_keys_to_add = list()
-        b_names_to_add = list()
-        b_keys_to_add = list()
-
-        for cfglet in configlet_list_to_unassign:
-            if cfglet['type'] == 'Builder':
-                b_names_to_remove.append(cfglet['name'])
-                b_keys_to_remove.append(cfglet['key'])
-            else:
-                c_names_to_remove.append(cfglet['name'])
-                c_keys_to_remove.append(cfglet['key'])
-
-        for cfglet in configlet_list_to_assign:
-            if cfglet['type'] == 'Builder':
-                b_names_to_add.append(cfglet['name'])
-                b_keys_to_add.append(cfglet['key'])
-            else:
-                c_names_to_add.append(cfglet['name'])
-                c_keys_to_add.append(cfglet['key'])
-
-        task_d = {
-            'action': 'associate',
-            'nodeType': 'configlet',
-            'nodeId': '',
-            'configletList': c_keys_to_add,
-            'configletNamesList': c_names_to_add,
-            'ignoreConfigletNamesList': c_names_to_remove,
-            'ignoreConfigletList': c_keys_to_remove,
-            'configletBuilderList': b_keys_to_add,
-            'configletBuilderNamesList': b_names_to_add,
-            'ignoreConfigletBuilderList': b_keys_to_remove,
-            'ignoreConfigletBuilderNamesList': b_names_to_remove,
-            'toId': device['systemMacAddress'],
-            'toIdType': 'netelement',
-            'fromId': '',
-            'nodeName': '',
-            'fromName': '',
-            'toName': device['fqdn'],
-            'nodeIpAddress': device['ipAddress'],
-            # test with IP address change
-            'nodeTargetIpAddress': device['ipAddress'],
-            'childTasks': [],
-            'parentTask': ''
-        }
-        self.addTempTask(task_d, info)
-
-    def addTempAction(self):
-        if len(self.temp_task_list):
-            url = self.cvp_url_prefix + \
-                '/cvpservice/provisioning/addTempAction.do?nodeId=root&format=topology'
-            payload = {'data': self.temp_task_list}
-            headers = {'content-type': "application/json", }
-            resp = self.session.post(url, data=json.dumps(
-                payload), headers=headers, timeout=self.timeout)
-            self.handle_errors(
-                resp, task_description='Trying to add temp tasks to CVP')
-            self.temp_task_list = list()  # clean temp task list
-
-    def save_topology(self):
-        url = self.cvp_url_prefix + '/cvpservice/provisioning/v2/saveTopology.do'
-        resp = self.session.post(
-            url, data=json.dumps([]), timeout=self.timeout)
-        self.handle_errors(resp, task_description='Saving topology')
-
-    def delete_configlets(self, configlet_list):
-        url = self.cvp_url_prefix + '/cvpservice/configlet/deleteConfiglet.do'
-        configlets_to_delete = list()
-        for configlet in configlet_list:
-            d = {'name': configlet['name'], 'key': configlet['key']}
-            configlets_to_delete.append(d)
-        resp = self.session.post(url, data=json.dumps(
-            configlets_to_delete), timeout=self.timeout)
-        self.handle_errors(resp, task_description='Deleting configlets')
-
-    def get_tasks(self, query_param='Pending'):
-        url = self.cvp_url_prefix + \
-            '/cvpservice/task/getTasks.do?queryparam=%s&startIndex=0&endIndex=0' % query_param
-        resp = self.session.get(url, timeout=self.timeout)
-        self.handle_errors(
-            resp, task_description='Checking for existing tasks.')
-
-        d = {
-            'total': resp.json()['total'],
-            'data': resp.json()['data']
-        }
-
-        return d
-
-    def execute_tasks(self, task_id_list):
-        url = self.cvp_url_prefix + '/cvpservice/task/executeTask.do'
-        payload = {'data': task_id_list}
-        headers = {'content-type': "application/json", }
-        resp = self.session.post(url, data=json.dumps(
-            payload), headers=headers, timeout=self.timeout)
-        self.handle_errors(
-            resp, task_description='Trying to add temp tasks to CVP')
-
-    def device_is_compliant(self, device_id):
-        url = self.cvp_url_prefix + '/cvpservice/provisioning/checkCompliance.do'
-        d = {'nodeId': device_id, 'nodeType': 'netelement'}
-        resp = self.session.post(url, data=json.dumps(d), timeout=self.timeout)
-        self.handle_errors(resp, task_description='Deleting configlets')
-        if resp.json()['complianceCode'] != '0000':
-            return False  # not compliant
-        else:
-            return True  # compliant
+from mcast_reconcile.compliance import compile_ignore_pattern
+from mcast_reconcile.cvp import CVPError
+from mcast_reconcile.daemon import ReconcileDaemon
+from mcast_reconcile.metrics import Metrics
+from mcast_reconcile.runner import Cluster, InventoryError, connect, load_cluster_inventory, run_cluster, run_clusters
 
 
 if __name__ == '__main__':
@@ -308,164 +62,194 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description=cli_parser_description, formatter_class=argparse.RawTextHelpFormatter)
 
-    parser.add_argument('--cvp', dest='cvp_ip_or_name',
-                        required=True, help='CVP IP address or DNS name.')
+    parser.add_argument('command', nargs='?', choices=['run', 'plan', 'commit'], default='run',
+                        help='run - reconcile devices and commit changes immediately (default)\n'
+                             'plan - discover devices, generate configlets and save planned changes to --plan-file\n'
+                             'commit - apply changes planned in --plan-file, run right before a Change Control')
+    parser.add_argument('--cvp', dest='cvp_targets', action='append', metavar='CVP',
+                        help='CVP IP address or DNS name. A URL can be specified as well, for example http://127.0.0.1:8443\n'
+                             'Can be specified multiple times to reconcile multiple CVP clusters concurrently.')
+    parser.add_argument('--inventory', dest='inventory', default=None,
+                        help='JSON file with a list of CVP clusters and their credentials, see README for details.')
+    parser.add_argument('--cluster-workers', dest='cluster_workers', type=int, default=None,
+                        help='Max number of CVP clusters reconciled at the same time. Default: all clusters')
     parser.add_argument('--username', '-user', dest='cvp_username',
-                        required=True, help='CVP username.')
+                        help='CVP username. Required unless specified for every cluster in --inventory.')
+    parser.add_argument('--workers', dest='workers', type=int, default=10,
+                        help='Number of concurrent requests used to discover configlets assigned to devices. Default: 10')
+    parser.add_argument('--batch', dest='batch', action='store_true',
+                        help='Collect configlet reassignments for all devices and save topology only once.')
+    parser.add_argument('--batch-size', dest='batch_size', type=int, default=500,
+                        help='Max number of temp actions sent to CVP in a single request in batch mode. Default: 500')
+    parser.add_argument('--gen-workers', dest='gen_workers', type=int, default=4,
+                        help='Number of concurrent requests used to generate configlets from builders. Default: 4')
+    parser.add_argument('--gen-chunk-size', dest='gen_chunk_size', type=int, default=100,
+                        help='Max number of devices in a single configlet generation request. Default: 100')
+    parser.add_argument('--gen-timeout', dest='gen_timeout', type=int, default=180,
+                        help='Configlet generation request timeout in seconds. Timed out requests are split in half and retried. Default: 180')
+    parser.add_argument('--retries', dest='retries', type=int, default=3,
+                        help='Number of retries for read requests failed with 5xx, 429, timeout or connection error. Default: 3')
+    state_mode = parser.add_mutually_exclusive_group()
+    state_mode.add_argument('--incremental', dest='incremental', action='store_true',
+                            help='Reuse configlets assigned to devices not changed since the last run instead of collecting them from CVP.\n'
+                                 'Configlets are generated for all devices, assignments are verified on CVP before a change.')
+    state_mode.add_argument('--full', dest='full', action='store_true',
+                            help='Reconcile all devices and rebuild the state cache used by --incremental.')
+    parser.add_argument('--state-db', dest='state_db', default='mcast-reconcile-state.sqlite',
+                        help='State cache file used by --incremental and --full. Default: mcast-reconcile-state.sqlite')
+    parser.add_argument('--state-max-age', dest='state_max_age', type=int, default=0,
+                        help='Collect configlets assigned to devices with a cached state older than the specified number of seconds. Default: 0 (never)')
+    parser.add_argument('--container', dest='containers', action='append', metavar='CONTAINER',
+                        help='Reconcile only devices in the container. Can be specified multiple times.')
+    parser.add_argument('--device', dest='devices', action='append', metavar='DEVICE',
+                        help='Reconcile only the device with the serial number, system MAC or hostname. Can be specified multiple times.')
+    parser.add_argument('--builder', dest='builders', action='append', metavar='BUILDER',
+                        help='Reconcile only configlets generated by the configlet builder. Can be specified multiple times.')
+    parser.add_argument('--compliance-sweep', dest='compliance_sweep', action='store_true',
+                        help='Check compliance of selected devices and reconcile only devices out of compliance.\n'
+                             'With --incremental devices not changed since the last run are checked and configlets assigned\n'
+                             'to the ones out of compliance are collected from CVP again.')
+    parser.add_argument('--compliance-rate', dest='compliance_rate', type=float, default=10,
+                        help='Max number of compliance checks per second, 0 - unlimited. Default: 10')
+    parser.add_argument('--compliance-ignore', dest='compliance_ignore', default=None, metavar='REGEX',
+                        help='Config lines to ignore for devices out of compliance, usually the TerminAttr -running_config_filter regex,\n'
+                             'for example route[[:space:]]239. Devices where only ignored lines differ are considered compliant.')
+    parser.add_argument('--daemon', dest='daemon', action='store_true',
+                        help='Run reconcile cycles on an interval using a single CVP session.')
+    parser.add_argument('--interval', dest='interval', type=int, default=300,
+                        help='Seconds between reconcile cycles in daemon mode. Default: 300')
+    parser.add_argument('--jitter', dest='jitter', type=int, default=30,
+                        help='Max random deviation from the reconcile interval in seconds. Default: 30')
+    parser.add_argument('--inventory-refresh', dest='inventory_refresh', type=int, default=3600,
+                        help='Seconds after which configlets assigned to all devices are collected again in daemon mode. Default: 3600')
+    parser.add_argument('--listen', dest='listen', default=None,
+                        help='<host>:<port> to listen for reconcile requests in daemon mode, for example 127.0.0.1:8090. Disabled by default.')
+    parser.add_argument('--execute', dest='execute', action='store_true',
+                        help='Execute tasks created by this run and wait for them to complete.')
+    parser.add_argument('--execute-batch-size', dest='execute_batch_size', type=int, default=50,
+                        help='Number of tasks executed at once, the next batch is started when the previous one has finished. Default: 50')
+    parser.add_argument('--execute-timeout', dest='execute_timeout', type=int, default=3600,
+                        help='Max time in seconds to wait for a batch of tasks to complete. Default: 3600')
+    parser.add_argument('--plan-file', dest='plan_file', default='mcast-reconcile-plan.json',
+                        help='Reconcile plan file written by plan and applied by commit. Default: mcast-reconcile-plan.json')
+    parser.add_argument('--plan-max-age', dest='plan_max_age', type=int, default=0,
+                        help='Refuse to commit a plan older than the specified number of seconds. Default: 0 (never)')
+    parser.add_argument('--journal', dest='journal', default='mcast-reconcile-journal.jsonl',
+                        help='Journal recording the progress of a run. Default: mcast-reconcile-journal.jsonl')
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        help='Resume a failed run or commit from --journal: skip discovery and configlet generation,\n'
+                             'commit the remaining changes and delete configlets that are no longer required.')
+    parser.add_argument('--metrics-json', dest='metrics_json', default=None,
+                        help='Write CVP request statistics and reconcile phase durations to a JSON file at the end of the run.')
+    parser.add_argument('--metrics-prom', dest='metrics_prom', default=None,
+                        help='Write metrics to a file in Prometheus text format, for example for the node_exporter textfile collector.')
+    parser.add_argument('--profile', dest='profile', default=None,
+                        help='Dump cProfile stats of the reconcile planner to a file.')
     args = parser.parse_args()
+    if not args.cvp_targets and not args.inventory:
+        parser.error('--cvp or --inventory must be specified')
+    if args.cluster_workers is not None and args.cluster_workers < 1:
+        parser.error('--cluster-workers must be a positive integer')
+    for option in ['workers', 'batch_size', 'gen_workers', 'gen_chunk_size', 'gen_timeout', 'interval',
+                   'execute_batch_size', 'execute_timeout']:
+        if getattr(args, option) < 1:
+            parser.error(f"--{option.replace('_', '-')} must be a positive integer")
+    for option in ['retries', 'state_max_age', 'jitter', 'inventory_refresh', 'plan_max_age', 'compliance_rate']:
+        if getattr(args, option) < 0:
+            parser.error(f"--{option.replace('_', '-')} must not be negative")
+    if args.daemon and (args.incremental or args.full):
+        parser.error('--incremental and --full can not be used in daemon mode')
+    listen_address = None
+    if args.listen:
+        if not args.daemon:
+            parser.error('--listen can only be used in daemon mode')
+        host, _, port = args.listen.rpartition(':')
+        if not host or not port.isdigit():
+            parser.error('--listen must be specified as <host>:<port>')
+        listen_address = (host, int(port))
+    if args.builders and (args.incremental or args.full):
+        parser.error('--builder can not be used with --incremental or --full')
+    if args.daemon and (args.containers or args.devices or args.builders):
+        parser.error('--container, --device and --builder can not be used in daemon mode, use the HTTP endpoint instead')
+    if args.command != 'run' and (args.daemon or args.incremental or args.full):
+        parser.error(f'--daemon, --incremental and --full can not be used with {args.command}')
+    if args.compliance_sweep and (args.daemon or args.command == 'commit'):
+        parser.error('--compliance-sweep can not be used in daemon mode or with commit')
+    if args.compliance_ignore:
+        if not args.compliance_sweep:
+            parser.error('--compliance-ignore can only be used with --compliance-sweep')
+        try:
+            compile_ignore_pattern(args.compliance_ignore)
+        except re.error as e:
+            parser.error(f'--compliance-ignore is not a valid regex: {e}')
+    if args.resume and (args.command == 'plan' or args.daemon):
+        parser.error('--resume can only be used with run or commit')
+    if args.resume and (args.containers or args.devices or args.builders or args.incremental or args.full or
+                        args.compliance_sweep):
+        parser.error('--container, --device, --builder, --incremental, --full and --compliance-sweep can not be used with --resume, '
+                     'devices are selected by the journal')
+    if args.command == 'plan' and args.execute:
+        parser.error('--execute can not be used with plan')
+    if args.command == 'commit' and (args.containers or args.devices or args.builders):
+        parser.error('--container, --device and --builder can not be used with commit, devices are selected by the plan')
+
+    try:
+        clusters = load_cluster_inventory(args.inventory, default_username=args.cvp_username) if args.inventory else list()
+    except InventoryError as e:
+        sys.exit(str(e))
+    clusters.extend(Cluster(address, address, args.cvp_username) for address in args.cvp_targets or list())
+    if any(not cluster.username for cluster in clusters):
+        parser.error('--username must be specified for clusters without a username in --inventory')
+    if len({cluster.name for cluster in clusters}) != len(clusters):
+        parser.error('every CVP cluster must have a unique name')
+    if args.daemon and len(clusters) > 1:
+        parser.error('only a single CVP cluster can be used in daemon mode')
 
     # get password to authenticate on CVP
-    cvp_password = getpass.getpass(prompt='Password:')
-
-    logging.info(f'Connecting to https://{args.cvp_ip_or_name}')
-    cvp_api = CVP(url_prefix=f'https://{args.cvp_ip_or_name}',
-                  cvp_username=args.cvp_username, cvp_password=cvp_password)
-
-    # map builder keys to device parent container and system MACs
-    builder_device_map = dict()
-    # { 'cfglet_builder_key': { 'parentContainerKey': [ 'systemMacAddress', ... ], ... }, ... }
-    builder_names = list()  # list of configlet builder names
-    device_dict = dict()  # dictionary to store device details for every system MAC
-    device_sys_mac_to_configlet_map = dict()  # assigned configlets for every system MAC to avoid additional API calls
-
-    # get device inventory and walk over it
-    logging.info('Collecting device inventory.')
-    device_inventory = cvp_api.get_devices()
-    for k, v in device_inventory.items():  # k - device serial, v - device details data
-        # find configlets assigned to every device
-        logging.info(f"Find configlets assigned to {v['systemMacAddress']}")
-        configlets_assigned_to_device = cvp_api.get_configlets_for_a_device(
-            v['systemMacAddress'])
-        device_sys_mac_to_configlet_map.update({
-            v['systemMacAddress']: configlets_assigned_to_device
-        })
-        for cfglet in configlets_assigned_to_device:
-            # for every builder add information about device system MAC and parent container to builder_device_map
-            if cfglet['type'] == 'Builder':
-                builder_names.append(cfglet['name'])
-                # add device to the dict first
-                device_dict.update({v['systemMacAddress']: v})
-                if cfglet['key'] not in builder_device_map.keys():
-                    builder_device_map.update({
-                        cfglet['key']: dict()
-                    })
-                if v['parentContainerKey'] not in builder_device_map[cfglet['key']].keys():
-                    builder_device_map[cfglet['key']].update({
-                        v['parentContainerKey']: list()
-                    })
-                if v['systemMacAddress'] not in builder_device_map[cfglet['key']][v['parentContainerKey']]:
-                    builder_device_map[cfglet['key']][v['parentContainerKey']].append(
-                        v['systemMacAddress'])
-
-    # here we'll add all configlets that are not in use after the change
-    configlets_to_be_deleted = list()
-    for builder_id, cont_device_bundle in builder_device_map.items():
-        for container_id, device_list in cont_device_bundle.items():
-            # use confilet builder to generate new configlets for every device in the list
-            logging.info(
-                f'Generating configlets from builder {builder_id} for devices {device_list} in container {container_id}')
-            new_configlets = cvp_api.generate_configlets_from_builder(
-                builder_id, device_list, container_id)['data']
-
-            for device_id in device_list:
-
-                change_detected = False  # but default we assume that there is no change
-
-                device_details = device_dict[device_id]
-                configlets_to_be_assigned = list()  # configlets to be assigned to the device
-                # configlets to be unassigned from the device
-                configlets_to_be_unassigned = list()
-
-                # lists below are used to verify that no generated configlets will be lost
-                gen_cfglet_prefixes_already_assigned_to_device = list()
-                gen_cfglet_prefixes_expected_to_be_assigned_to_device = list()
-
-                configlets_assigned_to_device = device_sys_mac_to_configlet_map[device_details['systemMacAddress']]
-                for configlet in configlets_assigned_to_device:
-                    # for every builder we expect a generated configlet to be assigned to a device
-                    # in some cases generated configlets can be removed by operator by mistake and lost
-                    # to recover from that, we add every builder name to the list of generated configlet prefixes expected to be assigned to the device
-                    # if we'll find a matching generated configlet, this prefix will be removed from the list
-                    # otherwise we'll recreate corresponding generated configlets
-                    if configlet['type'] == 'Builder':
-                        # if no matching generated configlet discovered yet
-                        if configlet['name'] not in gen_cfglet_prefixes_already_assigned_to_device:
-                            gen_cfglet_prefixes_expected_to_be_assigned_to_device.append(
-                                configlet['name'])
-                    # if configlet is generated, find the name of the corresponding configlet builder
-                    builder_name = ''
-                    if configlet['type'] == 'Generated':
-                        for candidate_builder_name in builder_names:
-                            if candidate_builder_name in configlet['name']:
-                                builder_name = candidate_builder_name
-                                # find generated configlet name prefix
-                                # for example for mcast_auto_reconcile_192.168.122.11_5 the prefix will be mcast_auto_reconcile_192.168.122.11
-                                existing_cfglet_name_without_version = configlet['name'][:configlet['name'].rfind(
-                                    '_')]
-                                # find new generated configlets for the builder
-                                for new_configlet_data in new_configlets:
-                                    new_cfglet = new_configlet_data['configlet']
-                                    # find generated configlet name prefix for the updated configlet
-                                    new_cfglet_name_without_version = new_cfglet['name'][:new_cfglet['name'].rfind(
-                                        '_')]
-                                    if existing_cfglet_name_without_version == new_cfglet_name_without_version:
-                                        # if generated configlet was not changed
-                                        if configlet['key'] == new_cfglet['key']:
-                                            configlets_to_be_assigned.append(
-                                                configlet)  # keep old configlet
-                                        else:
-                                            # check if config has changed
-                                            if configlet['config'] != new_cfglet['config']:
-                                                logging.info(f"A change was detected. {configlet['name']} will be replaced with {new_cfglet['name']}")
-                                                change_detected = True
-                                                configlets_to_be_assigned.append(
-                                                    new_cfglet)  # assign new configlet
-                                                configlets_to_be_unassigned.append(
-                                                    configlet)  # unassign old configlet
-                                                configlets_to_be_deleted.append(
-                                                    configlet)  # delete old configlet
-                                        # add builder to the list of already assigned prefixes as generated configlet was discovered
-                                        gen_cfglet_prefixes_already_assigned_to_device.append(
-                                            builder_name)
-                                        # remove builder name from the list of generated configlet prefixes expected to be assigned to the device
-                                        if builder_name in gen_cfglet_prefixes_expected_to_be_assigned_to_device:
-                                            gen_cfglet_prefixes_expected_to_be_assigned_to_device.remove(
-                                                builder_name)
-                    else:  # just keep configlets of any other type
-                        configlets_to_be_assigned.append(configlet)
-
-                # if any lost generated configlets discovered
-                for lost_configlet_prefix in gen_cfglet_prefixes_expected_to_be_assigned_to_device:
-                    # first, find builder index as configlet has to be inserted right after
-                    for cfglet_index, to_be_assigned_cfglet in enumerate(configlets_to_be_assigned):
-                        if to_be_assigned_cfglet['name'] == lost_configlet_prefix:
-                            lost_configlet_index = cfglet_index
-                            for new_configlet_data in new_configlets:
-                                new_cfglet = new_configlet_data['configlet']
-                                if lost_configlet_prefix in new_cfglet['name']:
-                                    configlets_to_be_assigned.insert(
-                                        lost_configlet_index+1, new_cfglet)
-                                    logging.info(f"Recovering configlet {new_cfglet['name']} that was lost due to operator error.")
-                                    change_detected = True
-
-                # typically we'd check if device is compliant,
-                # but it will never be the case due to custom TerminAttr
-                # keep the code below commented just in case it will be required later
-                # --------------------------------------------------------------------
-                # if not change_detected:
-                #     if not cvp_api.device_is_compliant(device_id):
-                #         change_detected = True
-
-                if change_detected:
-                    logging.info(f"Re-assigning configlets to {device_details['systemMacAddress']}")
-                    cvp_api.reassign_configlets_to_device(
-                        device_details, configlets_to_be_unassigned, configlets_to_be_assigned)
-                    logging.info("Adding temp actions and saving topology.")
-                    cvp_api.addTempAction()  # create temp actions on CVP
-                    cvp_api.save_topology()  # save topology
-                else:
-                    logging.info('No change was detected. Nothing to do.')
-
-    if configlets_to_be_deleted:
-        logging.info('Deleting configlets that are no longer required.')
-        cvp_api.delete_configlets(configlets_to_be_deleted)
+    # CVP_PASSWORD environment variable can be used to run the script non-interactively
+    if any(not cluster.password for cluster in clusters):
+        cvp_password = os.environ.get('CVP_PASSWORD') or getpass.getpass(prompt='Password:')
+        for cluster in clusters:
+            cluster.password = cluster.password or cvp_password
+
+    if args.daemon:
+        reconcile_options = {
+            'workers': args.workers,
+            'batch': args.batch,
+            'batch_size': args.batch_size,
+            'gen_workers': args.gen_workers,
+            'gen_chunk_size': args.gen_chunk_size,
+            'gen_timeout': args.gen_timeout,
+            'profile': args.profile,
+            'execute': args.execute,
+            'execute_batch_size': args.execute_batch_size,
+            'execute_timeout': args.execute_timeout,
+        }
+        try:
+            cvp_api = connect(clusters[0], args, metrics=Metrics())
+        except CVPError as e:
+            sys.exit(str(e))
+        reconcile_daemon = ReconcileDaemon(
+            cvp_api, interval=args.interval, jitter=args.jitter, inventory_refresh=args.inventory_refresh,
+            metrics_json=args.metrics_json, metrics_prom=args.metrics_prom, **reconcile_options)
+        reconcile_daemon.serve_forever(listen_address)
+        sys.exit()
+
+    if len(clusters) == 1:
+        summary = run_cluster(clusters[0], args)
+        if summary['error']:
+            sys.exit(summary['error'])
+        sys.exit()
+
+    # multiple clusters are reconciled concurrently, every cluster in a separate process
+    logging.info(f"Starting {args.command} for {len(clusters)} CVP clusters: {', '.join(c.name for c in clusters)}")
+    summaries = run_clusters(clusters, args, workers=args.cluster_workers)
+    logging.info('Summary:')
+    for summary in summaries:
+        result = summary['error'].splitlines()[0] if summary['error'] else 'OK'
+        logging.info(f"  {summary['cluster']}: {summary['devices']} devices, {summary['changedDevices']} changed, "
+                     f"{summary['duration']:.1f}s - {result}")
+    failed_clusters = [summary['cluster'] for summary in summaries if summary['error']]
+    if failed_clusters:
+        sys.exit(f"ERROR: {args.command} failed for {len(failed_clusters)} of {len(clusters)} CVP clusters: "
+                 f"{', '.join(failed_clusters)}")